@@ -1,16 +1,116 @@
 from __future__ import annotations
 
+import hashlib
 import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timezone
+from html import escape
+from typing import Any, Callable, NamedTuple, Optional
 
 import requests
-from flask import Flask, Response, jsonify, request
+from flask import Flask, Response, g, jsonify, request
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import metrics
+from .report import render_market, render_profile, render_recommendations, render_report, render_risk
 
 FASTAPI_BASE = os.environ.get("KRISHIRAKSHAK_FASTAPI_BASE", "http://127.0.0.1:8000")
+HTTP_POOL_SIZE = int(os.environ.get("KRISHIRAKSHAK_HTTP_POOL_SIZE", "32"))
+HTTP_RETRIES = int(os.environ.get("KRISHIRAKSHAK_HTTP_RETRIES", "2"))
+UPSTREAM_TIMEOUT_SECONDS = float(os.environ.get("KRISHIRAKSHAK_UPSTREAM_TIMEOUT", "5"))
+REPORT_DEADLINE_SECONDS = float(os.environ.get("KRISHIRAKSHAK_REPORT_DEADLINE", "10"))
 
 app = Flask(__name__)
 
 
+def _make_session() -> requests.Session:
+    session = requests.Session()
+    retry = Retry(
+        total=HTTP_RETRIES,
+        backoff_factor=0.1,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"GET"}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# Shared across requests so upstream connections stay alive between reports.
+_session = _make_session()
+_fetch_pool = ThreadPoolExecutor(max_workers=HTTP_POOL_SIZE, thread_name_prefix="report-fetch")
+
+
+class _Upstream(NamedTuple):
+    status: int
+    body: Any
+    etag: Optional[str] = None
+
+
+def _get_json(path: str, auth: str, extra_headers: Optional[dict] = None) -> _Upstream:
+    headers = {"Authorization": auth, **(extra_headers or {})}
+    started = time.perf_counter()
+    try:
+        resp = _session.get(f"{FASTAPI_BASE}{path}", headers=headers, timeout=UPSTREAM_TIMEOUT_SECONDS)
+    except requests.RequestException:
+        metrics.UPSTREAM_SECONDS.observe(time.perf_counter() - started, path, "error")
+        raise
+    metrics.UPSTREAM_SECONDS.observe(time.perf_counter() - started, path, str(resp.status_code))
+    try:
+        body = resp.json() if resp.content else None
+    except ValueError:
+        body = None
+    return _Upstream(resp.status_code, body, resp.headers.get("ETag"))
+
+
+def _result(fut: Future, deadline: float) -> Optional[_Upstream]:
+    # A fetch that errors or misses the shared deadline comes back as None.
+    try:
+        return fut.result(timeout=max(0.0, deadline - time.monotonic()))
+    except Exception:
+        fut.cancel()
+        return None
+
+
+class _ReportCache:
+    # Rendered reports per bearer token, revalidated upstream via the /ai/summary ETag.
+    def __init__(self, maxsize: int, ttl_seconds: float) -> None:
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._data: OrderedDict[str, tuple[float, str, bytes]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[tuple[str, bytes]]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry[1], entry[2]
+
+    def set(self, key: str, etag: str, body: bytes) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_seconds, etag, body)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+_report_cache = _ReportCache(
+    maxsize=int(os.environ.get("KRISHIRAKSHAK_REPORT_CACHE_SIZE", "256")),
+    ttl_seconds=float(os.environ.get("KRISHIRAKSHAK_REPORT_CACHE_TTL", "600")),
+)
+
+
 def _utc_now() -> str:
     return datetime.now(timezone.utc).isoformat()
 
@@ -20,6 +120,28 @@ def health():
     return jsonify({"ok": True, "service": "flask-report", "time": _utc_now()})
 
 
+@app.get("/metrics")
+def prometheus_metrics():
+    return Response(metrics.render(), headers={"Content-Type": metrics.CONTENT_TYPE})
+
+
+if metrics.ENABLED:
+
+    @app.before_request
+    def _start_timer() -> None:
+        g.metrics_started = metrics.profiler.begin() if metrics.profiler is not None else time.perf_counter()
+
+    @app.after_request
+    def _observe(response: Response) -> Response:
+        # Reports stream, so the clock stops when the server closes the response, not when the view returns.
+        started = g.pop("metrics_started", None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+            method, status = request.method, response.status_code
+            response.call_on_close(lambda: metrics.observe_request("flask", method, route, status, started, None))
+        return response
+
+
 def _bearer() -> str | None:
     auth = request.headers.get("Authorization")
     if not auth:
@@ -27,89 +149,77 @@ def _bearer() -> str | None:
     return auth
 
 
+def _fetch_report_data(auth: str, *, etag: Optional[str] = None) -> tuple[Optional[_Upstream], Callable[[], Optional[list]]]:
+    # Returns the required data plus a loader for the optional market section.
+    deadline = time.monotonic() + REPORT_DEADLINE_SECONDS
+    conditional = {"If-None-Match": etag} if etag else None
+    summary = _result(_fetch_pool.submit(_get_json, "/ai/summary", auth, conditional), deadline)
+    if summary is None or summary.status != 404 or (summary.body or {}).get("detail") != "Not Found":
+        market = (summary.body or {}).get("market_prices") if summary is not None and summary.status == 200 else None
+        return summary, lambda: market
+
+    # Upstream predates /ai/summary (e.g. mid-deploy): fetch the sections individually, in parallel.
+    futures = {
+        name: _fetch_pool.submit(_get_json, path, auth)
+        for name, path in (
+            ("profile", "/profile"),
+            ("recommendation", "/ai/recommendation"),
+            ("risk", "/ai/risk"),
+            ("market", "/insights/market-prices"),
+        )
+    }
+
+    def load_market() -> Optional[list]:
+        market = _result(futures["market"], deadline)
+        return (market.body or {}).get("items") if market is not None and market.status == 200 else None
+
+    parts = {name: _result(futures[name], deadline) for name in ("profile", "recommendation", "risk")}
+    for part in parts.values():
+        if part is None or part.status != 200:
+            futures["market"].cancel()
+            return part, load_market
+    body = {"profile": parts["profile"].body.get("profile"), "recommendation": parts["recommendation"].body, "risk": parts["risk"].body}
+    return _Upstream(200, body), load_market
+
+
 @app.get("/report/download")
 def download_report():
     auth = _bearer()
     if not auth:
         return jsonify({"detail": "Missing bearer token"}), 401
 
-    profile = requests.get(f"{FASTAPI_BASE}/profile", headers={"Authorization": auth}, timeout=10).json().get("profile")
-    rec = requests.get(f"{FASTAPI_BASE}/ai/recommendation", headers={"Authorization": auth}, timeout=10)
-    risk = requests.get(f"{FASTAPI_BASE}/ai/risk", headers={"Authorization": auth}, timeout=10)
-    market = requests.get(f"{FASTAPI_BASE}/insights/market-prices", headers={"Authorization": auth}, timeout=10).json().get("items", [])
-
-    if rec.status_code != 200 or risk.status_code != 200:
+    headers = {
+        "Content-Type": "text/html; charset=utf-8",
+        "Content-Disposition": 'attachment; filename="krishirakshak_ai_report.html"',
+    }
+    cache_key = hashlib.sha256(auth.encode("utf-8")).hexdigest()
+    cached = _report_cache.get(cache_key)
+    summary, load_market = _fetch_report_data(auth, etag=cached[0] if cached else None)
+    if summary is not None and summary.status == 304 and cached:
+        return Response(cached[1], headers=headers)
+    if summary is None:
+        return jsonify({"detail": "Upstream service did not respond in time."}), 504
+    if summary.status == 401:
+        return jsonify({"detail": "Invalid token"}), 401
+    if summary.status != 200:
         return jsonify({"detail": "Complete your profile first (location + soil/farm details)."}), 400
 
-    rec_json = rec.json()
-    risk_json = risk.json()
-
-    html = f"""<!doctype html>
-<html>
-  <head>
-    <meta charset="utf-8" />
-    <title>KrishiRakshak AI Report</title>
-    <style>
-      body {{ font-family: Arial, sans-serif; margin: 24px; color: #0b1220; }}
-      .brand {{ display:flex; align-items:center; gap:10px; margin-bottom: 18px; }}
-      .logo {{ width: 40px; height: 40px; border-radius: 10px; background:#0ea371; display:flex; align-items:center; justify-content:center; color:white; font-weight:700; }}
-      h2 {{ margin-top: 20px; }}
-      .card {{ border:1px solid #e6e8ee; border-radius: 12px; padding: 14px; margin-top: 10px; }}
-      table {{ border-collapse: collapse; width: 100%; }}
-      td, th {{ border: 1px solid #e6e8ee; padding: 8px; text-align:left; }}
-      .muted {{ color:#5b6477; }}
-    </style>
-  </head>
-  <body>
-    <div class="brand">
-      <div class="logo">KA</div>
-      <div>
-        <div style="font-size:18px;font-weight:800;">KrishiRakshak AI</div>
-        <div class="muted">Smart Agriculture & AgriTech Report • Generated {_utc_now()}</div>
-      </div>
-    </div>
-
-    <h2>Farm Profile</h2>
-    <div class="card"><pre style="white-space:pre-wrap;margin:0;">{profile}</pre></div>
-
-    <h2>AI Crop Recommendations</h2>
-    <div class="card">
-      <div class="muted">{rec_json.get("rationale","")}</div>
-      <table style="margin-top:10px;">
-        <thead><tr><th>Crop</th><th>Confidence</th><th>Why</th></tr></thead>
-        <tbody>
-          {''.join([f"<tr><td>{c['crop']}</td><td>{c['confidence']:.2f}</td><td>{c['why']}</td></tr>" for c in rec_json.get("recommended_crops",[])])}
-        </tbody>
-      </table>
-    </div>
-
-    <h2>Crop Risk Prediction</h2>
-    <div class="card">
-      <div><b>Risk level:</b> {risk_json.get("risk_level")} ({risk_json.get("risk_score"):.2f})</div>
-      <div style="margin-top:8px;"><b>Top risks:</b> {', '.join(risk_json.get("top_risks",[]))}</div>
-      <div style="margin-top:8px;"><b>Mitigation:</b>
-        <ul>{''.join([f"<li>{m}</li>" for m in risk_json.get("mitigation",[])])}</ul>
-      </div>
-    </div>
-
-    <h2>Market Price Insights (sample)</h2>
-    <div class="card">
-      <table>
-        <thead><tr><th>Commodity</th><th>Market</th><th>Price (₹/quintal)</th><th>Trend</th></tr></thead>
-        <tbody>
-          {''.join([f"<tr><td>{i['commodity']}</td><td>{i['market']}</td><td>{i['price_inr_per_quintal']}</td><td>{i['trend']}</td></tr>" for i in market])}
-        </tbody>
-      </table>
-    </div>
-  </body>
-</html>"""
-
-    filename = "krishirakshak_ai_report.html"
-    return Response(
-        html,
-        headers={
-            "Content-Type": "text/html; charset=utf-8",
-            "Content-Disposition": f'attachment; filename="{filename}"',
-        },
-    )
-
+    data = summary.body
+    sections = {
+        "generated_at": lambda: escape(_utc_now()),
+        "profile": lambda: render_profile(data.get("profile")),
+        "recommendations": lambda: render_recommendations(data.get("recommendation") or {}),
+        "risk": lambda: render_risk(data.get("risk") or {}),
+        # Market prices are optional: the rest of the report renders even if they are missing.
+        "market": lambda: render_market(load_market()),
+    }
+
+    def stream():
+        chunks = []
+        for chunk in render_report(sections):
+            chunks.append(chunk)
+            yield chunk
+        if summary.etag:
+            _report_cache.set(cache_key, summary.etag, b"".join(chunks))
+
+    return Response(stream(), headers=headers)
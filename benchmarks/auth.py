@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+# Per-request auth overhead: the original decode path (config rebuilt from os.environ, full HS256 verify)
+# against the resolved config + prepared key, and against a verified-token cache hit.
+# Usage: python -m fastapi_app.benchmarks.auth [--iterations 50000]
+
+import argparse
+import os
+import time
+
+import jwt
+
+from .. import security
+
+
+def _original_decode(token: str) -> dict:
+    secret = os.environ.get("KRISHIRAKSHAK_JWT_SECRET", "") or "dev-only-change-me"
+    cfg = security.JwtConfig(secret=secret)
+    return jwt.decode(token, cfg.secret, algorithms=["HS256"], issuer=cfg.issuer)
+
+
+def _per_call_us(fn, token: str, iterations: int) -> float:
+    fn(token)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn(token)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--iterations", type=int, default=50_000)
+    args = ap.parse_args()
+
+    token = security.create_access_token(user_id=1, email="bench@example.com", name="Bench")
+    original = _per_call_us(_original_decode, token, args.iterations)
+    resolved = _per_call_us(security.decode_token, token, args.iterations)
+    cached = _per_call_us(security.verify_token, token, args.iterations)
+    print(f"original decode_token:        {original:8.2f} us/request")
+    print(f"resolved config + key:        {resolved:8.2f} us/request")
+    print(f"verified-token cache hit:     {cached:8.2f} us/request  ({original / cached:.0f}x)")
+    print(security.token_cache_stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+# Throughput of POST /ai/{recommendation,risk}/batch against one authenticated GET per farm.
+# Usage: python -m fastapi_app.benchmarks.batch_scoring [--farms 500] [--concurrency 16]
+
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from .harness import open_connection, request, seed_profiles, serve, token_for
+from .ml_batch import random_contexts
+
+
+async def _one_at_a_time(port: int, user_ids: list[int], concurrency: int) -> float:
+    queue: asyncio.Queue[int] = asyncio.Queue()
+    for uid in user_ids:
+        queue.put_nowait(uid)
+
+    async def worker() -> None:
+        reader, writer = await open_connection(port)
+        while not queue.empty():
+            auth = {"Authorization": f"Bearer {token_for(queue.get_nowait())}"}
+            for path in ("/ai/recommendation", "/ai/risk"):
+                status, _, _ = await request(reader, writer, "GET", path, auth)
+                assert status == 200, status
+        writer.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - started
+
+
+async def _batched(port: int, token: str, farms: int) -> float:
+    ctxs, lats, lons = random_contexts(farms)
+    payload = {
+        "farms": [
+            {"ph": c.ph, "nitrogen": c.n, "phosphorus": c.p, "potassium": c.k, "soil_type": c.soil_type,
+             "irrigation_type": c.irrigation_type, "season": c.season if c.season in ("Kharif", "Rabi", "Zaid", "All") else None,
+             "latitude": lat, "longitude": lon}
+            for c, lat, lon in zip(ctxs, lats, lons)
+        ]
+    }
+    body = json.dumps(payload).encode()
+    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+    reader, writer = await open_connection(port)
+    started = time.perf_counter()
+    for path in ("/ai/recommendation/batch", "/ai/risk/batch"):
+        status, _, data = await request(reader, writer, "POST", path, headers, body)
+        assert status == 200 and data.count(b"\n") == farms, (status, data[:200])
+    elapsed = time.perf_counter() - started
+    writer.close()
+    return elapsed
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--farms", type=int, default=500)
+    ap.add_argument("--concurrency", type=int, default=16)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "batch.db"
+        user_ids = seed_profiles(db_path, args.farms)
+        with serve(env={"KRISHIRAKSHAK_DB_PATH": str(db_path), "KRISHIRAKSHAK_BATCH_MAX_FARMS": str(max(500, args.farms))}) as port:
+            single = asyncio.run(_one_at_a_time(port, user_ids, args.concurrency))
+            batched = asyncio.run(_batched(port, token_for(user_ids[0]), args.farms))
+
+    print(f"one farm per request ({args.concurrency} clients): {args.farms / single:10,.0f} farms/s  ({2 * args.farms} requests)")
+    print(f"batch endpoints:                         {args.farms / batched:10,.0f} farms/s  (2 requests, {single / batched:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
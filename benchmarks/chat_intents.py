@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+# Intent matching throughput over a corpus of farmer messages (English, Hindi, romanized Hindi, mixed) from one
+# line up to the 2000-char limit: the old four-list scan, substring scans over the full keyword set, and the
+# compiled matcher.
+# Also times compiling the data file and a hot reload.
+# Usage: python -m fastapi_app.benchmarks.chat_intents [--messages 20000]
+
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from .. import chat
+from .harness import percentile_ms
+
+_FRAGMENTS = (
+    "what is the mandi price of wheat in Karnal today",
+    "my tomato plants have yellow leaves and some pest on the underside",
+    "how do I apply for PM Kisan and crop insurance under PMFBY",
+    "soil test shows ph 5.4 with low nitrogen, which fertilizer should I use",
+    "will there be rain next week, should I delay spraying",
+    "gehu ka mandi bhav kya chal raha hai",
+    "meri fasal mein keeda lag gaya hai kya karun",
+    "mitti ki jaanch kahan karwayen aur khad kitni daalein",
+    "मेरे खेत में पानी भर गया है, धान की फसल का क्या होगा",
+    "प्याज का भाव आज नासिक मंडी में क्या है",
+    "किसान सम्मान निधि की किस्त कब आएगी",
+    "गेहूं में पीला रतुआ रोग दिख रहा है, कौन सी दवा डालें",
+    "we have two acres near the canal and we grew cotton last year",
+    "my father has been farming for thirty years but the yields keep dropping",
+    "the seller in the village offers less than the government rate",
+    "last season the hailstorm damaged almost half of our mustard",
+    "thank you for the help earlier, it worked well",
+    "हम लोग बहुत परेशान हैं, पिछले साल भी नुकसान हुआ था",
+    "bhai sahab koi achha upay batao",
+)
+
+
+def corpus(n: int, seed: int = 12) -> list[str]:
+    # Mostly short chat messages with a long tail up to the API's 2000-character limit.
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        target = min(2000, max(15, int(rng.lognormvariate(4.6, 1.0))))
+        parts, size = [], 0
+        while size < target:
+            part = rng.choice(_FRAGMENTS)
+            parts.append(part)
+            size += len(part) + 2
+        out.append((". ".join(parts))[:target])
+    return out
+
+
+def legacy_reply(message: str) -> tuple[str, list[str]]:
+    # The previous main._chat_reply keyword scans (replies elided): first matching list wins.
+    m = message.lower().strip()
+    if any(k in m for k in ["price", "market", "mandi"]):
+        return "", ["market_price"]
+    if any(k in m for k in ["scheme", "subsidy", "pm-kisan", "pmfby", "insurance"]):
+        return "", ["gov_scheme"]
+    if any(k in m for k in ["soil", "ph", "npk", "fertilizer"]):
+        return "", ["soil_advice"]
+    if any(k in m for k in ["risk", "disease", "pest", "weather"]):
+        return "", ["risk"]
+    return "", ["general"]
+
+
+def substring_matcher(matcher: chat.IntentMatcher):
+    # The old approach stretched to the same keyword set: one substring scan per keyword, every intent.
+    by_intent: dict[str, list[str]] = {}
+    for word, owners in matcher._hits.items():
+        for name, _ in owners:
+            by_intent.setdefault(name, []).append(word)
+    lists = list(by_intent.items())
+
+    def reply(message: str) -> list[str]:
+        m = message.casefold()
+        return [name for name, words in lists if any(w in m for w in words)]
+
+    return reply
+
+
+def _run(fn, messages: list[str]) -> tuple[float, list[float]]:
+    times = []
+    started = time.perf_counter()
+    for msg in messages:
+        t = time.perf_counter()
+        fn(msg)
+        times.append(time.perf_counter() - t)
+    return time.perf_counter() - started, times
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--messages", type=int, default=20_000)
+    args = ap.parse_args()
+
+    messages = corpus(args.messages)
+    chars = sum(len(m) for m in messages)
+    lengths = sorted(len(m) for m in messages)
+    print(f"{len(messages):,} messages, {chars / 1e6:.1f}M chars, length p50 {lengths[len(lengths) // 2]} "
+          f"p99 {lengths[int(len(lengths) * 0.99)]} max {lengths[-1]}")
+
+    matcher = chat.get_matcher()
+    runs = (
+        ("legacy (4 lists, first hit)", legacy_reply),
+        (f"substring, {matcher.keyword_count} keywords", substring_matcher(matcher)),
+        ("compiled matcher", matcher.reply),
+    )
+    for name, fn in runs:
+        elapsed, times = _run(fn, messages)
+        print(f"{name:>28}: {len(messages) / elapsed:,.0f} msg/s, {chars / elapsed / 1e6:.1f}M chars/s, "
+              f"p50 {percentile_ms(times, 50):.3f} ms p99 {percentile_ms(times, 99):.3f} ms")
+
+    multi = sum(len(matcher.match(m)) > 1 for m in messages)
+    hindi = [m for m in messages if chat._DEVANAGARI.search(m)]
+    legacy_hi = sum(legacy_reply(m)[1] != ["general"] for m in hindi)
+    compiled_hi = sum(bool(matcher.match(m)) for m in hindi)
+    print(f"messages with several intents: {multi:,}; Devanagari messages with an intent: "
+          f"legacy {legacy_hi:,}/{len(hindi):,}, compiled {compiled_hi:,}/{len(hindi):,}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "intents.json"
+        shutil.copy(chat.INTENTS_PATH, path)
+        started = time.perf_counter()
+        chat.IntentMatcher.from_file(path)
+        print(f"compile {matcher.keyword_count} keywords: {(time.perf_counter() - started) * 1e3:.1f} ms")
+
+        holder = chat._ReloadingMatcher(path, interval=0.0)
+        holder.get()
+        spec = json.loads(path.read_text(encoding="utf-8"))
+        spec["intents"][0]["keywords"]["en"].append("tamatar")
+        path.write_text(json.dumps(spec, ensure_ascii=False), encoding="utf-8")
+        os.utime(path, ns=(time.time_ns(), time.time_ns() + 1_000_000))
+        started = time.perf_counter()
+        found = [m.name for m in holder.get().match("tamatar")]
+        print(f"hot reload picked up an edit in {(time.perf_counter() - started) * 1e3:.1f} ms: {found}, reloads {holder.reloads}")
+
+
+if __name__ == "__main__":
+    main()
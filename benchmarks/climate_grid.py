@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+# Point-lookup cost and resident memory of the memory-mapped climate grid at national 1 km resolution.
+# Usage: python -m fastapi_app.benchmarks.climate_grid [--resolution 0.01] [--lookups 200000]
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from .. import climate
+
+
+def rss_mib() -> float:
+    # Linux only: resident set size of this process.
+    with open("/proc/self/status") as fh:
+        for line in fh:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--resolution", type=float, default=0.01)
+    ap.add_argument("--lookups", type=int, default=200_000)
+    ap.add_argument("--batch", type=int, default=1_000_000)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(3)
+    lats = rng.uniform(8.0, 35.0, args.lookups)
+    lons = rng.uniform(68.0, 97.0, args.lookups)
+    batch_lats = rng.uniform(8.0, 35.0, args.batch)
+    batch_lons = rng.uniform(68.0, 97.0, args.batch)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "climate_grid.npy"
+        started = time.perf_counter()
+        climate.generate_synthetic(path, resolution_deg=args.resolution)
+        size = path.stat().st_size / 2**20
+        print(f"generated grid in {time.perf_counter() - started:.1f}s: {size:.1f} MiB on disk")
+
+        base = rss_mib()
+        started = time.perf_counter()
+        grid = climate.ClimateGrid.open(path)
+        print(f"open (mmap): {(time.perf_counter() - started) * 1e3:.2f} ms, {grid.rows} x {grid.cols} cells, "
+              f"+{rss_mib() - base:.1f} MiB resident")
+
+        # Cold-ish pages first: the first pass faults in whatever the random points touch.
+        for label in ("first pass", "warm"):
+            started = time.perf_counter()
+            for lat, lon in zip(lats.tolist(), lons.tolist()):
+                grid.lookup(lat, lon)
+            per = (time.perf_counter() - started) / args.lookups
+            print(f"scalar lookup ({label}): {per * 1e6:.2f} us/lookup, +{rss_mib() - base:.1f} MiB resident")
+
+        started = time.perf_counter()
+        grid.lookup_many(batch_lats, batch_lons)
+        per = (time.perf_counter() - started) / args.batch
+        print(f"vectorized lookup of {args.batch:,} points: {per * 1e9:.0f} ns/point, +{rss_mib() - base:.1f} MiB resident")
+
+        # Typical serving pattern: farms cluster, so only a fraction of the grid is ever touched.
+        del grid
+        base = rss_mib()
+        grid = climate.ClimateGrid.open(path)
+        centre = rng.uniform([18.0, 74.0], [30.0, 88.0], (200, 2))
+        pts = centre[rng.integers(0, 200, args.lookups)] + rng.normal(0, 0.1, (args.lookups, 2))
+        for lat, lon in pts.tolist():
+            grid.lookup(lat, lon)
+        print(f"clustered lookups (200 districts): +{rss_mib() - base:.1f} MiB resident of {size:.1f} MiB")
+
+        del grid
+        base = rss_mib()
+        eager = np.load(path)
+        print(f"for comparison, np.load without mmap: +{rss_mib() - base:.1f} MiB resident")
+        del eager
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+# Crop recommendations against catalogs from the shipped 8 crops up to 500: per-call latency of the compiled
+# per-season arrays next to a per-crop loop over the same data (the previous approach, stretched to a catalog),
+# batch throughput, and that both give identical results, ties included.
+# Usage: python -m fastapi_app.benchmarks.crop_catalog [--crops 8 50 100 500] [--farms 5000]
+
+import argparse
+import dataclasses
+import json
+import random
+import time
+
+from .. import ml
+from .harness import percentile_ms
+from .ml_batch import random_contexts
+
+_SOILS = list(ml.SOIL_CODES) + ["Black cotton soil", "Sandy loam", "Loamy", "gravel", None]
+_KEYS = {group: {code: key for key, code in keys.items()} for group, keys, _ in ml._MODIFIERS}
+
+
+def synthetic_spec(crops: int, seed: int = 5) -> dict:
+    # Coefficients rounded to 0.01 so many crops tie; about a third of the crops carry modifiers.
+    rng = random.Random(seed)
+    spec = {"version": f"bench-{crops}", "max_confidence": 0.95, "crops": []}
+    for i in range(crops):
+        crop = {
+            "crop": f"Crop {i}",
+            "season": rng.sample(["kharif", "rabi", "zaid"], rng.choice([1, 1, 1, 2])),
+            "base": round(rng.uniform(0.35, 0.6), 2),
+            "slope": round(rng.uniform(0.1, 0.35), 2),
+            "why": f"Synthetic crop {i}.",
+        }
+        for group, keys, _ in ml._MODIFIERS:
+            if rng.random() < 0.35:
+                crop[group] = {key: round(rng.uniform(-0.08, 0.08), 2) for key in rng.sample(list(keys), rng.randint(1, 2))}
+        spec["crops"].append(crop)
+    return spec
+
+
+def contexts(n: int, seed: int = 6) -> list[ml.FarmContext]:
+    rng = random.Random(seed)
+    ctxs, _, _ = random_contexts(n, seed=seed)
+    return [dataclasses.replace(c, soil_type=rng.choice(_SOILS)) for c in ctxs]
+
+
+def loop_recommend(ctx: ml.FarmContext, spec: dict, top_k: int = 6) -> list[dict]:
+    # One dict per applicable crop straight from the data file, then a full sort.
+    score = ml._score_soil_balance(ctx.n, ctx.p, ctx.k)
+    season = ml._season_code(ctx.season)
+    codes = {"ph": ml._ph_band(ctx.ph), "soil": ml._soil_code(ctx.soil_type), "irrigation": ml._irrigation_code(ctx.irrigation_type)}
+    wanted = {1: "kharif", 2: "rabi", 3: "zaid"}.get(season)
+    crops = []
+    for c in spec["crops"]:
+        seasons = [c["season"]] if isinstance(c["season"], str) else c["season"]
+        if season == 5 or (wanted is not None and wanted not in seasons):
+            continue
+        conf = c["base"] + c["slope"] * score
+        for group, code in codes.items():
+            conf = conf + c.get(group, {}).get(_KEYS[group].get(code), 0.0)
+        conf = min(max(conf, 0.0), spec["max_confidence"])
+        crops.append({"crop": c["crop"], "confidence": conf, "why": c["why"]})
+    return sorted(crops, key=lambda x: x["confidence"], reverse=True)[:top_k]
+
+
+def _per_call(fn, ctxs: list) -> list[float]:
+    times = []
+    for ctx in ctxs:
+        started = time.perf_counter()
+        fn(ctx)
+        times.append(time.perf_counter() - started)
+    return times
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--crops", type=int, nargs="+", default=[8, 50, 100, 500])
+    ap.add_argument("--farms", type=int, default=5000)
+    ap.add_argument("--batch", type=int, default=256, help="farms per batch call (the scoring scheduler's batch size)")
+    args = ap.parse_args()
+
+    ctxs = contexts(args.farms)
+    batch = ml.FarmBatch.from_contexts(ctxs)
+    for size in args.crops:
+        if size == len(ml.CATALOG.names):
+            spec = json.loads(ml.CROP_CATALOG_PATH.read_text(encoding="utf-8"))
+            name = f"{size} crops (crops.json)"
+        else:
+            spec = synthetic_spec(size)
+            name = f"{size} crops"
+        started = time.perf_counter()
+        catalog = ml.CropCatalog(spec, version=spec["version"])
+        compiled = time.perf_counter() - started
+
+        rec = ml.recommend_crops_batch(batch, catalog=catalog)
+        for i, ctx in enumerate(ctxs):
+            expected = loop_recommend(ctx, spec)
+            if ml.recommend_crops(ctx, catalog=catalog)[0] != expected or rec.row(i)[0] != expected:
+                raise AssertionError(f"{name}: mismatch for {ctx}")
+
+        loop = _per_call(lambda ctx: loop_recommend(ctx, spec), ctxs)
+        arrays = _per_call(lambda ctx: ml.recommend_crops(ctx, catalog=catalog), ctxs)
+        started = time.perf_counter()
+        for lo in range(0, len(ctxs), args.batch):
+            part = ml.FarmBatch(**{f: getattr(batch, f)[lo : lo + args.batch] for f in ml.FarmBatch.__dataclass_fields__})
+            ml.recommend_crops_batch(part, catalog=catalog)
+        rate = len(ctxs) / (time.perf_counter() - started)
+        # percentile_ms rounds to 0.01 ms; scale to report microseconds.
+        print(f"{name:>22}: compile {compiled * 1e3:5.1f} ms | per call p50/p99 loop "
+              f"{percentile_ms([t * 1e3 for t in loop], 50):7.1f}/{percentile_ms([t * 1e3 for t in loop], 99):7.1f} us, "
+              f"arrays {percentile_ms([t * 1e3 for t in arrays], 50):5.1f}/{percentile_ms([t * 1e3 for t in arrays], 99):5.1f} us | "
+              f"batch of {args.batch}: {rate:,.0f} farms/s | identical for {len(ctxs):,} farms")
+
+
+if __name__ == "__main__":
+    main()
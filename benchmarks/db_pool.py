@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+# Compare requests/sec of the pooled WAL connection layer against the legacy open-per-request path.
+# Usage: python -m fastapi_app.benchmarks.db_pool [--requests 20000] [--workers 40] [--profiles 10000]
+
+import argparse
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+from .. import db
+
+
+def _seed(path: Path, profiles: int) -> None:
+    pool = db.ConnectionPool(path, size=1)
+    with pool.connection() as conn:
+        conn.execute(
+            "CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, email TEXT UNIQUE NOT NULL, name TEXT NOT NULL,"
+            " password_hash TEXT NOT NULL, salt TEXT NOT NULL, created_at TEXT NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE farm_profiles (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, latitude REAL,"
+            " longitude REAL, location_name TEXT, soil_type TEXT, ph REAL, nitrogen REAL, phosphorus REAL, potassium REAL,"
+            " farm_size_acres REAL, irrigation_type TEXT, season TEXT, last_updated TEXT NOT NULL)"
+        )
+        conn.executemany(
+            "INSERT INTO users(id, email, name, password_hash, salt, created_at) VALUES (?, ?, ?, '', '', '')",
+            ((i, f"u{i}@example.com", f"User {i}") for i in range(1, profiles + 1)),
+        )
+        conn.executemany(
+            "INSERT INTO farm_profiles(user_id, ph, nitrogen, phosphorus, potassium, season, last_updated) VALUES (?, 6.5, 50, 20, 30, 'Rabi', '')",
+            ((i,) for i in range(1, profiles + 1)),
+        )
+        conn.execute("CREATE INDEX idx_bench_user ON farm_profiles(user_id)")
+    pool.close()
+
+
+@contextmanager
+def _open_per_request():
+    conn = db._connect()
+    try:
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _run(get_conn, *, requests: int, workers: int, profiles: int, write_ratio: float) -> float:
+    rng = random.Random(7)
+    plan = [(rng.randint(1, profiles), rng.random() < write_ratio) for _ in range(requests)]
+
+    def one(item: tuple[int, bool]) -> None:
+        user_id, write = item
+        with get_conn() as conn:
+            if write:
+                conn.execute("UPDATE farm_profiles SET ph = ph, last_updated = ? WHERE user_id = ?", (str(time.time()), user_id))
+            else:
+                conn.execute("SELECT * FROM farm_profiles WHERE user_id = ?", (user_id,)).fetchone()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        for _ in ex.map(one, plan):
+            pass
+    return requests / (time.perf_counter() - started)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=20_000)
+    ap.add_argument("--workers", type=int, default=40)  # Starlette's default threadpool size
+    ap.add_argument("--profiles", type=int, default=10_000)
+    ap.add_argument("--pool-size", type=int, default=db.POOL_SIZE)
+    ap.add_argument("--write-ratio", type=float, default=0.1)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.db"
+        _seed(path, args.profiles)
+        db.DB_PATH = path
+        kw = dict(requests=args.requests, workers=args.workers, profiles=args.profiles, write_ratio=args.write_ratio)
+
+        legacy = _run(_open_per_request, **kw)
+        pool = db.ConnectionPool(path, size=args.pool_size)
+        pooled = _run(pool.connection, **kw)
+        stats = pool.stats()
+        pool.close()
+
+    print(f"open-per-request: {legacy:10.0f} req/s")
+    print(f"pooled (size={args.pool_size}): {pooled:10.0f} req/s  ({pooled / legacy:.1f}x)")
+    print(f"pool stats: {stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+# Shared pieces for the HTTP benchmarks: a stdlib-only keep-alive HTTP/1.1 client, uvicorn and Flask launchers
+# and a direct SQLite seeder so large fixtures don't pay PBKDF2 per user.
+
+import asyncio
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import ContextManager, Iterator, Optional
+
+from ..db import ConnectionPool, migrate
+from ..security import create_access_token
+
+PACKAGE = __package__.rsplit(".", 1)[0]
+BACKEND_DIR = Path(__file__).absolute().parents[2]
+
+
+async def open_connection(port: int):
+    return await asyncio.open_connection("127.0.0.1", port)
+
+
+async def request(reader, writer, method: str, path: str, headers: Optional[dict] = None, body: bytes = b"") -> tuple[int, dict, bytes]:
+    head = [f"{method} {path} HTTP/1.1", "Host: bench", f"Content-Length: {len(body)}"]
+    head += [f"{k}: {v}" for k, v in (headers or {}).items()]
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + body)
+    await writer.drain()
+    status_line = await reader.readline()
+    resp_headers: dict[str, str] = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        resp_headers[name.strip().lower()] = value.strip()
+    if resp_headers.get("transfer-encoding", "").lower() == "chunked":
+        parts = []
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            if size == 0:
+                await reader.readline()
+                break
+            parts.append(await reader.readexactly(size))
+            await reader.readline()
+        payload = b"".join(parts)
+    elif "content-length" not in resp_headers and resp_headers.get("connection", "").lower() == "close":
+        # Werkzeug's dev server streams without a length and closes the connection after the body.
+        payload = await reader.read()
+    else:
+        length = int(resp_headers.get("content-length", "0"))
+        payload = await reader.readexactly(length) if length else b""
+    return int(status_line.split()[1]), resp_headers, payload
+
+
+def percentile_ms(values: list[float], q: int) -> float:
+    if len(values) < 2:
+        return float("nan")
+    return round(statistics.quantiles(values, n=100)[q - 1] * 1000, 2)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(port: int, proc: subprocess.Popen, timeout: float) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited during startup (code {proc.returncode})")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("server did not become ready")
+
+
+@contextmanager
+def _launch(cmd: list[str], port: int, env: Optional[dict], timeout: float, output=None) -> Iterator[int]:
+    proc = subprocess.Popen(cmd, env=dict(os.environ, **(env or {})), cwd=str(BACKEND_DIR), stdout=output, stderr=output)
+    try:
+        _wait_ready(port, proc, timeout)
+        yield port
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def serve(app: str = "main:app", *, env: Optional[dict] = None, port: Optional[int] = None, extra_args: tuple = (), timeout: float = 30.0) -> ContextManager[int]:
+    port = port or free_port()
+    cmd = [sys.executable, "-m", "uvicorn", f"{PACKAGE}.{app}", "--port", str(port), "--log-level", "warning", "--backlog", "4096", *extra_args]
+    return _launch(cmd, port, env, timeout)
+
+
+def serve_flask(app: str = "app", *, env: Optional[dict] = None, port: Optional[int] = None, timeout: float = 30.0) -> ContextManager[int]:
+    # The report service under Flask's threaded dev server (as run_flask_report.ps1 runs it, minus the reloader).
+    # Its output is dropped: the dev server logs every request.
+    port = port or free_port()
+    cmd = [sys.executable, "-m", "flask", "--app", f"{PACKAGE}.{app}", "run", "--port", str(port), "--no-reload", "--no-debugger"]
+    return _launch(cmd, port, env, timeout, subprocess.DEVNULL)
+
+
+def seed_profiles(db_path: Path, users: int, *, seed: int = 5) -> list[int]:
+    # Writes users + farm_profiles straight into a migrated database; returns the user ids.
+    rng = random.Random(seed)
+    pool = ConnectionPool(db_path, size=1)
+    with pool.connection() as conn:
+        migrate(conn)
+        start = (conn.execute("SELECT COALESCE(MAX(id), 0) FROM users").fetchone()[0] or 0) + 1
+        ids = list(range(start, start + users))
+        conn.executemany(
+            "INSERT INTO users(id, email, name, password_hash, salt, created_at) VALUES (?, ?, ?, 'x', 'x', '2024-01-01T00:00:00+00:00')",
+            ((i, f"seed{i}@example.com", f"Farmer {i}") for i in ids),
+        )
+        conn.executemany(
+            "INSERT INTO farm_profiles(user_id, latitude, longitude, location_name, soil_type, ph, nitrogen, phosphorus, potassium,"
+            " farm_size_acres, irrigation_type, season, last_updated) VALUES (?, ?, ?, 'Seeded', ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                (
+                    i,
+                    rng.uniform(8, 35),
+                    rng.uniform(68, 97),
+                    rng.choice(["Loam", "Clay", "Sandy", "Black"]),
+                    round(rng.uniform(4.5, 8.8), 2),
+                    round(rng.uniform(10, 140), 1),
+                    round(rng.uniform(5, 70), 1),
+                    round(rng.uniform(10, 110), 1),
+                    round(rng.uniform(0.5, 12), 1),
+                    rng.choice(["drip", "canal", "sprinkler", None]),
+                    rng.choice(["Kharif", "Rabi", "Zaid"]),
+                    "2024-01-01T00:00:00+00:00",
+                )
+                for i in ids
+            ),
+        )
+    pool.close()
+    return ids
+
+
+def token_for(user_id: int) -> str:
+    return create_access_token(user_id=user_id, email=f"seed{user_id}@example.com", name=f"Farmer {user_id}")
+
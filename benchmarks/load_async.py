@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+# Load-test harness: p50/p99 latency at N concurrent keep-alive clients for each executor mode.
+# Usage: python -m fastapi_app.benchmarks.load_async [--clients 1000] [--requests-per-client 5] [--modes executor threadpool]
+#
+# Each mode gets its own uvicorn process and a fresh SQLite database. The request mix is mostly
+# /profile and /ai/* reads with a slice of /auth/login so PBKDF2 competes with the DB reads.
+
+import argparse
+import asyncio
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from .harness import open_connection, percentile_ms, request, serve
+
+
+async def _seed(port: int, users: int) -> list[str]:
+    reader, writer = await open_connection(port)
+    tokens = []
+    for i in range(users):
+        body = json.dumps({"email": f"bench{i}@example.com", "name": f"Bench {i}", "password": "benchpass"}).encode()
+        status, _, payload = await request(reader, writer, "POST", "/auth/register", {"Content-Type": "application/json"}, body)
+        if status != 200:
+            raise RuntimeError(f"register failed: {status} {payload[:200]!r}")
+        token = json.loads(payload)["access_token"]
+        auth = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+        await request(reader, writer, "POST", "/profile/location", auth, json.dumps({"latitude": 26.9, "longitude": 75.8}).encode())
+        soil = {"soil_type": "Loam", "ph": 6.8, "nitrogen": 60, "phosphorus": 25, "potassium": 30, "season": "Rabi"}
+        await request(reader, writer, "POST", "/profile/soil-farm", auth, json.dumps(soil).encode())
+        tokens.append(token)
+    writer.close()
+    return tokens
+
+
+async def _client(port: int, tokens: list[str], n: int, login_ratio: float, rng: random.Random, out: list[float], errors: list[int]) -> None:
+    try:
+        reader, writer = await open_connection(port)
+    except OSError:
+        errors.append(0)
+        return
+    for _ in range(n):
+        i = rng.randrange(len(tokens))
+        started = time.perf_counter()
+        if rng.random() < login_ratio:
+            body = json.dumps({"email": f"bench{i}@example.com", "password": "benchpass"}).encode()
+            status, _, _ = await request(reader, writer, "POST", "/auth/login", {"Content-Type": "application/json"}, body)
+        else:
+            path = rng.choice(("/profile", "/ai/risk", "/ai/recommendation"))
+            status, _, _ = await request(reader, writer, "GET", path, {"Authorization": f"Bearer {tokens[i]}"})
+        out.append(time.perf_counter() - started)
+        if status != 200:
+            errors.append(status)
+    writer.close()
+
+
+async def _drive(port: int, args) -> dict:
+    tokens = await _seed(port, args.users)
+    rng = random.Random(11)
+    latencies: list[float] = []
+    errors: list[int] = []
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(_client(port, tokens, args.requests_per_client, args.login_ratio, random.Random(rng.random()), latencies, errors) for _ in range(args.clients))
+    )
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": percentile_ms(latencies, 50),
+        "p99_ms": percentile_ms(latencies, 99),
+    }
+
+
+def run_mode(mode: str, args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {"KRISHIRAKSHAK_EXECUTOR_MODE": mode, "KRISHIRAKSHAK_DB_PATH": str(Path(tmp) / "load.db")}
+        with serve(env=env, port=args.port) as port:
+            return asyncio.run(_drive(port, args))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--clients", type=int, default=1000)
+    ap.add_argument("--requests-per-client", type=int, default=5)
+    ap.add_argument("--users", type=int, default=50)
+    ap.add_argument("--login-ratio", type=float, default=0.05)
+    ap.add_argument("--port", type=int, default=None)
+    ap.add_argument("--modes", nargs="+", default=["threadpool", "executor"])
+    args = ap.parse_args()
+    for mode in args.modes:
+        print(mode, json.dumps(run_mode(mode, args)))
+
+
+if __name__ == "__main__":
+    main()
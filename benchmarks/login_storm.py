@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+# /profile latency with and without a concurrent login storm, plus how the storm's logins were answered
+# (200 vs 503 backpressure). Throttles are disabled so the hashing queue is what pushes back.
+# Usage: python -m fastapi_app.benchmarks.login_storm [--storm-clients 200] [--seconds 10]
+
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+from .harness import open_connection, percentile_ms, request, seed_profiles, serve, token_for
+
+
+async def _register(port: int, users: int) -> None:
+    reader, writer = await open_connection(port)
+    for i in range(users):
+        body = json.dumps({"email": f"storm{i}@example.com", "name": f"Storm {i}", "password": "stormpass"}).encode()
+        status, _, payload = await request(reader, writer, "POST", "/auth/register", {"Content-Type": "application/json"}, body)
+        if status != 200:
+            raise RuntimeError(f"register failed: {status} {payload[:200]!r}")
+    writer.close()
+
+
+async def _probe(port: int, token: str, until: float, out: list[float]) -> None:
+    reader, writer = await open_connection(port)
+    auth = {"Authorization": f"Bearer {token}"}
+    while time.perf_counter() < until:
+        started = time.perf_counter()
+        status, _, _ = await request(reader, writer, "GET", "/profile", auth)
+        assert status == 200, status
+        out.append(time.perf_counter() - started)
+        await asyncio.sleep(0.01)
+    writer.close()
+
+
+async def _stormer(port: int, i: int, users: int, until: float, outcomes: Counter) -> None:
+    reader, writer = await open_connection(port)
+    body = json.dumps({"email": f"storm{i % users}@example.com", "password": "stormpass"}).encode()
+    while time.perf_counter() < until:
+        status, headers, _ = await request(reader, writer, "POST", "/auth/login", {"Content-Type": "application/json"}, body)
+        outcomes[status] += 1
+        if headers.get("connection") == "close":
+            writer.close()
+            reader, writer = await open_connection(port)
+    writer.close()
+
+
+async def _phase(port: int, token: str, seconds: float, storm_clients: int, users: int) -> tuple[list[float], Counter]:
+    until = time.perf_counter() + seconds
+    latencies: list[float] = []
+    outcomes: Counter = Counter()
+    await asyncio.gather(_probe(port, token, until, latencies), *(_stormer(port, i, users, until, outcomes) for i in range(storm_clients)))
+    return latencies, outcomes
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--storm-clients", type=int, default=200)
+    ap.add_argument("--users", type=int, default=20)
+    ap.add_argument("--seconds", type=float, default=10.0)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "storm.db"
+        probe_user = seed_profiles(db_path, 1)[0]
+        env = {
+            "KRISHIRAKSHAK_DB_PATH": str(db_path),
+            "KRISHIRAKSHAK_LOGIN_PER_EMAIL_PER_MINUTE": "0",
+            "KRISHIRAKSHAK_LOGIN_PER_IP_PER_MINUTE": "0",
+            "KRISHIRAKSHAK_REGISTER_PER_IP_PER_MINUTE": "0",
+        }
+        with serve(env=env) as port:
+            asyncio.run(_register(port, args.users))
+            token = token_for(probe_user)
+            quiet, _ = asyncio.run(_phase(port, token, args.seconds, 0, args.users))
+            stormy, outcomes = asyncio.run(_phase(port, token, args.seconds, args.storm_clients, args.users))
+
+    print(f"/profile quiet:       p50 {percentile_ms(quiet, 50):8.2f} ms  p99 {percentile_ms(quiet, 99):8.2f} ms")
+    print(f"/profile login storm: p50 {percentile_ms(stormy, 50):8.2f} ms  p99 {percentile_ms(stormy, 99):8.2f} ms")
+    print(f"storm logins by status: {dict(outcomes)}")
+
+
+if __name__ == "__main__":
+    main()
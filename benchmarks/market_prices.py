@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+# Bulk CSV ingest, rolling-stats maintenance and query latency for the market price store.
+# Usage: python -m fastapi_app.benchmarks.market_prices [--years 3] [--markets 2000] [--commodities 3]
+
+import argparse
+import csv
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+from .. import db, market
+
+COMMODITIES = ["Wheat", "Rice", "Maize", "Onion", "Potato", "Tomato", "Soyabean", "Cotton", "Mustard", "Gram"]
+STATES = ["Rajasthan", "Maharashtra", "Punjab", "Uttar Pradesh", "Madhya Pradesh", "Gujarat", "Karnataka", "Bihar"]
+
+
+def write_csv(path: Path, *, years: int, markets: int, commodities: int, seed: int = 9) -> int:
+    rng = random.Random(seed)
+    start = date(2024, 1, 1) - timedelta(days=365 * years)
+    rows = 0
+    with open(path, "w", newline="") as fh:
+        w = csv.writer(fh)
+        w.writerow(["State", "District", "Market", "Commodity", "Variety", "Grade", "Arrival_Date",
+                    "Min_x0020_Price", "Max_x0020_Price", "Modal_x0020_Price"])
+        for m in range(markets):
+            state = STATES[m % len(STATES)]
+            for commodity in COMMODITIES[:commodities]:
+                price = rng.uniform(1200, 3200)
+                for d in range(365 * years):
+                    price = max(300.0, price * (1 + rng.gauss(0, 0.01)))
+                    day = (start + timedelta(days=d)).strftime("%d/%m/%Y")
+                    w.writerow([state, f"District {m % 400}", f"Mandi {m:05d}", commodity, "FAQ", "FAQ", day,
+                                round(price * 0.95), round(price * 1.05), round(price)])
+                    rows += 1
+    return rows
+
+
+def _time(label: str, fn, repeat: int = 20) -> None:
+    fn()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    elapsed = (time.perf_counter() - started) / repeat
+    print(f"  {label:55s} {elapsed * 1e3:9.3f} ms  ({len(result[0])} rows)")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--years", type=int, default=3)
+    ap.add_argument("--markets", type=int, default=2000)
+    ap.add_argument("--commodities", type=int, default=3)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = Path(tmp) / "agmarknet.csv"
+        started = time.perf_counter()
+        rows = write_csv(csv_path, years=args.years, markets=args.markets, commodities=args.commodities)
+        print(f"generated {rows:,} rows ({csv_path.stat().st_size / 2**20:.0f} MiB) in {time.perf_counter() - started:.1f}s")
+
+        pool = db.ConnectionPool(Path(tmp) / "market.db", size=1)
+        with pool.connection() as conn:
+            db.migrate(conn)
+            started = time.perf_counter()
+            market.ingest_csv(conn, csv_path)
+            conn.commit()
+            elapsed = time.perf_counter() - started
+            print(f"ingested in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s); db size {(Path(tmp) / 'market.db').stat().st_size / 2**20:.0f} MiB")
+
+            series = conn.execute("SELECT COUNT(*) FROM market_latest").fetchone()[0]
+            started = time.perf_counter()
+            market.refresh_latest(conn)
+            conn.commit()
+            elapsed = time.perf_counter() - started
+            print(f"full rolling-stats rebuild: {series:,} series in {elapsed:.2f}s ({elapsed / series * 1e6:.0f} us/series)")
+
+            # Next day's prices for every series: only the touched series' trailing windows are re-read.
+            next_day = date(2024, 1, 1).isoformat()
+            latest = conn.execute("SELECT commodity, state, market, modal_price FROM market_latest").fetchall()
+            day_rows = [(c, "FAQ", st, None, m, next_day, None, None, round(p * 1.01), None) for c, st, m, p in latest]
+            started = time.perf_counter()
+            market.ingest_rows(conn, day_rows)
+            conn.commit()
+            elapsed = time.perf_counter() - started
+            print(f"daily incremental ingest: {len(day_rows):,} rows + stats in {elapsed:.2f}s")
+
+            page, cursor = market.latest_prices(conn, limit=50)
+            for _ in range(20):
+                page, cursor = market.latest_prices(conn, limit=50, cursor=cursor)
+            last = date(2024, 1, 1) - timedelta(days=1)
+            print("queries:")
+            _time("latest, first page of 50", lambda: market.latest_prices(conn, limit=50))
+            _time("latest, page 21 via keyset cursor", lambda: market.latest_prices(conn, limit=50, cursor=cursor))
+            _time("latest with rolling stats, page of 500", lambda: market.latest_prices(conn, limit=500))
+            _time("latest, state filter", lambda: market.latest_prices(conn, state="Punjab", limit=50))
+            _time("history, commodity+market, 1 year",
+                  lambda: market.price_history(conn, commodity="Wheat", market="Mandi 00042",
+                                               date_from=last - timedelta(days=365), date_to=last, limit=400))
+            _time("history, state+commodity, last 30 days, page of 100",
+                  lambda: market.price_history(conn, state="Gujarat", commodity="Rice",
+                                               date_from=last - timedelta(days=30), limit=100))
+            _time("history, all rows, page of 100", lambda: market.price_history(conn, limit=100))
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
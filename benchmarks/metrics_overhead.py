@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+# Cost of the metrics instrumentation. First the pieces in isolation: one histogram observation, the ASGI
+# middleware around an empty app, the per-statement SQLite trace hook and the ML timer. Then throughput at
+# saturation with KRISHIRAKSHAK_METRICS=1 against =0 (each a fresh uvicorn process on the same database),
+# alternating the two for several rounds: throughput and the server's CPU time per request (from /proc, so
+# Linux only). The load generator shares the machine, so round-to-round noise is several percent; the
+# estimate at the end (per-request cost of the pieces over CPU per request) is the steadier number. The
+# budget is 2%.
+# Usage: python -m fastapi_app.benchmarks.metrics_overhead [--clients 64] [--seconds 5] [--rounds 5]
+
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from .. import metrics, ml
+from .harness import open_connection, percentile_ms, request, seed_profiles, serve, token_for
+from .ml_batch import random_contexts
+
+_PATHS = ("/profile", "/ai/recommendation", "/ai/risk", "/insights/market-prices", "/health")
+
+
+def _per_call_us(fn, n: int) -> float:
+    started = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - started) / n * 1e6
+
+
+def micro(n: int = 200_000) -> dict:
+    hist = metrics.Histogram("bench_seconds", "", ("route",))
+    print(f"Histogram.observe: {_per_call_us(lambda: hist.observe(0.003, '/ai/risk'), n) * 1e3:.0f} ns")
+
+    async def empty(scope, receive, send) -> None:
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def noop(message) -> None:
+        pass
+
+    wrapped = metrics.MetricsMiddleware(empty)
+    scope = {"type": "http", "method": "GET", "path": "/x"}
+
+    async def drive(app, count: int) -> float:
+        started = time.perf_counter()
+        for _ in range(count):
+            await app(dict(scope), None, noop)
+        return (time.perf_counter() - started) / count * 1e6
+
+    bare, instrumented = asyncio.run(drive(empty, n // 4)), asyncio.run(drive(wrapped, n // 4))
+    print(f"ASGI middleware: {instrumented - bare:.2f} us per request ({bare:.2f} -> {instrumented:.2f})")
+
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, v TEXT)")
+    conn.executemany("INSERT INTO t VALUES (?, ?)", ((i, str(i)) for i in range(1000)))
+
+    def query() -> None:
+        conn.execute("SELECT v FROM t WHERE id = ?", (random.randrange(1000),)).fetchone()
+
+    plain = _per_call_us(query, n // 4)
+    conn.set_trace_callback(metrics.trace_statement)
+    token = metrics._request.set(metrics.RequestStats())
+    traced = _per_call_us(query, n // 4)
+    metrics._request.reset(token)
+    print(f"SQLite trace hook: {traced - plain:.2f} us per statement ({plain:.2f} -> {traced:.2f})")
+
+    ctxs, _, _ = random_contexts(2000, seed=3)
+    plain_fn = getattr(ml.recommend_crops, "__wrapped__", ml.recommend_crops)
+    untimed = statistics.median(_per_call_us(lambda: [plain_fn(c) for c in ctxs], 5) for _ in range(5)) / len(ctxs)
+    timed = statistics.median(_per_call_us(lambda: [ml.recommend_crops(c) for c in ctxs], 5) for _ in range(5)) / len(ctxs)
+    print(f"ML timer: {timed - untimed:.2f} us per recommend_crops call ({untimed:.2f} -> {timed:.2f})")
+    return {"middleware_us": instrumented - bare, "statement_us": traced - plain}
+
+
+def _server_cpu_seconds(port: int) -> float:
+    # utime + stime of the uvicorn process listening on `port`.
+    for entry in Path("/proc").iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            cmdline = (entry / "cmdline").read_bytes().split(b"\0")
+            stat = (entry / "stat").read_text()
+        except OSError:
+            continue
+        if b"uvicorn" in cmdline and str(port).encode() in cmdline:
+            fields = stat.rsplit(")", 1)[1].split()
+            return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    raise RuntimeError(f"no uvicorn process on port {port}")
+
+
+async def _client(port: int, tokens: list[str], deadline: float, rng: random.Random, out: list[float]) -> None:
+    reader, writer = await open_connection(port)
+    while time.perf_counter() < deadline:
+        path = rng.choice(_PATHS)
+        started = time.perf_counter()
+        status, _, _ = await request(reader, writer, "GET", path, {"Authorization": f"Bearer {rng.choice(tokens)}"})
+        if status != 200:
+            raise RuntimeError(f"{path} returned {status}")
+        out.append(time.perf_counter() - started)
+    writer.close()
+
+
+async def _drive(port: int, tokens: list[str], clients: int, seconds: float) -> dict:
+    # A short warm-up first so both variants are measured with warm caches.
+    rng = random.Random(3)
+    await asyncio.gather(*(_client(port, tokens, time.perf_counter() + 0.5, random.Random(rng.random()), []) for _ in range(clients)))
+    latencies: list[float] = []
+    cpu = _server_cpu_seconds(port)
+    started = time.perf_counter()
+    deadline = started + seconds
+    await asyncio.gather(*(_client(port, tokens, deadline, random.Random(rng.random()), latencies) for _ in range(clients)))
+    return {
+        "rps": len(latencies) / (time.perf_counter() - started),
+        "cpu_us": (_server_cpu_seconds(port) - cpu) / len(latencies) * 1e6,
+        "p50": percentile_ms(latencies, 50),
+        "p99": percentile_ms(latencies, 99),
+    }
+
+
+async def _statements_per_request(port: int) -> float:
+    reader, writer = await open_connection(port)
+    _, _, payload = await request(reader, writer, "GET", "/metrics")
+    writer.close()
+    sums = counts = 0.0
+    for line in payload.decode().splitlines():
+        if line.startswith("krishirakshak_request_db_statements_sum"):
+            sums += float(line.rsplit(" ", 1)[1])
+        elif line.startswith("krishirakshak_request_db_statements_count"):
+            counts += float(line.rsplit(" ", 1)[1])
+    return sums / counts if counts else 0.0
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--clients", type=int, default=64)
+    ap.add_argument("--seconds", type=float, default=5.0)
+    ap.add_argument("--rounds", type=int, default=5)
+    ap.add_argument("--users", type=int, default=200)
+    args = ap.parse_args()
+
+    costs = micro()
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "metrics.db"
+        tokens = [token_for(u) for u in seed_profiles(db_path, args.users)]
+        runs: dict[str, list[dict]] = {"off": [], "on": []}
+        for i in range(args.rounds):
+            # Alternate which variant goes first so warm-up effects don't favour one of them.
+            for variant in ("off", "on") if i % 2 == 0 else ("on", "off"):
+                env = {"KRISHIRAKSHAK_DB_PATH": str(db_path), "KRISHIRAKSHAK_METRICS": "1" if variant == "on" else "0"}
+                with serve(env=env) as port:
+                    runs[variant].append(asyncio.run(_drive(port, tokens, args.clients, args.seconds)))
+                    if variant == "on":
+                        statements = asyncio.run(_statements_per_request(port))
+    for variant, results in runs.items():
+        rounds = ", ".join(f"{r['rps']:.0f}" for r in results)
+        print(f"metrics {variant:>3}: {statistics.median(r['rps'] for r in results):8.1f} req/s (rounds: {rounds}), "
+              f"server CPU {statistics.median(r['cpu_us'] for r in results):6.0f} us/request, "
+              f"p50 {statistics.median(r['p50'] for r in results):.2f} ms, p99 {statistics.median(r['p99'] for r in results):.2f} ms")
+    paired = statistics.median(1 - on["rps"] / off["rps"] for off, on in zip(runs["off"], runs["on"]))
+    cpu_off = statistics.median(r["cpu_us"] for r in runs["off"])
+    cpu_on = statistics.median(r["cpu_us"] for r in runs["on"])
+    print(f"measured at saturation: throughput {paired * 100:+.2f}% (median of paired rounds), CPU per request "
+          f"{(cpu_on / cpu_off - 1) * 100:+.2f}%")
+    estimate = costs["middleware_us"] + statements * costs["statement_us"]
+    print(f"estimated: {costs['middleware_us']:.1f} us middleware + {statements:.1f} statements x {costs['statement_us']:.2f} us "
+          f"= {estimate:.1f} us per request, {estimate / cpu_off * 100:.2f}% of {cpu_off:.0f} us CPU per request (budget 2%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+# Parity check and throughput of the batch scoring path against the scalar ml functions.
+# Usage: python -m fastapi_app.benchmarks.ml_batch [--parity 20000] [--sizes 1000 10000 100000 1000000 10000000]
+
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from .. import climate, ml
+
+_SEASONS = ["Kharif", "Rabi", "Zaid", "All", "rabi", None, "Monsoon"]
+_IRRIGATION = ["drip", "Sprinkler", "canal", "", "  ", None, "flood"]
+
+
+def random_contexts(n: int, seed: int = 1) -> tuple[list[ml.FarmContext], list, list]:
+    rng = random.Random(seed)
+
+    def maybe(v):
+        return None if rng.random() < 0.1 else v
+
+    ctxs = [
+        ml.FarmContext(
+            soil_type=maybe("Loam"),
+            ph=maybe(round(rng.uniform(4.0, 9.5), 2)),
+            n=maybe(round(rng.uniform(0, 150), 1)),
+            p=maybe(round(rng.uniform(0, 80), 1)),
+            k=maybe(round(rng.uniform(0, 120), 1)),
+            season=rng.choice(_SEASONS),
+            irrigation_type=rng.choice(_IRRIGATION),
+        )
+        for _ in range(n)
+    ]
+    lats = [maybe(rng.uniform(8, 35)) for _ in range(n)]
+    lons = [maybe(rng.uniform(68, 97)) for _ in range(n)]
+    return ctxs, lats, lons
+
+
+def random_batch(n: int, seed: int = 2) -> ml.FarmBatch:
+    rng = np.random.default_rng(seed)
+
+    def col(lo, hi):
+        v = rng.uniform(lo, hi, n)
+        v[rng.random(n) < 0.1] = np.nan
+        return v
+
+    return ml.FarmBatch(
+        ph=col(4.0, 9.5),
+        n=col(0, 150),
+        p=col(0, 80),
+        k=col(0, 120),
+        soil_type=rng.integers(0, ml.SOIL_UNRECOGNIZED + 1, n, dtype=np.int8),
+        season=rng.integers(0, 6, n, dtype=np.int8),
+        irrigation=rng.integers(0, 3, n, dtype=np.int8),
+        latitude=col(8, 35),
+        frost_days=np.floor(col(0, 60)),
+        rainfall_mm=np.floor(col(300, 3000)),
+        forecast_max_temp_c=col(20, 46),
+        forecast_min_temp_c=col(-2, 25),
+        forecast_rain_mm=col(0, 150),
+    )
+
+
+def random_forecasts(n: int, seed: int = 3) -> list[Optional[ml.ForecastFeatures]]:
+    rng = random.Random(seed)
+    return [
+        None
+        if rng.random() < 0.2
+        else ml.ForecastFeatures(
+            max_temp_c=round(rng.uniform(20, 46), 1), min_temp_c=round(rng.uniform(-2, 25), 1), rain_mm=round(rng.uniform(0, 150), 1)
+        )
+        for _ in range(n)
+    ]
+
+
+def check_parity(n: int) -> None:
+    ctxs, lats, lons = random_contexts(n)
+    forecasts = random_forecasts(n)
+    batch = ml.FarmBatch.from_contexts(ctxs, lats, lons, forecasts)
+    rec = ml.recommend_crops_batch(batch)
+    risk = ml.predict_risk_batch(batch)
+    for i, (ctx, lat, lon, forecast) in enumerate(zip(ctxs, lats, lons, forecasts)):
+        if rec.row(i) != ml.recommend_crops(ctx):
+            raise AssertionError(f"recommend_crops mismatch for {ctx}: {rec.row(i)} != {ml.recommend_crops(ctx)}")
+        expected = ml.predict_risk(ctx, latitude=lat, longitude=lon, forecast=forecast)
+        if risk.row(i) != expected:
+            raise AssertionError(f"predict_risk mismatch for {ctx} lat={lat} lon={lon} {forecast}: {risk.row(i)} != {expected}")
+    grid = "with climate grid" if climate.get_grid() is not None else "without climate grid"
+    print(f"parity: {n} farms identical to the scalar path ({grid})")
+
+
+def _slice(batch: ml.FarmBatch, lo: int, hi: int) -> ml.FarmBatch:
+    return ml.FarmBatch(**{f: getattr(batch, f)[lo:hi] for f in ml.FarmBatch.__dataclass_fields__})
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--parity", type=int, default=20_000)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10**3, 10**4, 10**5, 10**6, 10**7])
+    ap.add_argument("--chunk", type=int, default=1_000_000)
+    args = ap.parse_args()
+
+    check_parity(args.parity)
+    grid_path = climate.GRID_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        # Again against a coarse synthetic climate grid, so the grid-driven risk factors are compared too.
+        climate.GRID_PATH = Path(tmp) / "climate_grid.npy"
+        climate.generate_synthetic(climate.GRID_PATH, resolution_deg=0.05)
+        climate.reload_grid()
+        check_parity(args.parity)
+
+        ctxs, lats, lons = random_contexts(10_000)
+        started = time.perf_counter()
+        for ctx, lat, lon in zip(ctxs, lats, lons):
+            ml.recommend_crops(ctx)
+            ml.predict_risk(ctx, latitude=lat, longitude=lon)
+        scalar_rate = len(ctxs) / (time.perf_counter() - started)
+        climate.GRID_PATH = grid_path
+        climate.get_grid.cache_clear()
+    print(f"scalar: {scalar_rate:12,.0f} farms/s")
+
+    for size in args.sizes:
+        elapsed = _time_batches(size, args.chunk)
+        print(f"batch n={size:>10,}: {elapsed:8.3f}s  {size / elapsed:12,.0f} farms/s  ({size / elapsed / scalar_rate:.0f}x scalar)")
+
+
+def _time_batches(size: int, chunk: int) -> float:
+    elapsed = 0.0
+    for lo in range(0, size, chunk):
+        part = random_batch(min(chunk, size - lo), seed=lo)
+        t0 = time.perf_counter()
+        ml.recommend_crops_batch(part)
+        ml.predict_risk_batch(part)
+        elapsed += time.perf_counter() - t0
+    return elapsed
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+# farm_profiles lookup by user_id before and after the unique-index migration.
+# Usage: python -m fastapi_app.benchmarks.profile_lookup [--profiles 1000000] [--lookups 2000]
+
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from .. import db
+
+
+def _time_lookups(conn, user_ids: list[int]) -> float:
+    started = time.perf_counter()
+    for uid in user_ids:
+        conn.execute("SELECT * FROM farm_profiles WHERE user_id = ?", (uid,)).fetchone()
+    return (time.perf_counter() - started) / len(user_ids)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--profiles", type=int, default=1_000_000)
+    ap.add_argument("--lookups", type=int, default=2_000)
+    ap.add_argument("--unindexed-lookups", type=int, default=50)
+    args = ap.parse_args()
+
+    rng = random.Random(3)
+    with tempfile.TemporaryDirectory() as tmp:
+        pool = db.ConnectionPool(Path(tmp) / "bench.db", size=1)
+        with pool.connection() as conn:
+            db.migrate(conn, target=1)
+            started = time.perf_counter()
+            conn.executemany(
+                "INSERT INTO users(id, email, name, password_hash, salt, created_at) VALUES (?, ?, 'x', '', '', '')",
+                ((i, f"u{i}@example.com") for i in range(1, args.profiles + 1)),
+            )
+            conn.executemany(
+                "INSERT INTO farm_profiles(user_id, latitude, longitude, ph, nitrogen, phosphorus, potassium, season, last_updated)"
+                " VALUES (?, ?, ?, ?, 50, 20, 30, 'Rabi', '2024-01-01')",
+                ((i, rng.uniform(8, 35), rng.uniform(68, 97), rng.uniform(4.5, 8.5)) for i in range(1, args.profiles + 1)),
+            )
+            conn.commit()
+            print(f"seeded {args.profiles} profiles in {time.perf_counter() - started:.1f}s")
+
+            probe = [rng.randint(1, args.profiles) for _ in range(args.lookups)]
+            scan = _time_lookups(conn, probe[: args.unindexed_lookups])
+            print(f"without index: {scan * 1e3:9.3f} ms/lookup")
+
+            started = time.perf_counter()
+            db.migrate(conn)
+            print(f"migration to v{db.schema_version(conn)} took {time.perf_counter() - started:.1f}s")
+
+            indexed = _time_lookups(conn, probe)
+            print(f"with index:    {indexed * 1e3:9.3f} ms/lookup  ({scan / indexed:.0f}x faster)")
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+# Report latency (p50/p99) against a local stub FastAPI with fixed per-endpoint latency:
+#   before   - the original four sequential bare requests.get calls
+#   parallel - the pooled, concurrent per-section fetch (upstream without /ai/summary)
+#   summary  - the pooled single /ai/summary fetch
+# Usage: python -m fastapi_app.benchmarks.report_fetch [--reports 200] [--concurrency 8] [--upstream-ms 20]
+
+import argparse
+import asyncio
+import importlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import uvicorn
+from fastapi import FastAPI
+
+from .harness import free_port, percentile_ms
+
+_PROFILE = {"id": 1, "user_id": 1, "latitude": 26.9, "longitude": 75.8, "season": "Rabi", "last_updated": "2024-01-01"}
+_REC = {"recommended_crops": [{"crop": "Wheat", "confidence": 0.7, "why": "Rabi staple."}], "rationale": "Season includes Rabi."}
+_RISK = {"risk_score": 0.5, "risk_level": "Medium", "top_risks": ["NPK imbalance"], "mitigation": ["Split fertilizer doses."]}
+_MARKET = [{"commodity": "Wheat", "market": "Delhi", "price_inr_per_quintal": 2550.0, "trend": "up", "updated_at": "2024-01-01"}]
+
+
+def stub_app(delay: float, with_summary: bool) -> FastAPI:
+    stub = FastAPI()
+
+    @stub.get("/profile")
+    async def profile():
+        await asyncio.sleep(delay)
+        return {"profile": _PROFILE}
+
+    @stub.get("/ai/recommendation")
+    async def rec():
+        await asyncio.sleep(delay)
+        return _REC
+
+    @stub.get("/ai/risk")
+    async def risk():
+        await asyncio.sleep(delay)
+        return _RISK
+
+    @stub.get("/insights/market-prices")
+    async def market():
+        await asyncio.sleep(delay)
+        return {"items": _MARKET}
+
+    if with_summary:
+
+        @stub.get("/ai/summary")
+        async def summary():
+            await asyncio.sleep(delay)
+            return {"profile": _PROFILE, "recommendation": _REC, "risk": _RISK, "market_prices": _MARKET}
+
+    return stub
+
+
+class _StubServer:
+    def __init__(self, app: FastAPI) -> None:
+        self.port = free_port()
+        self.server = uvicorn.Server(uvicorn.Config(app, port=self.port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self) -> str:
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.02)
+        return f"http://127.0.0.1:{self.port}"
+
+    def __exit__(self, *exc) -> None:
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+
+def _before(base: str, auth: str) -> None:
+    # The original download_report fetch sequence.
+    requests.get(f"{base}/profile", headers={"Authorization": auth}, timeout=10).json().get("profile")
+    requests.get(f"{base}/ai/recommendation", headers={"Authorization": auth}, timeout=10)
+    requests.get(f"{base}/ai/risk", headers={"Authorization": auth}, timeout=10)
+    requests.get(f"{base}/insights/market-prices", headers={"Authorization": auth}, timeout=10).json().get("items", [])
+
+
+def _measure(fn, reports: int, concurrency: int) -> dict:
+    latencies: list[float] = []
+
+    def one(_):
+        started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - started)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as ex:
+        list(ex.map(one, range(reports)))
+    return {"p50_ms": percentile_ms(latencies, 50), "p99_ms": percentile_ms(latencies, 99)}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--reports", type=int, default=200)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--upstream-ms", type=float, default=20.0)
+    args = ap.parse_args()
+    delay = args.upstream_ms / 1000
+    auth = "Bearer bench"
+
+    for label, with_summary in (("parallel", False), ("summary", True)):
+        with _StubServer(stub_app(delay, with_summary)) as base:
+            if label == "parallel":
+                print("before  ", _measure(lambda: _before(base, auth), args.reports, args.concurrency))
+            os.environ["KRISHIRAKSHAK_FASTAPI_BASE"] = base
+            report_app = importlib.reload(importlib.import_module(f"{__package__.rsplit('.', 1)[0]}.app"))
+            client = report_app.app.test_client()
+
+            def render() -> None:
+                resp = client.get("/report/download", headers={"Authorization": auth})
+                assert resp.status_code == 200, resp.status_code
+
+            print(f"{label:8}", _measure(render, args.reports, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+# Background scoring: enqueue coalescing, drain throughput per worker count, stored-vs-inline parity and
+# read latency of a stored score against scoring inline.
+# Usage: python -m fastapi_app.benchmarks.score_jobs [--users 50000] [--edits 5] [--workers 1,2,4]
+
+import argparse
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from .. import scoring, weather
+from ..db import ConnectionPool
+from ..ml import FarmContext, predict_risk, recommend_crops
+from .harness import percentile_ms, seed_profiles
+
+
+def _depth(pool: ConnectionPool) -> int:
+    with pool.connection() as conn:
+        return scoring.queue_stats(conn)["depth"]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=50_000)
+    ap.add_argument("--edits", type=int, default=5, help="enqueues per user before the workers run")
+    ap.add_argument("--workers", default="1,2,4")
+    args = ap.parse_args()
+    rng = random.Random(8)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "scores.db"
+        ids = seed_profiles(path, args.users)
+        pool = ConnectionPool(path, size=8)
+        cache = weather.WeatherCache(weather.LocalWeatherProvider())
+
+        # 1. Repeated profile edits coalesce into one pending job per user.
+        started = time.perf_counter()
+        with pool.connection() as conn:
+            for _ in range(args.edits):
+                for user_id in ids:
+                    scoring.enqueue(conn, user_id, "profile")
+        elapsed = time.perf_counter() - started
+        print(f"{args.edits * len(ids):,} enqueues: {elapsed / (args.edits * len(ids)) * 1e6:.1f} us each, "
+              f"queue depth {_depth(pool):,} for {len(ids):,} users")
+
+        # 2. Drain the whole queue with each worker count (a sweep re-fills it between runs).
+        for workers in (int(w) for w in args.workers.split(",")):
+            with pool.connection() as conn:
+                scoring.enqueue_all(conn, "sweep")
+            cache.clear()
+            sched = scoring.ScoreScheduler(workers=workers, poll_seconds=0.05, sweep_at="", weather=cache, connect=pool.connection)
+            started = time.perf_counter()
+            sched.start()
+            while _depth(pool):
+                time.sleep(0.02)
+            elapsed = time.perf_counter() - started
+            sched.stop()
+            s = sched.stats()
+            print(f"{workers} worker(s): {s['scored']:,} farms in {elapsed:.2f}s ({s['scored'] / elapsed:,.0f}/s), "
+                  f"{s['batches']} batches, {s['failed']} failed")
+
+        # 3. Stored results match the scalar functions the inline path uses.
+        sample = rng.sample(ids, min(500, len(ids)))
+        mismatches = 0
+        with pool.connection() as conn:
+            for user_id in sample:
+                row = conn.execute("SELECT * FROM farm_profiles WHERE user_id = ?", (user_id,)).fetchone()
+                stored = scoring.fresh_scores(conn, user_id, row["last_updated"])
+                ctx = FarmContext.from_row(row)
+                forecast = cache.features(row["latitude"], row["longitude"])
+                crops, rationale = recommend_crops(ctx)
+                score, level, top, mitigation = predict_risk(ctx, latitude=row["latitude"], longitude=row["longitude"], forecast=forecast)
+                expected = (
+                    {"recommended_crops": crops, "rationale": rationale},
+                    {"risk_score": score, "risk_level": level, "top_risks": top, "mitigation": mitigation},
+                )
+                got = [stored["recommendation"], stored["risk"]] if stored else None
+                mismatches += got != json.loads(json.dumps(expected))
+        print(f"parity: {mismatches} mismatches in {len(sample)} sampled farms")
+
+        # 4. Request-path cost: one indexed read versus forecast lookup plus scoring, with the forecast cache
+        # warm and cold (a cold cache means a provider round trip on top in production).
+        def inline(row) -> None:
+            ctx = FarmContext.from_row(row)
+            forecast = cache.features(row["latitude"], row["longitude"])
+            recommend_crops(ctx)
+            predict_risk(ctx, latitude=row["latitude"], longitude=row["longitude"], forecast=forecast)
+
+        times: dict[str, list[float]] = {"stored": [], "inline, warm forecast": [], "inline, cold forecast": []}
+        with pool.connection() as conn:
+            for user_id in sample:
+                row = conn.execute("SELECT * FROM farm_profiles WHERE user_id = ?", (user_id,)).fetchone()
+                started = time.perf_counter()
+                scoring.fresh_scores(conn, user_id, row["last_updated"])
+                times["stored"].append(time.perf_counter() - started)
+                started = time.perf_counter()
+                inline(row)
+                times["inline, warm forecast"].append(time.perf_counter() - started)
+                cache.clear()
+                started = time.perf_counter()
+                inline(row)
+                times["inline, cold forecast"].append(time.perf_counter() - started)
+        for name, values in times.items():
+            us = [v * 1000 for v in values]  # percentile_ms of values in ms gives microseconds
+            print(f"{name:>22}: p50 {percentile_ms(us, 50):.1f} us, p99 {percentile_ms(us, 99):.1f} us")
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
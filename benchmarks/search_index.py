@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+# BM25 search index at scale: build time, size on disk, open (memory-map) time, query latency, incremental
+# additions, and that a segmented index ranks exactly like the same documents compacted into one segment.
+# Usage: python -m fastapi_app.benchmarks.search_index [--docs 100000] [--queries 2000]
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from .. import retrieval
+from .harness import percentile_ms
+
+_WORDS = (
+    "wheat rice maize cotton mustard chickpea pulses tomato onion potato soil nitrogen phosphorus potassium "
+    "irrigation drip sprinkler canal rain monsoon frost drought flood hail heatwave pest aphid whitefly borer "
+    "blight rust wilt fungus neem spray dose fertilizer urea compost manure mulch seed variety sowing harvest "
+    "yield market mandi price scheme subsidy insurance loan credit kisan yojana district village farmer field "
+    "acre hectare water storage warehouse transport organic certification training extension advisory"
+).split()
+
+
+def synthetic_documents(n: int, *, vocab: int = 50_000, mean_len: int = 60, seed: int = 3, start: int = 0) -> list[retrieval.Document]:
+    # Zipf-distributed vocabulary: farming words at the head, synthetic rare terms in the long tail.
+    rng = np.random.default_rng(seed)
+    words = np.array(_WORDS + [f"t{i}x" for i in range(vocab - len(_WORDS))])
+    p = 1.0 / np.arange(1, vocab + 1) ** 1.07
+    p /= p.sum()
+    lengths = np.clip(rng.poisson(mean_len, n), 5, None)
+    tokens = words[rng.choice(vocab, size=int(lengths.sum()), p=p)]
+    out, pos = [], 0
+    for i, length in enumerate(lengths):
+        text = " ".join(tokens[pos : pos + length])
+        pos += length
+        out.append(retrieval.Document(f"bench:{start + i}", "bench", f"Advisory {start + i}", text))
+    return out
+
+
+def _queries(n: int, seed: int = 9) -> list[str]:
+    rng = np.random.default_rng(seed)
+    tail = [f"t{i}x" for i in rng.integers(100, 20_000, n)]
+    return [" ".join(list(rng.choice(_WORDS, rng.integers(1, 5))) + ([tail[i]] if i % 2 else [])) for i in range(n)]
+
+
+def _latency(index: retrieval.SearchIndex, queries: list[str]) -> tuple[list[float], list[list]]:
+    times, results = [], []
+    for q in queries:
+        started = time.perf_counter()
+        hits = index.search(q, 5)
+        times.append(time.perf_counter() - started)
+        results.append([(h.document.key, round(h.score, 4)) for h in hits])
+    return times, results
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--docs", type=int, default=100_000)
+    ap.add_argument("--queries", type=int, default=2000)
+    ap.add_argument("--add", type=int, default=1000, help="documents per incremental addition")
+    args = ap.parse_args()
+
+    docs = synthetic_documents(args.docs)
+    queries = _queries(args.queries)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "index"
+        started = time.perf_counter()
+        retrieval.SearchIndex.build(path, docs)
+        build = time.perf_counter() - started
+        started = time.perf_counter()
+        index = retrieval.SearchIndex.open(path)
+        opened = time.perf_counter() - started
+        s = index.stats()
+        print(f"build {len(docs):,} docs: {build:.1f}s ({len(docs) / build:,.0f} docs/s), {s['terms']:,} terms, "
+              f"{s['postings']:,} postings, {index.size_bytes() / 2**20:.1f} MiB on disk, open {opened * 1e3:.1f} ms")
+
+        index.search(queries[0])  # fault in the term array
+        times, _ = _latency(index, queries)
+        print(f"query (1-5 terms, top 5): p50 {percentile_ms(times, 50):.2f} ms p99 {percentile_ms(times, 99):.2f} ms")
+
+        # Incremental additions as new segments, then the same documents compacted into one.
+        extra = synthetic_documents(args.add * 4, seed=4, start=len(docs))
+        adds = []
+        for i in range(4):
+            started = time.perf_counter()
+            index = index.add(extra[i * args.add : (i + 1) * args.add])
+            adds.append(time.perf_counter() - started)
+        times, segmented = _latency(index, queries)
+        print(f"add {args.add:,} docs: {np.median(adds) * 1e3:.0f} ms median; {len(index.segments)} segments, "
+              f"query p50 {percentile_ms(times, 50):.2f} ms p99 {percentile_ms(times, 99):.2f} ms")
+        started = time.perf_counter()
+        index = index.compact()
+        compact = time.perf_counter() - started
+        _, compacted = _latency(index, queries)
+        same = sum(a == b for a, b in zip(segmented, compacted))
+        print(f"compact to 1 segment: {compact:.1f}s; identical top-5 (keys and scores) for {same}/{len(queries)} queries")
+
+
+if __name__ == "__main__":
+    main()
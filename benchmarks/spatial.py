@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+# k-nearest and radius query latency on the farm R*Tree, checked against a brute-force NumPy scan.
+# Usage: python -m fastapi_app.benchmarks.spatial [--points 1000000] [--queries 2000] [--k 10]
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from .. import db, geo
+from .harness import percentile_ms
+
+
+def random_points(n: int, seed: int = 5) -> tuple[np.ndarray, np.ndarray]:
+    # Farms cluster around villages: half uniform over India's bounding box, half around 2000 centres.
+    rng = np.random.default_rng(seed)
+    half = n // 2
+    lat = rng.uniform(8.0, 35.0, n)
+    lon = rng.uniform(68.0, 97.0, n)
+    centres = rng.integers(0, 2000, n - half)
+    c_lat, c_lon = rng.uniform(8.0, 35.0, 2000), rng.uniform(68.0, 97.0, 2000)
+    lat[half:] = c_lat[centres] + rng.normal(0, 0.05, n - half)
+    lon[half:] = c_lon[centres] + rng.normal(0, 0.05, n - half)
+    return lat, lon
+
+
+def _timed(fn, queries: np.ndarray) -> tuple[list[float], list]:
+    times, results = [], []
+    for lat, lon in queries:
+        started = time.perf_counter()
+        results.append(fn(float(lat), float(lon)))
+        times.append(time.perf_counter() - started)
+    return times, results
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--points", type=int, default=1_000_000)
+    ap.add_argument("--queries", type=int, default=2000)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--radius-km", type=float, default=5.0)
+    args = ap.parse_args()
+
+    lat, lon = random_points(args.points)
+    rng = np.random.default_rng(11)
+    picks = rng.integers(0, args.points, args.queries)
+    queries = np.column_stack([lat[picks] + rng.normal(0, 0.02, args.queries), lon[picks] + rng.normal(0, 0.02, args.queries)])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pool = db.ConnectionPool(Path(tmp) / "geo.db", size=1)
+        with pool.connection() as conn:
+            db.migrate(conn)
+            started = time.perf_counter()
+            conn.executemany(
+                f"INSERT INTO {geo.FARMS}(id, min_lat, max_lat, min_lon, max_lon) VALUES (?, ?, ?, ?, ?)",
+                ((i + 1, float(a), float(a), float(o), float(o)) for i, (a, o) in enumerate(zip(lat, lon))),
+            )
+            conn.commit()
+            print(f"indexed {args.points:,} points in {time.perf_counter() - started:.1f}s")
+
+            knn_times, knn = _timed(lambda a, o: geo.nearest(conn, geo.FARMS, a, o, args.k), queries)
+            radius_times, radius = _timed(lambda a, o: geo.within_radius(conn, geo.FARMS, a, o, args.radius_km), queries)
+        pool.close()
+
+    # Brute force on a sample of the queries; R*Tree coordinates are float32, so compare ids by distance rank.
+    brute_times = []
+    for qi in range(min(50, args.queries)):
+        started = time.perf_counter()
+        d = geo.haversine_km(queries[qi, 0], queries[qi, 1], lat, lon)
+        expected = np.sort(np.partition(d, args.k - 1)[: args.k])
+        brute_times.append(time.perf_counter() - started)
+        got = np.array([dist for _, dist in knn[qi]])
+        assert np.allclose(got, expected, atol=0.005), (qi, got, expected)
+        inside = int((d <= args.radius_km - 0.005).sum())
+        assert inside <= len(radius[qi]) <= int((d <= args.radius_km + 0.005).sum()), qi
+
+    print(f"k-NN k={args.k}:          p50 {percentile_ms(knn_times, 50)} ms  p99 {percentile_ms(knn_times, 99)} ms")
+    hits = np.mean([len(r) for r in radius])
+    print(f"radius {args.radius_km} km:      p50 {percentile_ms(radius_times, 50)} ms  p99 {percentile_ms(radius_times, 99)} ms  (avg {hits:.0f} hits)")
+    print(f"brute-force NumPy k-NN:  p50 {percentile_ms(brute_times, 50)} ms  (results match on {min(50, args.queries)} queries)")
+
+
+if __name__ == "__main__":
+    main()
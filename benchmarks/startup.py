@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+# Cold start and memory of the deployment modes: one uvicorn process, uvicorn's own --workers (each worker is
+# spawned and imports, warms up and checks migrations by itself) and serve.py's pre-fork workers. For each:
+# time from launching the command to the first 200 and until every worker has finished its startup, then,
+# after some traffic across the endpoints, RSS/PSS/USS per worker and the total PSS of the process tree.
+# Linux only (reads /proc/<pid>/smaps_rollup).
+# Usage: python -m fastapi_app.benchmarks.startup [--workers 4] [--requests 400]
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+from .harness import BACKEND_DIR, PACKAGE, free_port, seed_profiles, token_for
+
+
+def _get(port: int, path: str, token: str = "", body: bytes = b"") -> int:
+    req = urllib.request.Request(f"http://127.0.0.1:{port}{path}", data=body or None, headers={"Authorization": f"Bearer {token}"})
+    if body:
+        req.add_header("Content-Type", "application/json")
+    try:
+        with urllib.request.urlopen(req, timeout=10) as resp:
+            resp.read()
+            return resp.status
+    except urllib.error.HTTPError as exc:
+        return exc.code
+    except OSError:
+        return 0
+
+
+def _children(pid: int) -> list[int]:
+    found = []
+    for task in Path(f"/proc/{pid}/task").iterdir():
+        found += [int(c) for c in (task / "children").read_text().split()]
+    # uvicorn's spawn mode also starts multiprocessing's resource tracker; it serves nothing.
+    return [c for c in found if b"resource_tracker" not in Path(f"/proc/{c}/cmdline").read_bytes()]
+
+
+def _memory_kb(pid: int) -> dict[str, int]:
+    fields = dict(re.findall(r"^(\w+):\s+(\d+) kB", Path(f"/proc/{pid}/smaps_rollup").read_text(), re.M))
+    return {
+        "rss": int(fields["Rss"]),
+        "pss": int(fields["Pss"]),
+        "uss": int(fields["Private_Clean"]) + int(fields["Private_Dirty"]),
+    }
+
+
+def measure(name: str, cmd: list[str], workers: int, env: dict, token: str, requests: int) -> dict:
+    port = free_port()
+    cmd = [c.replace("{port}", str(port)) for c in cmd]
+    with tempfile.TemporaryFile() as log:
+        started = time.perf_counter()
+        proc = subprocess.Popen(cmd, env=env, cwd=str(BACKEND_DIR), stdout=log, stderr=subprocess.STDOUT)
+        try:
+            while _get(port, "/health") != 200:
+                if proc.poll() is not None:
+                    raise RuntimeError(f"{name}: server exited during startup (code {proc.returncode})")
+                time.sleep(0.005)
+            first = time.perf_counter() - started
+            while True:
+                log.seek(0)
+                if log.read().count(b"Application startup complete") >= workers:
+                    break
+                if time.perf_counter() - started > 120:
+                    raise RuntimeError(f"{name}: workers did not all start")
+                time.sleep(0.005)
+            ready = time.perf_counter() - started
+
+            calls = [
+                ("/ai/recommendation", b""),
+                ("/ai/risk", b""),
+                ("/chat", json.dumps({"message": "wheat mandi price and pm kisan scheme"}).encode()),
+                ("/insights/market-prices", b""),
+                ("/insights/schemes", b""),
+            ]
+            for i in range(requests):
+                path, body = calls[i % len(calls)]
+                status = _get(port, path, token, body)
+                if status != 200:
+                    raise RuntimeError(f"{name}: {path} returned {status}")
+
+            pids = _children(proc.pid) if workers > 1 else [proc.pid]
+            per_worker = [_memory_kb(pid) for pid in pids]
+            total_pss = sum(m["pss"] for m in per_worker) + (_memory_kb(proc.pid)["pss"] if workers > 1 else 0)
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+    avg = {k: sum(m[k] for m in per_worker) / len(per_worker) / 1024 for k in ("rss", "pss", "uss")}
+    print(f"{name:>26}: first 200 {first * 1e3:6.0f} ms, all {workers} workers ready {ready * 1e3:6.0f} ms | "
+          f"per worker RSS {avg['rss']:5.1f} MiB, PSS {avg['pss']:5.1f} MiB, USS {avg['uss']:5.1f} MiB | "
+          f"total PSS {total_pss / 1024:6.1f} MiB")
+    return {"first_200_ms": first * 1e3, "ready_ms": ready * 1e3, "total_pss_mib": total_pss / 1024, **avg}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--requests", type=int, default=400, help="warm-up traffic before memory is read")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "startup.db"
+        user_id = seed_profiles(db_path, 1)[0]
+        env = dict(os.environ, KRISHIRAKSHAK_DB_PATH=str(db_path))
+        token = token_for(user_id)
+        uvicorn = [sys.executable, "-m", "uvicorn", f"{PACKAGE}.main:app", "--port", "{port}", "--log-level", "info"]
+        serve = [sys.executable, "-m", f"{PACKAGE}.serve", "--port", "{port}", "--log-level", "info"]
+        measure("uvicorn, 1 process", uvicorn, 1, env, token, args.requests)
+        measure(f"uvicorn --workers {args.workers} (spawn)", uvicorn + ["--workers", str(args.workers)], args.workers, env, token, args.requests)
+        measure(f"serve --workers {args.workers} (fork)", serve + ["--workers", str(args.workers)], args.workers, env, token, args.requests)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+from __future__ import annotations
+
+# Regression suite: micro-benchmarks of the hot functions (crop recommendation, risk scoring, password
+# verification, the /chat intent matcher and passage search, report rendering) and a concurrent load run over
+# every endpoint of both services, against a seeded SQLite database (N users with farm profiles, a year of
+# market prices and locations). Results are written as JSON and compared with a stored baseline: a metric that is worse than
+# its baseline by more than the threshold for its kind fails the run (exit code 1).
+# Everything runs locally: weather comes from the built-in local provider and the Flask report service calls the
+# uvicorn process started here. Seeds are fixed, so two runs see the same data and the same request mix.
+# Usage: python -m fastapi_app.benchmarks.suite [--users 2000] [--requests 300] [--clients 16]
+#            [--output results.json] [--baseline benchmarks/baseline.json] [--update-baseline]
+# To record a baseline, run with --output a few times and combine them with --merge run1.json run2.json ...
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import urllib.parse
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Optional
+
+from .. import chat, climate, db, geo, market, ml, report, retrieval, security
+from .chat_intents import corpus
+from .harness import open_connection, percentile_ms, request, seed_profiles, serve, serve_flask, token_for
+from .market_prices import STATES, write_csv
+from .ml_batch import random_contexts, random_forecasts
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+# Allowed slowdown before a metric counts as a regression, by kind. Set from repeated runs on a 1-CPU shared VM,
+# where the same code moves by up to 45% between runs (PBKDF2 included), so these catch slowdowns of about
+# 1.5x and more. p99 over a few hundred requests (and, for the profile writes, the rescoring they trigger)
+# swings by 3x, so it only catches a blown-up tail. The thresholds stored with a baseline take precedence:
+# record tighter ones on a quieter machine.
+THRESHOLDS = {"micro_us": 0.5, "p50_ms": 0.5, "p99_ms": 2.0, "rps": 0.4}
+LOGIN_PASSWORD = "bench-password"
+LOGIN_USERS = 64
+
+
+def _metric(value: float, kind: str) -> dict:
+    return {"value": round(value, 3), "kind": kind, "better": "higher" if kind == "rps" else "lower"}
+
+
+def _sample_report_sections() -> dict[str, Callable[[], str]]:
+    ctxs, lats, lons = random_contexts(1, seed=21)
+    crops, rationale = ml.recommend_crops(ctxs[0])
+    score, level, top, mitigation = ml.predict_risk(ctxs[0], latitude=lats[0], longitude=lons[0])
+    profile = {"latitude": lats[0], "longitude": lons[0], "location_name": "Seeded", "soil_type": ctxs[0].soil_type,
+               "ph": ctxs[0].ph, "season": ctxs[0].season, "last_updated": "2024-01-01T00:00:00+00:00"}
+    rec = {"recommended_crops": crops, "rationale": rationale}
+    risk = {"risk_score": score, "risk_level": level, "top_risks": top, "mitigation": mitigation}
+    items = [
+        {"commodity": c, "market": f"Mandi {i:05d}", "price_inr_per_quintal": 2000.0 + i, "trend": "up",
+         "updated_at": "2024-01-01", "stats": {"mean_7d": 1990.0 + i, "change_30d_pct": 1.5, "volatility_30d": 0.8}}
+        for i, c in enumerate(["Wheat", "Rice", "Maize", "Onion", "Potato"] * 4)
+    ]
+    return {
+        "generated_at": lambda: "2024-01-01T00:00:00+00:00",
+        "profile": lambda: report.render_profile(profile),
+        "recommendations": lambda: report.render_recommendations(rec),
+        "risk": lambda: report.render_risk(risk),
+        "market": lambda: report.render_market(items),
+    }
+
+
+def micro(repeat: int) -> dict[str, dict]:
+    ctxs, lats, lons = random_contexts(2000, seed=11)
+    forecasts = random_forecasts(2000, seed=12)
+    messages = corpus(2000, seed=13)
+    pw_hash, salt = security.hash_password(LOGIN_PASSWORD)
+    sections = _sample_report_sections()
+    n = len(ctxs)
+    cases = {
+        "ml.recommend_crops": (lambda i: ml.recommend_crops(ctxs[i % n]), 1000),
+        "ml.predict_risk": (lambda i: ml.predict_risk(ctxs[i % n], latitude=lats[i % n], longitude=lons[i % n], forecast=forecasts[i % n]), 1000),
+        "security.verify_password": (lambda i: security.verify_password(LOGIN_PASSWORD, pw_hash, salt, iterations=security.PASSWORD_ITERATIONS,
+                                                                         algorithm=security.PASSWORD_ALGORITHM), 1),
+        # What POST /chat runs: the intent matcher, then the passage search.
+        "chat.reply": (lambda i: chat.reply(messages[i % n]), 1000),
+        "retrieval.search": (lambda i: retrieval.search(messages[i % n], 3), 200),
+        "report.render_report": (lambda i: b"".join(report.render_report(sections)), 500),
+    }
+    for fn, number in cases.values():
+        for i in range(min(number, 100)):
+            fn(i)
+    # Round-robin over the cases and keep each one's fastest round: on a shared machine the slow rounds are
+    # other load, and interleaving spreads a slow stretch over all cases instead of one.
+    best = dict.fromkeys(cases, float("inf"))
+    for _ in range(repeat):
+        for name, (fn, number) in cases.items():
+            started = time.perf_counter()
+            for i in range(number):
+                fn(i)
+            best[name] = min(best[name], (time.perf_counter() - started) / number * 1e6)
+    for name, us in best.items():
+        print(f"  {name:28s} {us:12.2f} us/call")
+    return {f"micro {name}": _metric(us, "micro_us") for name, us in best.items()}
+
+
+def seed(db_path: Path, users: int, markets: int) -> list[int]:
+    ids = seed_profiles(db_path, users)
+    pw_hash, salt = security.hash_password(LOGIN_PASSWORD)
+    pool = db.ConnectionPool(db_path, size=1)
+    with pool.connection() as conn:
+        conn.executemany(
+            "UPDATE users SET password_hash=?, salt=?, password_algorithm=?, password_iterations=? WHERE id=?",
+            ((pw_hash, salt, security.PASSWORD_ALGORITHM, security.PASSWORD_ITERATIONS, i) for i in ids[:LOGIN_USERS]),
+        )
+        if markets:
+            csv_path = db_path.with_suffix(".csv")
+            write_csv(csv_path, years=1, markets=markets, commodities=3)
+            market.ingest_csv(conn, csv_path)
+            csv_path.unlink()
+            rng = random.Random(17)
+            geo.load_mandis(conn, ((f"Mandi {m:05d}", STATES[m % len(STATES)], f"District {m % 400}", rng.uniform(8, 35), rng.uniform(68, 97))
+                                   for m in range(markets)))
+    pool.close()
+    return ids
+
+
+async def _wait_scored(port: int, timeout: float = 300.0) -> None:
+    # The scheduler scores every seeded profile after startup; measure once it is idle so the /ai reads hit
+    # stored scores on every run instead of racing the backlog.
+    reader, writer = await open_connection(port)
+    deadline = time.monotonic() + timeout
+    while True:
+        _, _, payload = await request(reader, writer, "GET", "/health")
+        if json.loads(payload)["scoring"]["queue"]["depth"] == 0:
+            break
+        if time.monotonic() > deadline:
+            raise RuntimeError("scoring backlog did not drain")
+        await asyncio.sleep(0.5)
+    writer.close()
+
+
+async def _run_endpoint(port: int, method: str, path: str, body, tokens: list[str], count: int, clients: int, rng_seed: int) -> dict:
+    # body may be a callable of (rng, i) for per-request values; each request is made as a random seeded user.
+    rng = random.Random(rng_seed)
+    counter = itertools.count()
+    latencies: list[float] = []
+
+    async def client() -> None:
+        reader, writer = await open_connection(port)
+        while (i := next(counter)) < count:
+            payload = body(rng, i) if callable(body) else body
+            headers = {"Authorization": f"Bearer {rng.choice(tokens)}"}
+            if payload is not None:
+                headers["Content-Type"] = "application/json"
+            started = time.perf_counter()
+            status, resp_headers, data = await request(reader, writer, method, path, headers,
+                                                       json.dumps(payload).encode() if payload is not None else b"")
+            latencies.append(time.perf_counter() - started)
+            if status != 200:
+                raise RuntimeError(f"{method} {path} returned {status}: {data[:200]!r}")
+            if resp_headers.get("connection", "").lower() == "close":
+                writer.close()
+                reader, writer = await open_connection(port)
+        writer.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(min(clients, count))))
+    elapsed = time.perf_counter() - started
+    return {"rps": len(latencies) / elapsed, "p50_ms": percentile_ms(latencies, 50), "p99_ms": percentile_ms(latencies, 99)}
+
+
+def _batch_farms(n: int) -> list[dict]:
+    ctxs, lats, lons = random_contexts(n, seed=31)
+    seasons = ("Kharif", "Rabi", "Zaid", "All")
+    return [
+        {"ref": f"farm-{i}", "soil_type": c.soil_type, "ph": c.ph, "nitrogen": c.n, "phosphorus": c.p, "potassium": c.k,
+         "irrigation_type": c.irrigation_type, "season": c.season if c.season in seasons else None, "latitude": lat, "longitude": lon}
+        for i, (c, lat, lon) in enumerate(zip(ctxs, lats, lons))
+    ]
+
+
+def fastapi_reads() -> list[tuple]:
+    history = "/insights/market-prices/history?" + urllib.parse.urlencode({"commodity": "Wheat", "market": "Mandi 00042", "limit": 100})
+    farms = _batch_farms(50)
+    messages = corpus(500, seed=14)
+    return [
+        ("GET", "/health", None),
+        ("GET", "/metrics", None),
+        ("GET", "/me", None),
+        ("GET", "/profile", None),
+        ("GET", "/ai/recommendation", None),
+        ("GET", "/ai/risk", None),
+        ("GET", "/ai/summary", None),
+        ("POST", "/ai/recommendation/batch", {"farms": farms}),
+        ("POST", "/ai/risk/batch", {"farms": farms}),
+        ("GET", "/insights/market-prices", None),
+        ("GET", history, None),
+        ("GET", "/insights/schemes", None),
+        ("GET", "/geo/mandis/nearest", None),
+        ("GET", "/geo/zone", None),
+        ("GET", "/geo/farms/nearby?radius_km=25", None),
+        ("GET", "/geo/farms/nearest?k=10", None),
+        ("POST", "/chat", lambda rng, i: {"message": messages[i % len(messages)]}),
+    ]
+
+
+def _location(rng: random.Random, i: int) -> dict:
+    return {"latitude": rng.uniform(8, 35), "longitude": rng.uniform(68, 97), "location_name": "Moved"}
+
+
+def _soil(rng: random.Random, i: int) -> dict:
+    return {"soil_type": rng.choice(["Loam", "Clay", "Sandy", "Black"]), "ph": round(rng.uniform(4.5, 8.8), 2),
+            "nitrogen": round(rng.uniform(10, 140), 1), "season": rng.choice(["Kharif", "Rabi", "Zaid"])}
+
+
+def fastapi_writes() -> list[tuple]:
+    return [
+        ("POST", "/profile/location", _location),
+        ("POST", "/profile/soil-farm", _soil),
+        ("POST", "/profile/bulk", lambda rng, i: {"items": [{"location": _location(rng, i)}, {"soil_farm": _soil(rng, i)}]}),
+    ]
+
+
+def fastapi_auth(login_ids: list[int]) -> list[tuple]:
+    # PBKDF2 per request: run with fewer requests and clients than the rest.
+    return [
+        ("POST", "/auth/login", lambda rng, i: {"email": f"seed{rng.choice(login_ids)}@example.com", "password": LOGIN_PASSWORD}),
+        ("POST", "/auth/register", lambda rng, i: {"email": f"bench{i}-{rng.randrange(10**9)}@example.com", "name": "Bench Farmer",
+                                                   "password": LOGIN_PASSWORD}),
+    ]
+
+
+def _record(results: dict, service: str, method: str, path: str, measured: dict) -> None:
+    name = f"{service} {method} {urllib.parse.urlsplit(path).path}"
+    print(f"  {name:45s} {measured['rps']:9.1f} req/s  p50 {measured['p50_ms']:8.2f} ms  p99 {measured['p99_ms']:8.2f} ms")
+    for key in ("rps", "p50_ms", "p99_ms"):
+        results[f"{name} {key}"] = _metric(measured[key], key)
+
+
+def load(db_path: Path, grid_path: Path, ids: list[int], requests: int, clients: int, auth_requests: int, passes: int) -> dict[str, dict]:
+    tokens = [token_for(i) for i in ids]
+    env = {
+        "KRISHIRAKSHAK_DB_PATH": str(db_path),
+        "KRISHIRAKSHAK_CLIMATE_GRID": str(grid_path),
+        "KRISHIRAKSHAK_LOGIN_PER_EMAIL_PER_MINUTE": "0",
+        "KRISHIRAKSHAK_LOGIN_PER_IP_PER_MINUTE": "0",
+        "KRISHIRAKSHAK_REGISTER_PER_IP_PER_MINUTE": "0",
+        "KRISHIRAKSHAK_FARM_ORIGINS_PER_DAY": "0",
+        "KRISHIRAKSHAK_HASH_QUEUE_LIMIT": str(max(64, clients * 4)),
+    }
+    results: dict[str, dict] = {}
+    with serve(env=env) as port, serve_flask(env={"KRISHIRAKSHAK_FASTAPI_BASE": f"http://127.0.0.1:{port}"}) as flask_port:
+        asyncio.run(_wait_scored(port))
+        reads = [(port, "fastapi", *call) for call in fastapi_reads()]
+        reads += [(flask_port, "flask", "GET", path, None) for path in ("/health", "/report/download")]
+        # The reads leave the data as it was, so they run `passes` times with the same request mix and each
+        # metric keeps its best pass, as the micro-benchmarks do.
+        best: dict[tuple, dict] = {}
+        for i in range(passes):
+            for n, (target, service, method, path, body) in enumerate(reads):
+                if i == 0:
+                    asyncio.run(_run_endpoint(target, method, path, body, tokens, clients, clients, rng_seed=1000 + n))
+                measured = asyncio.run(_run_endpoint(target, method, path, body, tokens, requests, clients, rng_seed=n))
+                previous = best.setdefault((service, method, path), measured)
+                best[service, method, path] = {"rps": max(previous["rps"], measured["rps"]), "p50_ms": min(previous["p50_ms"], measured["p50_ms"]),
+                                               "p99_ms": min(previous["p99_ms"], measured["p99_ms"])}
+        for (service, method, path), measured in best.items():
+            _record(results, service, method, path, measured)
+
+        for n, (method, path, body) in enumerate(fastapi_writes()):
+            _record(results, "fastapi", method, path, asyncio.run(_run_endpoint(port, method, path, body, tokens, requests, clients, rng_seed=300 + n)))
+        for n, (method, path, body) in enumerate(fastapi_auth(ids[:LOGIN_USERS])):
+            _record(results, "fastapi", method, path, asyncio.run(_run_endpoint(port, method, path, body, tokens, auth_requests, 4, rng_seed=400 + n)))
+    return results
+
+
+def compare(current: dict, baseline: dict, overrides: dict[str, float]) -> int:
+    thresholds = {**THRESHOLDS, **baseline.get("thresholds", {}), **overrides}
+    if baseline.get("meta", {}).get("machine") != current["meta"]["machine"]:
+        print(f"warning: baseline was recorded on {baseline.get('meta', {}).get('machine')}, this is {current['meta']['machine']}")
+    if baseline.get("meta", {}).get("params") != current["meta"]["params"]:
+        print(f"warning: baseline parameters {baseline.get('meta', {}).get('params')} differ from {current['meta']['params']}")
+    regressions = 0
+    for name, metric in current["metrics"].items():
+        base = baseline["metrics"].get(name)
+        if base is None or not base["value"]:
+            print(f"  {'new':10s} {name}")
+            continue
+        change = metric["value"] / base["value"] - 1
+        worse = -change if metric["better"] == "higher" else change
+        limit = thresholds[metric["kind"]]
+        status = "REGRESSION" if worse > limit else "improved" if worse < -limit else "ok"
+        regressions += status == "REGRESSION"
+        print(f"  {status:10s} {name:55s} {base['value']:12.2f} -> {metric['value']:12.2f} ({change * 100:+6.1f}%, limit {limit * 100:.0f}%)")
+    for name in baseline["metrics"].keys() - current["metrics"].keys():
+        print(f"  {'missing':10s} {name}")
+    print(f"{regressions} regression(s) against the baseline")
+    return regressions
+
+
+def merge(runs: list[dict]) -> dict:
+    # One baseline from several runs: each metric's median, so a single lucky or unlucky run does not set the bar.
+    merged = {"meta": {**runs[-1]["meta"], "runs": len(runs)}, "metrics": {}}
+    for name, metric in runs[-1]["metrics"].items():
+        values = [r["metrics"][name]["value"] for r in runs if name in r["metrics"]]
+        merged["metrics"][name] = {**metric, "value": round(statistics.median(values), 3)}
+    return merged
+
+
+def _threshold(text: str) -> tuple[str, float]:
+    kind, _, value = text.partition("=")
+    if kind not in THRESHOLDS or not value:
+        raise argparse.ArgumentTypeError(f"expected KIND=FRACTION with KIND one of {', '.join(THRESHOLDS)}")
+    return kind, float(value)
+
+
+def _write_baseline(path: Path, results: dict) -> None:
+    # Thresholds edited into an existing baseline are kept.
+    previous: Optional[dict] = json.loads(path.read_text()) if path.exists() else None
+    path.write_text(json.dumps({**results, "thresholds": (previous or {}).get("thresholds", THRESHOLDS)}, indent=2) + "\n")
+    print(f"baseline written to {path}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=2000, help="seeded users, each with a farm profile")
+    ap.add_argument("--markets", type=int, default=200, help="mandis, each with a location and a year of prices for 3 commodities")
+    ap.add_argument("--requests", type=int, default=300, help="measured requests per endpoint")
+    ap.add_argument("--auth-requests", type=int, default=24, help="measured requests for /auth/login and /auth/register")
+    ap.add_argument("--clients", type=int, default=16, help="concurrent keep-alive clients")
+    ap.add_argument("--passes", type=int, default=2, help="load passes over the read endpoints (the best is kept)")
+    ap.add_argument("--repeat", type=int, default=20, help="micro-benchmark rounds (the fastest is kept)")
+    ap.add_argument("--skip-load", action="store_true", help="micro-benchmarks only")
+    ap.add_argument("--output", type=Path, help="write the results here as JSON")
+    ap.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    ap.add_argument("--update-baseline", action="store_true", help="store these results as the new baseline")
+    ap.add_argument("--merge", type=Path, nargs="+", metavar="RESULTS",
+                    help="instead of running, write the per-metric median of these --output files as the baseline")
+    ap.add_argument("--threshold", type=_threshold, action="append", default=[], metavar="KIND=FRACTION",
+                    help=f"override a regression threshold ({', '.join(f'{k}={v}' for k, v in THRESHOLDS.items())})")
+    args = ap.parse_args()
+
+    if args.merge:
+        _write_baseline(args.baseline, merge([json.loads(path.read_text()) for path in args.merge]))
+        return
+    params = {k: getattr(args, k) for k in ("users", "markets", "requests", "auth_requests", "clients", "passes", "repeat", "skip_load")}
+    results = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "machine": f"{platform.system()} {platform.machine()}, {os.cpu_count()} CPUs, Python {platform.python_version()}",
+            "params": params,
+        },
+        "metrics": {},
+    }
+    print("micro-benchmarks:")
+    results["metrics"].update(micro(args.repeat))
+    if not args.skip_load:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / "suite.db"
+            started = time.perf_counter()
+            ids = seed(db_path, args.users, args.markets)
+            # No grid ships with the repo; without one /geo/zone is a 404 and risk uses its latitude fallback.
+            grid_path = Path(tmp) / "climate_grid.npy"
+            climate.generate_synthetic(grid_path, resolution_deg=0.05)
+            print(f"load ({args.users:,} users, {args.markets} mandis seeded in {time.perf_counter() - started:.1f}s; "
+                  f"{args.requests} requests per endpoint at {args.clients} clients):")
+            results["metrics"].update(load(db_path, grid_path, ids, args.requests, args.clients, args.auth_requests, args.passes))
+        # Again after the load run, keeping the faster of the two: a slow stretch of the machine rarely covers both.
+        print("micro-benchmarks, second run:")
+        for name, metric in micro(args.repeat).items():
+            results["metrics"][name]["value"] = min(results["metrics"][name]["value"], metric["value"])
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+    if args.update_baseline:
+        _write_baseline(args.baseline, results)
+        return
+    if not args.baseline.exists():
+        print(f"no baseline at {args.baseline}; run with --update-baseline to record one")
+        return
+    print(f"against {args.baseline}:")
+    if compare(results, json.loads(args.baseline.read_text()), dict(args.threshold)):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+# Trained model against the heuristics: training time on synthetic labelled outcomes, held-out log loss and AUC
+# for both backends, artifact size and open time, scalar/batch parity for both backends, and inference latency
+# per farm (scalar calls and batches).
+# Usage: python -m fastapi_app.benchmarks.trained_model [--outcomes 200000] [--farms 20000]
+
+import argparse
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from .. import db as dbm
+from .. import ml, model
+from .harness import percentile_ms
+from .ml_batch import random_contexts, random_forecasts
+
+
+def check_parity(backend: str, n: int) -> None:
+    ctxs, lats, lons = random_contexts(n, seed=7)
+    forecasts = random_forecasts(n, seed=8)
+    batch = ml.FarmBatch.from_contexts(ctxs, lats, lons, forecasts)
+    rec = ml.recommend_crops_batch(batch, backend=backend)
+    risk = ml.predict_risk_batch(batch, backend=backend)
+    for i, (ctx, lat, lon, forecast) in enumerate(zip(ctxs, lats, lons, forecasts)):
+        if rec.row(i) != ml.recommend_crops(ctx, backend=backend):
+            raise AssertionError(f"{backend}: recommend_crops mismatch for {ctx}")
+        if risk.row(i) != ml.predict_risk(ctx, latitude=lat, longitude=lon, forecast=forecast, backend=backend):
+            raise AssertionError(f"{backend}: predict_risk mismatch for {ctx} lat={lat} lon={lon} {forecast}")
+    print(f"parity ({backend}): {n:,} farms identical between the scalar and batch paths")
+
+
+def latency(backend: str, n: int, batch_size: int) -> None:
+    ctxs, lats, lons = random_contexts(n, seed=9)
+    forecasts = random_forecasts(n, seed=10)
+    recommend, risk = [], []
+    for ctx, lat, lon, forecast in zip(ctxs, lats, lons, forecasts):
+        started = time.perf_counter()
+        ml.recommend_crops(ctx, backend=backend)
+        middle = time.perf_counter()
+        ml.predict_risk(ctx, latitude=lat, longitude=lon, forecast=forecast, backend=backend)
+        # percentile_ms rounds to 0.01 ms; scale to report microseconds.
+        recommend.append((middle - started) * 1e3)
+        risk.append((time.perf_counter() - middle) * 1e3)
+    batch = ml.FarmBatch.from_contexts(ctxs, lats, lons, forecasts)
+    started = time.perf_counter()
+    for lo in range(0, n, batch_size):
+        part = ml.FarmBatch(**{f: getattr(batch, f)[lo : lo + batch_size] for f in ml.FarmBatch.__dataclass_fields__})
+        ml.recommend_crops_batch(part, backend=backend)
+        ml.predict_risk_batch(part, backend=backend)
+    per_farm = (time.perf_counter() - started) / n * 1e6
+    print(f"{backend:>9}: single farm p50/p99 recommend_crops {percentile_ms(recommend, 50):.1f}/{percentile_ms(recommend, 99):.1f} us, "
+          f"predict_risk {percentile_ms(risk, 50):.1f}/{percentile_ms(risk, 99):.1f} us | "
+          f"batches of {batch_size}: {per_farm:.2f} us/farm ({1e6 / per_farm:,.0f} farms/s)")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--outcomes", type=int, default=200_000)
+    ap.add_argument("--farms", type=int, default=20_000)
+    ap.add_argument("--batch", type=int, default=256)
+    args = ap.parse_args()
+
+    model_dir = model.MODEL_DIR
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(Path(tmp) / "outcomes.db")
+        conn.row_factory = sqlite3.Row
+        dbm.migrate(conn)
+        model.generate_synthetic_outcomes(conn, args.outcomes, seed=1)
+        conn.commit()
+        started = time.perf_counter()
+        params, manifest = model.train(conn)
+        trained = time.perf_counter() - started
+        conn.close()
+        print(f"train on {manifest['rows']:,} outcomes ({len(manifest['crops'])} crop models): {trained:.1f}s")
+        for target, result in manifest["holdout"].items():
+            print(f"  holdout {target:>12} ({result['rows']:,} rows): "
+                  + ", ".join(f"{name} log loss {m['log_loss']:.4f} AUC {m['auc']:.4f}" for name, m in
+                              (("trained", result["trained"]), ("heuristic", result["heuristic"]))))
+
+        path = model.save(Path(tmp) / "model", params, manifest)
+        model.MODEL_DIR = path.parent
+        started = time.perf_counter()
+        loaded = model.reload_model()
+        print(f"artifact {path.stat().st_size:,} bytes, opened (memory-mapped) in {(time.perf_counter() - started) * 1e3:.2f} ms: "
+              f"{loaded.version}")
+
+        for backend in ("heuristic", "trained"):
+            check_parity(backend, args.farms)
+        for backend in ("heuristic", "trained"):
+            latency(backend, args.farms, args.batch)
+        model.MODEL_DIR = model_dir
+        model.reload_model()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+# Fetch counts, coalescing and hit rate of the weather cache against a slow stand-in provider.
+# Usage: python -m fastapi_app.benchmarks.weather_cache [--farms 10000] [--threads 64] [--latency 0.05]
+
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .. import weather
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--farms", type=int, default=10_000)
+    ap.add_argument("--threads", type=int, default=64)
+    ap.add_argument("--latency", type=float, default=0.05, help="simulated provider round trip, seconds")
+    ap.add_argument("--cells", type=int, default=5000, help="active cells for the prefetch run")
+    args = ap.parse_args()
+    rng = random.Random(4)
+
+    # 1. A burst of farms in one grid cell: every lookup misses at once, one fetch serves them all.
+    cache = weather.WeatherCache(weather.LocalWeatherProvider(latency_seconds=args.latency))
+    points = [(28.5 + rng.uniform(0.001, 0.249), 77.0 + rng.uniform(0.001, 0.249)) for _ in range(args.farms)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        list(pool.map(lambda p: cache.features(*p), points))
+    s = cache.stats()
+    print(f"{args.farms:,} farms in one cell, {args.threads} threads: {time.perf_counter() - started:.2f}s, "
+          f"provider fetches {s['fetch_calls']}, coalesced waits {s['coalesced']}, hit rate {s['hit_rate']}")
+
+    # 2. Scheduled prefetch of every active cell in provider-sized batches, then a scoring pass.
+    cache = weather.WeatherCache(weather.LocalWeatherProvider(latency_seconds=args.latency))
+    cells = list({weather.cell_for(rng.uniform(8, 35), rng.uniform(68, 97)) for _ in range(args.cells * 3)})[: args.cells]
+    started = time.perf_counter()
+    cache.prefetch(cells)
+    s = cache.stats()
+    print(f"prefetch {len(cells):,} cells: {time.perf_counter() - started:.2f}s in {s['fetch_calls']} provider calls "
+          f"of up to {cache.batch_size} cells")
+
+    before = cache.stats()
+    farms = [(c[0] + rng.uniform(-0.12, 0.12), c[1] + rng.uniform(-0.12, 0.12)) for c in rng.choices(cells, k=100_000)]
+    lats, lons = [p[0] for p in farms], [p[1] for p in farms]
+    started = time.perf_counter()
+    cache.features_many(lats, lons)
+    elapsed = time.perf_counter() - started
+    s = cache.stats()
+    hits, misses = s["hits"] - before["hits"], s["misses"] - before["misses"]
+    print(f"features for 100,000 farms after prefetch: {elapsed * 1e3:.0f} ms ({elapsed / 1e5 * 1e6:.2f} us/farm), "
+          f"new provider calls {s['fetch_calls'] - before['fetch_calls']}, cell hit rate {hits / (hits + misses):.3f}")
+
+    started = time.perf_counter()
+    for lat, lon in farms[:20_000]:
+        cache.features(lat, lon)
+    print(f"single-farm cached lookup: {(time.perf_counter() - started) / 20_000 * 1e6:.2f} us")
+
+
+if __name__ == "__main__":
+    main()
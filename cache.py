@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+from .ml import FarmContext, ForecastFeatures, model_version, predict_risk, recommend_crops
+
+_MISSING = object()
+
+
+class TTLCache:
+    # Thread-safe LRU with a per-entry deadline. Values are returned as stored; callers copy if needed.
+    def __init__(self, maxsize: int, ttl_seconds: float) -> None:
+        self.maxsize = max(1, maxsize)
+        self.ttl_seconds = ttl_seconds
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, *, ttl_seconds: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            if self._data.pop(key, _MISSING) is not _MISSING:
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self.invalidations += len(self._data)
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+# Per user: a recommendation plus risk entries for the last few forecasts.
+KEYS_PER_USER = 8
+
+
+class ScoreCache:
+    # Memoizes recommend_crops/predict_risk keyed on the exact FarmContext (+ lat/long and forecast), so a cached
+    # answer is what the batch path and the stored scores give. The model version is part of every key: a new
+    # trained artifact or crop catalog stops matching old entries at once instead of at their TTL.
+    def __init__(self, *, maxsize: int, ttl_seconds: float) -> None:
+        self._cache = TTLCache(maxsize, ttl_seconds)
+        # user id -> that user's keys (a dict as an ordered set), least recently used user first. Bounded: what
+        # falls out of it is dropped from the cache too, so invalidate_user never misses a live entry.
+        self._user_keys: OrderedDict[int, dict[Hashable, None]] = OrderedDict()
+        self._max_users = self._cache.maxsize
+        self._lock = threading.Lock()
+
+    def _remember(self, user_id: Optional[int], key: Hashable) -> None:
+        if user_id is None:
+            return
+        dropped: list[Hashable] = []
+        with self._lock:
+            keys = self._user_keys.setdefault(user_id, {})
+            self._user_keys.move_to_end(user_id)
+            keys.pop(key, None)
+            keys[key] = None
+            # Old contexts and forecasts of a user; entries expired or evicted from the cache age out here too.
+            while len(keys) > KEYS_PER_USER:
+                dropped.append(next(iter(keys)))
+                del keys[dropped[-1]]
+            while len(self._user_keys) > self._max_users:
+                dropped.extend(self._user_keys.popitem(last=False)[1])
+        for stale in dropped:
+            self._cache.pop(stale)
+
+    def _get(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        result = self._cache.get(key, _MISSING)
+        if result is _MISSING:
+            result = compute()
+            self._cache.set(key, result)
+        return result
+
+    def recommend(self, ctx: FarmContext, *, user_id: Optional[int] = None) -> tuple[list[dict], str]:
+        key = ("rec", model_version(), ctx)
+        self._remember(user_id, key)
+        crops, rationale = self._get(key, lambda: recommend_crops(ctx))
+        return [dict(c) for c in crops], rationale
+
+    def risk(
+        self,
+        ctx: FarmContext,
+        *,
+        latitude: Optional[float],
+        longitude: Optional[float],
+        forecast: Optional[ForecastFeatures] = None,
+        user_id: Optional[int] = None,
+    ) -> tuple[float, str, list[str], list[str]]:
+        key = ("risk", model_version(), ctx, latitude, longitude, forecast)
+        self._remember(user_id, key)
+        score, level, top, mitigation = self._get(
+            key, lambda: predict_risk(ctx, latitude=latitude, longitude=longitude, forecast=forecast)
+        )
+        return score, level, list(top), list(mitigation)
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            keys = self._user_keys.pop(user_id, ())
+        for key in keys:
+            self._cache.pop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._user_keys.clear()
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+score_cache = ScoreCache(
+    maxsize=int(os.environ.get("KRISHIRAKSHAK_SCORE_CACHE_SIZE", "10000")),
+    ttl_seconds=float(os.environ.get("KRISHIRAKSHAK_SCORE_CACHE_TTL", "3600")),
+)
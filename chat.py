@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Union
+
+# Chat intents, keywords (English, Hindi, romanized Hindi and other regional languages) and replies live in a
+# JSON data file; see its "comment" for the format. It is re-read when it changes, at most once per interval.
+INTENTS_PATH = Path(os.environ.get("KRISHIRAKSHAK_CHAT_INTENTS", Path(__file__).resolve().parent / "chat_intents.json"))
+RELOAD_SECONDS = float(os.environ.get("KRISHIRAKSHAK_CHAT_RELOAD_SECONDS", "2"))
+# Replies of up to this many of the best-ranked intents are combined.
+MAX_REPLIES = int(os.environ.get("KRISHIRAKSHAK_CHAT_MAX_REPLIES", "2"))
+
+logger = logging.getLogger(__name__)
+
+# Word characters for keyword boundaries: \w plus the Indic blocks (Devanagari .. Sinhala), whose vowel signs
+# are combining marks that \w does not cover.
+_WORD = "[\\w\u0900-\u0dff]"
+_DEVANAGARI = re.compile("[\u0900-\u097f]")
+
+
+def normalize(text: str) -> str:
+    return unicodedata.normalize("NFC", text).casefold()
+
+
+@dataclass(frozen=True)
+class IntentMatch:
+    name: str
+    score: float
+    keywords: tuple[str, ...]
+
+
+def _trie_pattern(keywords: dict[str, bool]) -> str:
+    # keywords: text -> prefix match. Factored into a character trie so the regex engine follows one branch
+    # per character instead of trying every keyword at every position; longer keywords win over shorter ones.
+    trie: dict = {}
+    for word, prefix in keywords.items():
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = prefix
+
+    def build(node: dict) -> str:
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if "" in node:
+            branches.append("" if node[""] else f"(?!{_WORD})")
+        if len(branches) == 1:
+            return branches[0]
+        return "(?:" + "|".join(branches) + ")"
+
+    return f"(?<!{_WORD}){build(trie)}"
+
+
+class IntentMatcher:
+    # Every keyword of every intent compiled into one regex: a single pass over the message finds all hits,
+    # which are then scored per intent (sum of the weights of the distinct keywords found).
+    def __init__(self, spec: dict, *, version: Optional[str] = None) -> None:
+        self.version = version
+        self.intents = [intent["name"] for intent in spec["intents"]]
+        self.replies = {intent["name"]: intent["reply"] for intent in spec["intents"]}
+        self.fallback = spec["fallback"]["name"]
+        self.replies[self.fallback] = spec["fallback"]["reply"]
+        self._order = {name: i for i, name in enumerate(self.intents)}
+        # keyword -> [(intent, weight)]; a keyword may belong to several intents.
+        self._hits: dict[str, list[tuple[str, float]]] = {}
+        prefix: dict[str, bool] = {}
+        for intent in spec["intents"]:
+            for words in intent["keywords"].values():
+                for entry in words:
+                    word, weight = (entry, 1.0) if isinstance(entry, str) else (entry[0], float(entry[1]))
+                    word = normalize(word.strip())
+                    is_prefix = word.endswith("*")
+                    word = word.rstrip("*")
+                    if not word:
+                        raise ValueError(f"Empty keyword in intent {intent['name']!r}")
+                    owners = self._hits.setdefault(word, [])
+                    if all(name != intent["name"] for name, _ in owners):
+                        owners.append((intent["name"], weight))
+                    prefix[word] = prefix.get(word, False) or is_prefix
+        self.keyword_count = len(self._hits)
+        self._pattern = re.compile(_trie_pattern(prefix)) if prefix else None
+
+    @classmethod
+    def from_file(cls, path: Union[str, Path]) -> "IntentMatcher":
+        path = Path(path)
+        spec = json.loads(path.read_text(encoding="utf-8"))
+        return cls(spec, version=str(spec.get("version", "")))
+
+    def match(self, message: str) -> list[IntentMatch]:
+        # Intents found in the message, best first; ties keep the data file's order.
+        if self._pattern is None:
+            return []
+        found: dict[str, dict[str, float]] = {}
+        for word in set(self._pattern.findall(normalize(message))):
+            for name, weight in self._hits[word]:
+                found.setdefault(name, {})[word] = weight
+        matches = [IntentMatch(name, sum(words.values()), tuple(sorted(words))) for name, words in found.items()]
+        matches.sort(key=lambda m: (-m.score, self._order[m.name]))
+        return matches
+
+    def _reply_text(self, name: str, language: str) -> str:
+        replies = self.replies[name]
+        return replies.get(language) or replies["en"]
+
+    def reply(self, message: str) -> tuple[str, list[str], list[IntentMatch]]:
+        # One reply language per message, by script: Hindi replies for Devanagari text, English otherwise
+        # (romanized Hindi included).
+        language = "hi" if _DEVANAGARI.search(message) else "en"
+        matches = self.match(message)
+        if not matches:
+            return self._reply_text(self.fallback, language), [self.fallback], []
+        text = " ".join(self._reply_text(m.name, language) for m in matches[: max(1, MAX_REPLIES)])
+        return text, [m.name for m in matches], matches
+
+
+class _ReloadingMatcher:
+    # Holds the current IntentMatcher and swaps in a new one when the data file's mtime or size changes.
+    # A file that fails to load is logged and the previous matcher stays in service.
+    def __init__(self, path: Path, interval: float) -> None:
+        self.path = path
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._matcher: Optional[IntentMatcher] = None
+        self._stamp: Optional[tuple[int, int]] = None
+        self._checked = 0.0
+        self.loaded_at: Optional[float] = None
+        self.reloads = 0
+        self.errors = 0
+
+    def get(self) -> IntentMatcher:
+        now = time.monotonic()
+        if self._matcher is None or now - self._checked >= self.interval:
+            with self._lock:
+                if self._matcher is None or now - self._checked >= self.interval:
+                    self._checked = now
+                    self._refresh()
+        return self._matcher
+
+    def _refresh(self) -> None:
+        try:
+            st = self.path.stat()
+            stamp = (st.st_mtime_ns, st.st_size)
+            if stamp == self._stamp and self._matcher is not None:
+                return
+            matcher = IntentMatcher.from_file(self.path)
+        except Exception:
+            self.errors += 1
+            if self._matcher is None:
+                raise
+            logger.exception("Could not reload chat intents from %s; keeping the previous version", self.path)
+            return
+        if self._matcher is not None:
+            self.reloads += 1
+        self._matcher, self._stamp, self.loaded_at = matcher, stamp, time.time()
+
+    def stats(self) -> dict:
+        matcher = self._matcher
+        return {
+            "path": str(self.path),
+            "version": matcher.version if matcher else None,
+            "intents": len(matcher.intents) if matcher else 0,
+            "keywords": matcher.keyword_count if matcher else 0,
+            "loaded_at": self.loaded_at,
+            "reloads": self.reloads,
+            "errors": self.errors,
+        }
+
+
+_current = _ReloadingMatcher(INTENTS_PATH, RELOAD_SECONDS)
+
+
+def get_matcher() -> IntentMatcher:
+    return _current.get()
+
+
+def reply(message: str) -> tuple[str, list[str]]:
+    text, intents, _ = get_matcher().reply(message)
+    return text, intents
+
+
+def stats() -> dict:
+    return _current.stats()
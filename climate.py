@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import json
+import math
+import os
+import sys
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+
+# Gridded agro-climatic layers: a .npy raster of CELL_DTYPE (memory-mapped, so only the pages that lookups
+# touch become resident) plus a .json sidecar with the georeference. Row 0 is the southern edge.
+GRID_PATH = Path(os.environ.get("KRISHIRAKSHAK_CLIMATE_GRID", Path(__file__).resolve().parent / "climate_grid.npy"))
+
+CELL_DTYPE = np.dtype([("zone", "u1"), ("frost_days", "u1"), ("rainfall_mm", "<u2")])
+
+# Planning Commission agro-climatic zones; 0 marks cells without data.
+ZONES = (
+    "",
+    "Western Himalayan Region",
+    "Eastern Himalayan Region",
+    "Lower Gangetic Plains",
+    "Middle Gangetic Plains",
+    "Upper Gangetic Plains",
+    "Trans-Gangetic Plains",
+    "Eastern Plateau and Hills",
+    "Central Plateau and Hills",
+    "Western Plateau and Hills",
+    "Southern Plateau and Hills",
+    "East Coast Plains and Hills",
+    "West Coast Plains and Ghats",
+    "Gujarat Plains and Hills",
+    "Western Dry Region",
+    "Islands Region",
+)
+
+
+@dataclass(frozen=True)
+class ClimateCell:
+    zone: int
+    zone_name: str
+    rainfall_mm: int  # annual normal
+    frost_days: int  # per year
+
+
+class ClimateGrid:
+    def __init__(self, cells: np.ndarray, *, south: float, west: float, resolution_deg: float) -> None:
+        self.cells = cells
+        # Same bytes viewed as one little-endian word per cell: scalar lookups skip building a record.
+        self._packed = np.asarray(cells).view("<u4")
+        self.south = south
+        self.west = west
+        self.resolution_deg = resolution_deg
+        self.rows, self.cols = cells.shape
+
+    @classmethod
+    def open(cls, path: Union[str, Path]) -> "ClimateGrid":
+        path = Path(path)
+        meta = json.loads(path.with_suffix(".json").read_text())
+        cells = np.load(path, mmap_mode="r")
+        if cells.dtype != CELL_DTYPE:
+            raise ValueError(f"{path}: unexpected cell dtype {cells.dtype}")
+        return cls(cells, south=meta["south"], west=meta["west"], resolution_deg=meta["resolution_deg"])
+
+    def _index(self, lat: float, lon: float) -> Optional[tuple[int, int]]:
+        # Same arithmetic as lookup_many, so scalar and batch scoring always pick the same cell.
+        i = math.floor((lat - self.south) / self.resolution_deg)
+        j = math.floor((lon - self.west) / self.resolution_deg)
+        if 0 <= i < self.rows and 0 <= j < self.cols:
+            return i, j
+        return None
+
+    def lookup(self, lat: Optional[float], lon: Optional[float]) -> Optional[ClimateCell]:
+        if lat is None or lon is None or lat != lat or lon != lon:
+            return None
+        ij = self._index(lat, lon)
+        if ij is None:
+            return None
+        packed = self._packed.item(ij)
+        zone = packed & 0xFF
+        if not zone:
+            return None
+        return ClimateCell(zone=zone, zone_name=ZONES[zone], rainfall_mm=packed >> 16, frost_days=(packed >> 8) & 0xFF)
+
+    def lookup_many(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        # CELL_DTYPE records; zone 0 where the point is missing or outside the grid.
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        with np.errstate(invalid="ignore"):
+            i = np.floor((lats - self.south) / self.resolution_deg)
+            j = np.floor((lons - self.west) / self.resolution_deg)
+            ok = (i >= 0) & (i < self.rows) & (j >= 0) & (j < self.cols)
+        out = np.zeros(len(lats), dtype=CELL_DTYPE)
+        out[ok] = self.cells[i[ok].astype(np.intp), j[ok].astype(np.intp)]
+        return out
+
+
+@lru_cache(maxsize=1)
+def get_grid() -> Optional[ClimateGrid]:
+    # Opened once per process. Without a grid file the risk model falls back to its latitude heuristic.
+    if not GRID_PATH.exists():
+        return None
+    return ClimateGrid.open(GRID_PATH)
+
+
+def reload_grid() -> Optional[ClimateGrid]:
+    get_grid.cache_clear()
+    return get_grid()
+
+
+def lookup(lat: Optional[float], lon: Optional[float]) -> Optional[ClimateCell]:
+    grid = get_grid()
+    return grid.lookup(lat, lon) if grid is not None else None
+
+
+def lookup_many(lats: np.ndarray, lons: np.ndarray) -> Optional[np.ndarray]:
+    grid = get_grid()
+    return grid.lookup_many(lats, lons) if grid is not None else None
+
+
+# Synthetic grid for development and benchmarks: Voronoi cells around rough zone centres, with rainfall and
+# frost normals shaped like the real gradients. Not for agronomic use.
+_ZONE_CENTRES = np.array(
+    [
+        (33.5, 76.0), (26.5, 92.5), (23.5, 88.0), (25.8, 85.0), (27.5, 80.0),
+        (30.0, 75.5), (22.5, 83.5), (24.0, 78.0), (19.5, 76.0), (14.5, 77.5),
+        (16.5, 81.5), (13.0, 74.8), (22.5, 71.5), (27.0, 71.5), (11.5, 92.7),
+    ]
+)
+_ZONE_RAINFALL_MM = np.array([0, 1100, 2500, 1600, 1200, 900, 600, 1400, 1000, 900, 800, 1100, 2800, 800, 350, 2500])
+_ZONE_FROST_BONUS = np.array([0, 45, 20, 0, 2, 6, 10, 0, 2, 0, 0, 0, 0, 0, 4, 0])
+
+
+def generate_synthetic(
+    path: Union[str, Path],
+    *,
+    south: float = 6.0,
+    north: float = 38.0,
+    west: float = 68.0,
+    east: float = 98.0,
+    resolution_deg: float = 0.01,
+    seed: int = 7,
+) -> ClimateGrid:
+    path = Path(path)
+    rows = int(round((north - south) / resolution_deg))
+    cols = int(round((east - west) / resolution_deg))
+    rng = np.random.default_rng(seed)
+    phases = rng.uniform(0, 2 * np.pi, 4)
+    cells = np.lib.format.open_memmap(path, mode="w+", dtype=CELL_DTYPE, shape=(rows, cols))
+    lons = west + (np.arange(cols) + 0.5) * resolution_deg
+    # Written in row bands so generating a national grid stays within a few hundred MB.
+    band = max(1, 1_000_000 // cols)
+    for start in range(0, rows, band):
+        lats = south + (np.arange(start, min(rows, start + band)) + 0.5) * resolution_deg
+        lat, lon = np.meshgrid(lats, lons, indexing="ij")
+        d2 = (lat[..., None] - _ZONE_CENTRES[:, 0]) ** 2 + (lon[..., None] - _ZONE_CENTRES[:, 1]) ** 2
+        zone = (np.argmin(d2, axis=-1) + 1).astype(np.uint8)
+        wobble = 1 + 0.15 * np.sin(lat * 0.9 + phases[0]) * np.cos(lon * 0.7 + phases[1])
+        rain = _ZONE_RAINFALL_MM[zone] * wobble
+        frost = np.maximum(0.0, (lat - 22.0) * 2.5) + _ZONE_FROST_BONUS[zone] + 3 * np.sin(lon * 1.3 + phases[2])
+        out = cells[start : start + len(lats)]
+        out["zone"] = zone
+        out["rainfall_mm"] = np.clip(rain, 0, 65535).astype(np.uint16)
+        out["frost_days"] = np.clip(frost, 0, 255).astype(np.uint8)
+    cells.flush()
+    del cells
+    meta = {"south": south, "west": west, "resolution_deg": resolution_deg, "rows": rows, "cols": cols, "synthetic": True}
+    path.with_suffix(".json").write_text(json.dumps(meta, indent=2))
+    return ClimateGrid.open(path)
+
+
+if __name__ == "__main__":
+    # python -m fastapi_app.climate [out.npy] [resolution_deg]   -> writes a synthetic national grid
+    out = Path(sys.argv[1]) if len(sys.argv) > 1 else GRID_PATH
+    grid = generate_synthetic(out, resolution_deg=float(sys.argv[2]) if len(sys.argv) > 2 else 0.01)
+    print(f"{out}: {grid.rows} x {grid.cols} cells, {out.stat().st_size / 2**20:.1f} MiB")
@@ -1,14 +1,43 @@
 from __future__ import annotations
 
+import asyncio
 import os
+import queue
 import sqlite3
-from contextlib import contextmanager
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager, contextmanager
 from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Optional, Sequence, TypeVar
+
+from . import metrics
+from .workers import run_db
+
+T = TypeVar("T")
 
 DB_PATH = Path(os.environ.get("KRISHIRAKSHAK_DB_PATH", Path(__file__).resolve().parent / "krishirakshak.db"))
+POOL_SIZE = int(os.environ.get("KRISHIRAKSHAK_DB_POOL_SIZE", "8"))
+POOL_TIMEOUT_SECONDS = float(os.environ.get("KRISHIRAKSHAK_DB_POOL_TIMEOUT", "5"))
+
+# Applied once per physical connection, not per checkout.
+_PRAGMAS = (
+    "PRAGMA foreign_keys = ON;",
+    "PRAGMA journal_mode = WAL;",
+    "PRAGMA synchronous = NORMAL;",
+    "PRAGMA cache_size = -16000;",  # ~16 MiB page cache
+    "PRAGMA mmap_size = 268435456;",  # 256 MiB
+    "PRAGMA temp_store = MEMORY;",
+    "PRAGMA busy_timeout = 5000;",
+)
+
+
+class PoolExhausted(sqlite3.OperationalError):
+    pass
 
 
 def _connect() -> sqlite3.Connection:
+    # Legacy open-per-request connection; kept for one-off scripts and the pool benchmark baseline.
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
     conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
@@ -16,48 +45,558 @@ def _connect() -> sqlite3.Connection:
     return conn
 
 
+class ConnectionPool:
+    def __init__(self, path: Path, *, size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT_SECONDS) -> None:
+        self.path = Path(path)
+        self.size = max(1, size)
+        self.timeout = timeout
+        self._idle: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_seconds = 0.0
+        self._exhausted = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def _open(self) -> sqlite3.Connection:
+        # Handlers run on Starlette's threadpool, so a connection may be checked out from different threads.
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for pragma in _PRAGMAS:
+            conn.execute(pragma)
+        if metrics.ENABLED:
+            conn.set_trace_callback(metrics.trace_statement)
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = None
+        if conn is None:
+            with self._lock:
+                grow = self._created < self.size
+                if grow:
+                    self._created += 1
+            if grow:
+                try:
+                    conn = self._open()
+                except BaseException:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                started = time.perf_counter()
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._exhausted += 1
+                    raise PoolExhausted(f"No database connection available within {self.timeout:.1f}s")
+                finally:
+                    with self._lock:
+                        self._waits += 1
+                        self._wait_seconds += time.perf_counter() - started
+        with self._lock:
+            self._checkouts += 1
+            self._in_use += 1
+        return conn
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            self._in_use -= 1
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            self.release(conn)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": self.size,
+                "created": self._created,
+                "in_use": self._in_use,
+                "idle": self._idle.qsize(),
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "wait_seconds": round(self._wait_seconds, 6),
+                "exhausted": self._exhausted,
+            }
+
+    def close(self) -> None:
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_PATH)
+    return _pool
+
+
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def pool_stats() -> dict:
+    return get_pool().stats()
+
+
 @contextmanager
 def get_db() -> sqlite3.Connection: # type: ignore
-    conn = _connect()
-    try:
+    with get_pool().connection() as conn:
         yield conn
-        conn.commit()
+
+
+def _timed(fn: Callable[..., T], *args: Any) -> T:
+    # Runs on the DB executor, in the calling request's context: the time lands in its metrics.RequestStats.
+    started = time.perf_counter()
+    try:
+        return fn(*args)
     finally:
-        conn.close()
+        metrics.record_db_time(time.perf_counter() - started)
 
 
-def init_db() -> None:
-    with get_db() as db:
+class AsyncConnection:
+    # Thin async facade over a pooled connection; every call hops to the DB executor once.
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self._conn = conn
+
+    async def execute(self, sql: str, params: Sequence[Any] = ()) -> sqlite3.Cursor:
+        return await run_db(_timed, self._conn.execute, sql, params)
+
+    async def executemany(self, sql: str, rows: Sequence[Sequence[Any]]) -> sqlite3.Cursor:
+        return await run_db(_timed, self._conn.executemany, sql, rows)
+
+    async def fetchone(self, sql: str, params: Sequence[Any] = ()) -> Optional[sqlite3.Row]:
+        return await run_db(_timed, lambda: self._conn.execute(sql, params).fetchone())
+
+    async def fetchall(self, sql: str, params: Sequence[Any] = ()) -> list[sqlite3.Row]:
+        return await run_db(_timed, lambda: self._conn.execute(sql, params).fetchall())
+
+    async def run(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        return await run_db(_timed, fn, self._conn)
+
+
+_gates: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+
+def _gate() -> asyncio.Semaphore:
+    # Queue async callers on the event loop rather than parking DB executor threads inside pool.acquire(),
+    # which could otherwise starve the holders that need a thread to finish and release.
+    loop = asyncio.get_running_loop()
+    gate = _gates.get(loop)
+    if gate is None:
+        gate = _gates[loop] = asyncio.Semaphore(get_pool().size)
+    return gate
+
+
+@asynccontextmanager
+async def get_db_async() -> AsyncIterator[AsyncConnection]:
+    pool = get_pool()
+    async with _gate():
+        conn = await run_db(pool.acquire)
+        try:
+            yield AsyncConnection(conn)
+            await run_db(_timed, conn.commit)
+        finally:
+            await run_db(pool.release, conn)
+
+
+def _m001_initial_schema(db: sqlite3.Connection) -> None:
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS users (
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          email TEXT UNIQUE NOT NULL,
+          name TEXT NOT NULL,
+          password_hash TEXT NOT NULL,
+          salt TEXT NOT NULL,
+          created_at TEXT NOT NULL
+        );
+        """
+    )
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS farm_profiles (
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          user_id INTEGER NOT NULL,
+          latitude REAL,
+          longitude REAL,
+          location_name TEXT,
+          soil_type TEXT,
+          ph REAL,
+          nitrogen REAL,
+          phosphorus REAL,
+          potassium REAL,
+          farm_size_acres REAL,
+          irrigation_type TEXT,
+          season TEXT,
+          last_updated TEXT NOT NULL,
+          FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+        );
+        """
+    )
+
+
+_PROFILE_FIELDS = (
+    "latitude", "longitude", "location_name", "soil_type", "ph", "nitrogen", "phosphorus",
+    "potassium", "farm_size_acres", "irrigation_type", "season",
+)
+
+
+def _m002_unique_profile_per_user(db: sqlite3.Connection) -> None:
+    # Racing first-time writes could leave several rows per user, often one holding the location and
+    # another the soil details. Fold them into the newest row (newest non-null value wins per column).
+    dup_users = [r[0] for r in db.execute("SELECT user_id FROM farm_profiles GROUP BY user_id HAVING COUNT(*) > 1")]
+    for user_id in dup_users:
+        rows = db.execute(
+            "SELECT * FROM farm_profiles WHERE user_id = ? ORDER BY last_updated DESC, id DESC", (user_id,)
+        ).fetchall()
+        keep = rows[0]
+        merged = {f: next((r[f] for r in rows if r[f] is not None), None) for f in _PROFILE_FIELDS}
         db.execute(
-            """
-            CREATE TABLE IF NOT EXISTS users (
-              id INTEGER PRIMARY KEY AUTOINCREMENT,
-              email TEXT UNIQUE NOT NULL,
-              name TEXT NOT NULL,
-              password_hash TEXT NOT NULL,
-              salt TEXT NOT NULL,
-              created_at TEXT NOT NULL
-            );
-            """
+            f"UPDATE farm_profiles SET {', '.join(f'{f}=?' for f in _PROFILE_FIELDS)} WHERE id = ?",
+            (*merged.values(), keep["id"]),
         )
+        db.execute("DELETE FROM farm_profiles WHERE user_id = ? AND id != ?", (user_id, keep["id"]))
+    db.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_farm_profiles_user_id ON farm_profiles(user_id);")
+
+
+def _m003_password_params(db: sqlite3.Connection) -> None:
+    # Existing hashes were all produced with the original fixed parameters.
+    db.execute("ALTER TABLE users ADD COLUMN password_algorithm TEXT NOT NULL DEFAULT 'pbkdf2_sha256';")
+    db.execute("ALTER TABLE users ADD COLUMN password_iterations INTEGER NOT NULL DEFAULT 210000;")
+
+
+def _m004_market_prices(db: sqlite3.Connection) -> None:
+    db.execute(
+        """
+        CREATE TABLE market_prices (
+          id INTEGER PRIMARY KEY,
+          commodity TEXT NOT NULL COLLATE NOCASE,
+          variety TEXT NOT NULL DEFAULT '',
+          state TEXT NOT NULL COLLATE NOCASE,
+          district TEXT,
+          market TEXT NOT NULL COLLATE NOCASE,
+          price_date TEXT NOT NULL,
+          min_price REAL,
+          max_price REAL,
+          modal_price REAL NOT NULL,
+          arrivals_tonnes REAL
+        );
+        """
+    )
+    # The unique key doubles as the (commodity, market, date range) index and the previous-price lookup.
+    db.execute("CREATE UNIQUE INDEX ux_market_prices_key ON market_prices(commodity, market, price_date);")
+    db.execute("CREATE INDEX ix_market_prices_market_date ON market_prices(market, price_date);")
+    db.execute("CREATE INDEX ix_market_prices_state_commodity_date ON market_prices(state, commodity, price_date);")
+    db.execute("CREATE INDEX ix_market_prices_date ON market_prices(price_date);")
+    # Materialized latest observation per pair, maintained by market.ingest_rows().
+    db.execute(
+        """
+        CREATE TABLE market_latest (
+          commodity TEXT NOT NULL COLLATE NOCASE,
+          market TEXT NOT NULL COLLATE NOCASE,
+          state TEXT NOT NULL COLLATE NOCASE,
+          price_date TEXT NOT NULL,
+          modal_price REAL NOT NULL,
+          prev_modal_price REAL,
+          PRIMARY KEY (commodity, market)
+        ) WITHOUT ROWID;
+        """
+    )
+    db.execute("CREATE INDEX ix_market_latest_state ON market_latest(state, commodity, market);")
+
+
+def _m005_market_rolling_stats(db: sqlite3.Connection) -> None:
+    # Rolling aggregates per pair as of its latest price date, maintained alongside market_latest. Existing
+    # rows are filled in by the market_latest rebuild (see REBUILDS).
+    for col in ("mean_7d", "mean_30d", "mean_90d", "volatility_30d", "change_7d_pct", "change_30d_pct", "change_90d_pct"):
+        db.execute(f"ALTER TABLE market_latest ADD COLUMN {col} REAL")
+
+
+def _m006_spatial_index(db: sqlite3.Connection) -> None:
+    # R*Tree indexes over farm and mandi coordinates. Triggers keep them in step with every write path
+    # (save_location, bulk upserts, deletes), so there is no separate sync step.
+    db.execute("CREATE VIRTUAL TABLE farm_locations USING rtree(id, min_lat, max_lat, min_lon, max_lon);")
+    db.execute(
+        """
+        CREATE TABLE mandis (
+          id INTEGER PRIMARY KEY,
+          name TEXT NOT NULL COLLATE NOCASE,
+          state TEXT NOT NULL DEFAULT '' COLLATE NOCASE,
+          district TEXT,
+          latitude REAL NOT NULL,
+          longitude REAL NOT NULL
+        );
+        """
+    )
+    db.execute("CREATE UNIQUE INDEX ux_mandis_name_state ON mandis(name, state);")
+    db.execute("CREATE VIRTUAL TABLE mandi_locations USING rtree(id, min_lat, max_lat, min_lon, max_lon);")
+    for table, index in (("farm_profiles", "farm_locations"), ("mandis", "mandi_locations")):
         db.execute(
+            f"""
+            CREATE TRIGGER {index}_ai AFTER INSERT ON {table}
+            WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL
+            BEGIN
+              INSERT OR REPLACE INTO {index}(id, min_lat, max_lat, min_lon, max_lon)
+              VALUES (NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude);
+            END;
             """
-            CREATE TABLE IF NOT EXISTS farm_profiles (
-              id INTEGER PRIMARY KEY AUTOINCREMENT,
-              user_id INTEGER NOT NULL,
-              latitude REAL,
-              longitude REAL,
-              location_name TEXT,
-              soil_type TEXT,
-              ph REAL,
-              nitrogen REAL,
-              phosphorus REAL,
-              potassium REAL,
-              farm_size_acres REAL,
-              irrigation_type TEXT,
-              season TEXT,
-              last_updated TEXT NOT NULL,
-              FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
-            );
+        )
+        db.execute(
+            f"""
+            CREATE TRIGGER {index}_au AFTER UPDATE OF latitude, longitude ON {table}
+            BEGIN
+              DELETE FROM {index} WHERE id = OLD.id;
+              INSERT INTO {index}(id, min_lat, max_lat, min_lon, max_lon)
+              SELECT NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude
+              WHERE NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL;
+            END;
             """
         )
+        db.execute(f"CREATE TRIGGER {index}_ad AFTER DELETE ON {table} BEGIN DELETE FROM {index} WHERE id = OLD.id; END;")
+    db.execute(
+        """
+        INSERT INTO farm_locations(id, min_lat, max_lat, min_lon, max_lon)
+        SELECT id, latitude, latitude, longitude, longitude FROM farm_profiles
+        WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+        """
+    )
+
+
+def _m007_score_jobs(db: sqlite3.Connection) -> None:
+    # Persistent re-score queue, one row per user: repeated enqueues bump the generation instead of adding
+    # rows, so a burst of profile edits costs one scoring pass (see scoring.py).
+    db.execute(
+        """
+        CREATE TABLE score_jobs (
+          user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+          reason TEXT NOT NULL,
+          generation INTEGER NOT NULL DEFAULT 1,
+          enqueued_at TEXT NOT NULL,
+          claimed_at REAL,
+          attempts INTEGER NOT NULL DEFAULT 0,
+          last_error TEXT
+        );
+        """
+    )
+    db.execute("CREATE INDEX ix_score_jobs_pending ON score_jobs(claimed_at, enqueued_at);")
+    # Latest precomputed results; profile_updated is the farm_profiles.last_updated they were computed from.
+    db.execute(
+        """
+        CREATE TABLE farm_scores (
+          user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+          model_version TEXT NOT NULL,
+          profile_updated TEXT NOT NULL,
+          recommendation TEXT NOT NULL,
+          risk TEXT NOT NULL,
+          forecast TEXT,
+          computed_at TEXT NOT NULL
+        );
+        """
+    )
+
+
+def _m008_farm_outcomes(db: sqlite3.Connection) -> None:
+    # Labelled season outcomes for training the risk and crop models (see model.py). Each row snapshots the
+    # farm as it was when the crop was grown, so later profile edits do not relabel history.
+    db.execute(
+        """
+        CREATE TABLE farm_outcomes (
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          user_id INTEGER REFERENCES users(id) ON DELETE SET NULL,
+          recorded_at TEXT NOT NULL,
+          crop TEXT NOT NULL,
+          season TEXT,
+          soil_type TEXT,
+          ph REAL,
+          nitrogen REAL,
+          phosphorus REAL,
+          potassium REAL,
+          irrigation_type TEXT,
+          latitude REAL,
+          longitude REAL,
+          forecast_max_temp_c REAL,
+          forecast_min_temp_c REAL,
+          forecast_rain_mm REAL,
+          crop_success INTEGER NOT NULL CHECK (crop_success IN (0, 1)),
+          loss INTEGER NOT NULL CHECK (loss IN (0, 1))
+        );
+        """
+    )
+    db.execute("CREATE INDEX ix_farm_outcomes_user ON farm_outcomes(user_id);")
+
+
+def _m009_market_series_key(db: sqlite3.Connection) -> None:
+    # Agmarknet reports several varieties per commodity and mandi a day, and mandi names repeat across states:
+    # a price series is (commodity, market, state, variety), not (commodity, market).
+    db.execute("DROP INDEX ux_market_prices_key;")
+    db.execute("CREATE UNIQUE INDEX ux_market_prices_key ON market_prices(commodity, market, state, variety, price_date);")
+    db.execute(
+        """
+        CREATE TABLE market_latest_v9 (
+          commodity TEXT NOT NULL COLLATE NOCASE,
+          market TEXT NOT NULL COLLATE NOCASE,
+          state TEXT NOT NULL COLLATE NOCASE,
+          variety TEXT NOT NULL DEFAULT '',
+          price_date TEXT NOT NULL,
+          modal_price REAL NOT NULL,
+          prev_modal_price REAL,
+          mean_7d REAL,
+          mean_30d REAL,
+          mean_90d REAL,
+          volatility_30d REAL,
+          change_7d_pct REAL,
+          change_30d_pct REAL,
+          change_90d_pct REAL,
+          PRIMARY KEY (commodity, market, state, variety)
+        ) WITHOUT ROWID;
+        """
+    )
+    # Under the old key each latest row matches exactly one price row, which supplies its variety.
+    db.execute(
+        """
+        INSERT INTO market_latest_v9
+        SELECT l.commodity, l.market, l.state, p.variety, l.price_date, l.modal_price, l.prev_modal_price,
+               l.mean_7d, l.mean_30d, l.mean_90d, l.volatility_30d, l.change_7d_pct, l.change_30d_pct, l.change_90d_pct
+        FROM market_latest l
+        JOIN market_prices p ON p.commodity = l.commodity AND p.market = l.market AND p.price_date = l.price_date
+        """
+    )
+    db.execute("DROP TABLE market_latest;")
+    db.execute("ALTER TABLE market_latest_v9 RENAME TO market_latest;")
+    db.execute("CREATE INDEX ix_market_latest_state ON market_latest(state, commodity, market);")
+
+
+def _m010_token_revocations(db: sqlite3.Connection) -> None:
+    # Shared by all serving processes: each one replays rows past the last id it has seen (security.py). A row
+    # revokes one token (logout) or every token of a user issued before revoked_at (password change), and
+    # can be dropped once expires_at has passed, as every token it covers has expired by then.
+    db.execute(
+        """
+        CREATE TABLE token_revocations (
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          token_digest BLOB,
+          user_id INTEGER,
+          revoked_at REAL NOT NULL,
+          expires_at REAL NOT NULL,
+          CHECK ((token_digest IS NULL) != (user_id IS NULL))
+        );
+        """
+    )
+    db.execute("CREATE INDEX ix_token_revocations_expires ON token_revocations(expires_at);")
+
+
+# Append-only: never edit or reorder an applied migration, add a new one instead. Migrations hold DDL and
+# plain SQL only, never calls into other modules, so what they do is fixed once written.
+MIGRATIONS: tuple[tuple[int, str, Callable[[sqlite3.Connection], None]], ...] = (
+    (1, "initial schema", _m001_initial_schema),
+    (2, "unique farm profile per user", _m002_unique_profile_per_user),
+    (3, "per-user password hashing parameters", _m003_password_params),
+    (4, "market price history", _m004_market_prices),
+    (5, "market rolling statistics", _m005_market_rolling_stats),
+    (6, "spatial index for farms and mandis", _m006_spatial_index),
+    (7, "background score queue and results", _m007_score_jobs),
+    (8, "labelled farm outcomes", _m008_farm_outcomes),
+    (9, "market price series keyed by state and variety", _m009_market_series_key),
+    (10, "shared token revocations", _m010_token_revocations),
+)
+
+
+def _rebuild_market_latest(db: sqlite3.Connection) -> None:
+    from .market import refresh_latest
+
+    refresh_latest(db)
+
+
+# Derived tables recomputed with the current code after a migration run that applied any of the listed
+# versions. They run against the final schema, in the same transaction, and only when migrating to the
+# latest version.
+REBUILDS: tuple[tuple[frozenset[int], Callable[[sqlite3.Connection], None]], ...] = (
+    (frozenset({5, 9}), _rebuild_market_latest),
+)
+
+
+def schema_version(db: sqlite3.Connection) -> int:
+    has_table = db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_migrations'").fetchone()
+    if not has_table:
+        return 0
+    row = db.execute("SELECT MAX(version) FROM schema_migrations").fetchone()
+    return int(row[0] or 0)
+
+
+def migrate(db: sqlite3.Connection, *, target: Optional[int] = None) -> int:
+    latest = MIGRATIONS[-1][0] if target is None else target
+    if schema_version(db) >= latest:
+        return schema_version(db)
+    if db.in_transaction:
+        db.commit()
+    # BEGIN IMMEDIATE takes the write lock up front, so concurrent starters (e.g. several workers)
+    # serialize here and the loser sees the versions already recorded.
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS schema_migrations (version INTEGER PRIMARY KEY, name TEXT NOT NULL, applied_at TEXT NOT NULL)"
+        )
+        current = schema_version(db)
+        applied = set()
+        for version, name, apply in MIGRATIONS:
+            if current < version <= latest:
+                apply(db)
+                db.execute(
+                    "INSERT INTO schema_migrations(version, name, applied_at) VALUES (?, ?, strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))",
+                    (version, name),
+                )
+                applied.add(version)
+        if latest >= MIGRATIONS[-1][0]:
+            for versions, rebuild in REBUILDS:
+                if versions & applied:
+                    rebuild(db)
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    return schema_version(db)
+
+
+def init_db() -> None:
+    with get_db() as db:
+        migrate(db)
+
+
+def require_schema() -> None:
+    # For processes that must not run DDL themselves (serve.py's workers): fail fast on an outdated schema.
+    with get_db() as db:
+        version = schema_version(db)
+    latest = MIGRATIONS[-1][0]
+    if version < latest:
+        raise RuntimeError(f"Database schema is at version {version}, expected {latest}; run the migrations first")
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import csv
+import math
+import sqlite3
+import sys
+from pathlib import Path
+from typing import IO, Iterable, Iterator, Optional, Union
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+# k-nearest searches stop growing here; points farther away are never returned.
+MAX_SEARCH_RADIUS_KM = 2500.0
+_KM_PER_DEG_LAT = math.pi * EARTH_RADIUS_KM / 180.0
+
+# R*Tree tables keyed by the id of the row they locate (farm_profiles.id, mandis.id).
+FARMS = "farm_locations"
+MANDIS = "mandi_locations"
+
+
+def haversine_km(lat1: float, lon1: float, lat2, lon2):
+    # Scalar or vectorized (NumPy arrays for lat2/lon2).
+    p1 = np.radians(lat1)
+    p2 = np.radians(lat2)
+    a = np.sin((p2 - p1) / 2) ** 2 + np.cos(p1) * np.cos(p2) * np.sin(np.radians(np.subtract(lon2, lon1)) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def bounding_box(lat: float, lon: float, radius_km: float) -> tuple[float, float, float, float]:
+    # (min_lat, max_lat, min_lon, max_lon) enclosing the circle; longitude span widens towards the poles.
+    dlat = radius_km / _KM_PER_DEG_LAT
+    min_lat, max_lat = max(-90.0, lat - dlat), min(90.0, lat + dlat)
+    cos_lat = min(math.cos(math.radians(min_lat)), math.cos(math.radians(max_lat)))
+    if cos_lat <= 1e-9 or radius_km / (_KM_PER_DEG_LAT * cos_lat) >= 180.0:
+        return min_lat, max_lat, -180.0, 180.0
+    dlon = radius_km / (_KM_PER_DEG_LAT * cos_lat)
+    return min_lat, max_lat, lon - dlon, lon + dlon
+
+
+def _candidates(db: sqlite3.Connection, table: str, lat: float, lon: float, radius_km: float) -> tuple[np.ndarray, np.ndarray]:
+    min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius_km)
+    boxes = [(min_lon, max_lon)]
+    # Split boxes that cross the antimeridian.
+    if min_lon < -180.0:
+        boxes = [(-180.0, max_lon), (min_lon + 360.0, 180.0)]
+    elif max_lon > 180.0:
+        boxes = [(min_lon, 180.0), (-180.0, max_lon - 360.0)]
+    rows: list[tuple] = []
+    for lo, hi in boxes:
+        rows += db.execute(
+            f"SELECT id, min_lat, min_lon FROM {table} WHERE min_lat <= ? AND max_lat >= ? AND min_lon <= ? AND max_lon >= ?",
+            (max_lat, min_lat, hi, lo),
+        ).fetchall()
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    # R*Tree coordinates are float32 (about a metre of error), close enough for distances.
+    arr = np.array(rows, dtype=np.float64)
+    return arr[:, 0].astype(np.int64), haversine_km(lat, lon, arr[:, 1], arr[:, 2])
+
+
+def within_radius(
+    db: sqlite3.Connection, table: str, lat: float, lon: float, radius_km: float, *, limit: Optional[int] = None
+) -> list[tuple[int, float]]:
+    # (id, distance_km) for every point within radius_km, nearest first.
+    ids, dist = _candidates(db, table, lat, lon, radius_km)
+    inside = dist <= radius_km
+    ids, dist = ids[inside], dist[inside]
+    order = np.argsort(dist, kind="stable")
+    if limit is not None:
+        order = order[:limit]
+    return [(int(ids[i]), float(dist[i])) for i in order]
+
+
+def nearest(
+    db: sqlite3.Connection, table: str, lat: float, lon: float, k: int, *, start_radius_km: float = 5.0
+) -> list[tuple[int, float]]:
+    # k nearest (id, distance_km). Grows the search circle until it holds k points: anything outside a
+    # circle is farther than everything inside it, so the result is exact.
+    radius = start_radius_km
+    while True:
+        ids, dist = _candidates(db, table, lat, lon, radius)
+        inside = dist <= radius
+        found = int(inside.sum())
+        if found >= k or radius >= MAX_SEARCH_RADIUS_KM:
+            ids, dist = ids[inside], dist[inside]
+            if len(ids) > k:
+                part = np.argpartition(dist, k - 1)[:k]
+                ids, dist = ids[part], dist[part]
+            order = np.argsort(dist, kind="stable")
+            return [(int(ids[i]), float(dist[i])) for i in order]
+        # Aim for the radius at which the observed density would yield k points, at least doubling.
+        growth = math.sqrt(k / found) * 1.2 if found else 4.0
+        radius = min(MAX_SEARCH_RADIUS_KM, radius * max(2.0, growth))
+
+
+_MANDI_HEADERS = {"market": "name", "mandi": "name", "name": "name", "state": "state", "district": "district",
+                  "latitude": "latitude", "lat": "latitude", "longitude": "longitude", "lon": "longitude", "lng": "longitude"}
+
+
+def parse_mandis(fh: IO[str]) -> Iterator[tuple]:
+    # Yields (name, state, district, latitude, longitude); rows without a name or valid coordinates are skipped.
+    reader = csv.DictReader(fh)
+    for raw in reader:
+        row = {_MANDI_HEADERS[k.strip().lower()]: (v or "").strip() for k, v in raw.items() if k and k.strip().lower() in _MANDI_HEADERS}
+        try:
+            lat, lon = float(row.get("latitude", "")), float(row.get("longitude", ""))
+        except ValueError:
+            continue
+        if not row.get("name") or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            continue
+        yield row["name"], row.get("state", ""), row.get("district") or None, lat, lon
+
+
+def load_mandis(db: sqlite3.Connection, rows: Iterable[tuple]) -> int:
+    # The mandi_locations index follows the mandis table through triggers.
+    count = 0
+    for row in rows:
+        db.execute(
+            """
+            INSERT INTO mandis(name, state, district, latitude, longitude) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(name, state) DO UPDATE SET
+              district=excluded.district, latitude=excluded.latitude, longitude=excluded.longitude
+            """,
+            row,
+        )
+        count += 1
+    return count
+
+
+def load_mandis_csv(db: sqlite3.Connection, source: Union[str, Path, IO[str]]) -> int:
+    if isinstance(source, (str, Path)):
+        with open(source, newline="", encoding="utf-8-sig") as fh:
+            return load_mandis(db, parse_mandis(fh))
+    return load_mandis(db, parse_mandis(source))
+
+
+def nearest_mandis(db: sqlite3.Connection, lat: float, lon: float, k: int = 5) -> list[dict]:
+    hits = nearest(db, MANDIS, lat, lon, k)
+    if not hits:
+        return []
+    by_id = {
+        r["id"]: r
+        for r in db.execute(
+            f"SELECT id, name, state, district, latitude, longitude FROM mandis WHERE id IN ({','.join('?' * len(hits))})",
+            [i for i, _ in hits],
+        )
+    }
+    return [
+        {**{k: by_id[i][k] for k in ("name", "state", "district", "latitude", "longitude")}, "distance_km": round(d, 3)}
+        for i, d in hits
+        if i in by_id
+    ]
+
+
+def main(argv: list[str]) -> None:
+    # python -m fastapi_app.geo mandis.csv [more.csv ...]   (columns: market/name, state, district, latitude, longitude)
+    from .db import get_db, init_db
+
+    init_db()
+    for path in argv:
+        with get_db() as db:
+            print(f"{path}: {load_mandis_csv(db, path)} mandis")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
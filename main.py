@@ -1,17 +1,33 @@
 from __future__ import annotations
 
-from datetime import datetime, timezone
+import asyncio
+import dataclasses
+import hashlib
+import json
+import logging
+import math
+import os
+import time
+from datetime import date, datetime, timezone
+from functools import lru_cache
 from typing import Optional
 
 import jwt
-from fastapi import Depends, FastAPI, Header, HTTPException
+from fastapi import BackgroundTasks, Depends, FastAPI, Header, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 
-from . import data_sources
-from .db import get_db, init_db
-from .ml import FarmContext, predict_risk, recommend_crops
+from . import climate, data_sources, geo, market, metrics, retrieval, scoring
+from . import chat as chat_intents
+from .cache import TTLCache, score_cache
+from .db import PoolExhausted, close_pool, get_db_async, init_db, pool_stats, require_schema
+from .ml import FarmBatch, FarmContext, ForecastFeatures, model_stats, predict_risk_batch, recommend_crops_batch, trained_model
 from .schemas import (
     AuthResponse,
+    BATCH_MAX_FARMS,
+    BatchScoreRequest,
+    BulkProfileRequest,
+    ChangePasswordRequest,
     ChatRequest,
     ChatResponse,
     LocationInput,
@@ -20,8 +36,47 @@ from .schemas import (
     RegisterRequest,
     RiskPredictionResponse,
     SoilFarmDetails,
+    SummaryResponse,
 )
-from .security import create_access_token, hash_password, decode_token, verify_password
+from .ratelimit import (
+    RateLimiter,
+    farm_origin_limiter,
+    limiter_stats,
+    login_email_limiter,
+    login_ip_limiter,
+    register_ip_limiter,
+)
+from .security import (
+    PASSWORD_ALGORITHM,
+    PASSWORD_ITERATIONS,
+    REVOCATION_SYNC_SECONDS,
+    create_access_token,
+    hash_password,
+    jwt_config,
+    password_needs_rehash,
+    revoke_token,
+    revoke_user_tokens,
+    sync_revocations,
+    token_cache_stats,
+    verify_password,
+    verify_token,
+)
+from .weather import active_cells, current_hour, weather_cache
+from .workers import Overloaded, hash_queue_stats, run_cpu, run_hash, run_io, shutdown_executors
+
+# Passages from the local search index attached to each /chat answer; 0 turns retrieval off.
+CHAT_PASSAGES = int(os.environ.get("KRISHIRAKSHAK_CHAT_PASSAGES", "3"))
+CHAT_SNIPPET_CHARS = 400
+# Granularity of the distances the farm proximity endpoints report.
+FARM_DISTANCE_BUCKET_KM = float(os.environ.get("KRISHIRAKSHAK_FARM_DISTANCE_BUCKET_KM", "1"))
+# Interval of the background forecast prefetch over every farm's weather cell; 0 disables it.
+WEATHER_PREFETCH_SECONDS = float(os.environ.get("KRISHIRAKSHAK_WEATHER_PREFETCH_SECONDS", "900"))
+# serve.py turns these off in its forked workers: the parent has already migrated the schema, and only
+# worker 0 runs the score scheduler.
+MIGRATE_ON_STARTUP = True
+RUN_SCORER = True
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="KrishiRakshak AI API", version="0.1.0")
 
@@ -32,41 +87,177 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+if metrics.ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
+
+def warm_up() -> None:
+    # Opens the read-mostly data so the first requests don't pay for it. serve.py calls this once in the
+    # parent before forking, so its workers find everything already loaded.
+    jwt_config()
+    climate.get_grid()
+    chat_intents.get_matcher()
+    retrieval.get_index()
+    trained_model()
 
 
 @app.on_event("startup")
 def _startup() -> None:
-    init_db()
+    warm_up()
+    if MIGRATE_ON_STARTUP:
+        init_db()
+    else:
+        require_schema()
+    if RUN_SCORER:
+        scoring.scheduler.start()
+    metrics.start_flusher()
+
+
+async def _prefetch_weather() -> None:
+    while True:
+        try:
+            async with get_db_async() as db:
+                cells = await db.run(active_cells)
+            await run_io(weather_cache.prefetch, cells)
+            # Close to the top of the hour, warm the next issue hour as well so the rollover doesn't stampede.
+            if 3600 - time.time() % 3600 < WEATHER_PREFETCH_SECONDS:
+                await run_io(weather_cache.prefetch, cells, hour=current_hour() + 1)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Weather prefetch failed")
+        await asyncio.sleep(WEATHER_PREFETCH_SECONDS)
+
+
+async def _sync_revocations() -> None:
+    # Logouts and password changes handled by other serving processes (see security.py).
+    while True:
+        try:
+            async with get_db_async() as db:
+                await db.run(sync_revocations)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Token revocation sync failed")
+        await asyncio.sleep(REVOCATION_SYNC_SECONDS)
+
+
+_background: set[asyncio.Task] = set()
+
+
+@app.on_event("startup")
+async def _start_background() -> None:
+    if WEATHER_PREFETCH_SECONDS > 0:
+        _background.add(asyncio.create_task(_prefetch_weather()))
+    _background.add(asyncio.create_task(_sync_revocations()))
+
+
+@app.on_event("shutdown")
+async def _stop_background() -> None:
+    for task in _background:
+        task.cancel()
+    await asyncio.gather(*_background, return_exceptions=True)
+    _background.clear()
+
+
+@app.on_event("shutdown")
+def _shutdown() -> None:
+    scoring.scheduler.stop()
+    metrics.stop_flusher()
+    close_pool()
+    shutdown_executors()
+
+
+@app.exception_handler(PoolExhausted)
+@app.exception_handler(Overloaded)
+def _overloaded(request, exc: Exception) -> JSONResponse:
+    return JSONResponse(status_code=503, content={"detail": "Server busy, please retry."}, headers={"Retry-After": "1"})
 
 
 def _utc_now() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
-def get_current_user(authorization: Optional[str] = Header(default=None)) -> dict:
+def _bearer_token(authorization: Optional[str] = Header(default=None)) -> str:
     if not authorization or not authorization.lower().startswith("bearer "):
         raise HTTPException(status_code=401, detail="Missing bearer token")
-    token = authorization.split(" ", 1)[1].strip()
+    return authorization.split(" ", 1)[1].strip()
+
+
+async def get_current_user(token: str = Depends(_bearer_token)) -> dict:
     try:
-        payload = decode_token(token)
+        payload = verify_token(token)
     except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
     return {"id": int(payload["sub"]), "email": payload.get("email"), "name": payload.get("name")}
 
 
 @app.get("/health")
-def health() -> dict:
-    return {"ok": True, "service": "fastapi", "time": _utc_now()}
+async def health() -> dict:
+    async with get_db_async() as db:
+        score_queue = await db.run(scoring.queue_stats)
+    return {
+        "ok": True,
+        "service": "fastapi",
+        "time": _utc_now(),
+        "db_pool": pool_stats(),
+        "score_cache": score_cache.stats(),
+        "token_cache": token_cache_stats(),
+        "password_hashing": hash_queue_stats(),
+        "auth_throttle": limiter_stats(),
+        "weather": weather_cache.stats(),
+        "scoring": {**scoring.scheduler.stats(), "queue": score_queue},
+        "chat_intents": chat_intents.stats(),
+        "search_index": retrieval.stats(),
+        "model": model_stats(),
+    }
+
+
+@app.get("/metrics")
+async def prometheus_metrics() -> Response:
+    # Reads the other workers' snapshot files under serve.py, so off the event loop.
+    return Response(await run_io(metrics.render), media_type=metrics.CONTENT_TYPE)
+
+
+def _throttle(limiter: RateLimiter, key: str) -> None:
+    retry_after = limiter.hit(key)
+    if retry_after:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many attempts, please wait and try again.",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+
+def _client_ip(request: Request) -> str:
+    # Direct peer address; put the proxy's real-IP handling in front if deployed behind one.
+    return request.client.host if request.client else "unknown"
+
+
+async def _rehash_password(user_id: int, password: str) -> None:
+    try:
+        pw_hash, salt = await run_hash(hash_password, password)
+    except Overloaded:
+        return  # retried on a later login
+    async with get_db_async() as db:
+        await db.execute(
+            "UPDATE users SET password_hash=?, salt=?, password_algorithm=?, password_iterations=? WHERE id=?",
+            (pw_hash, salt, PASSWORD_ALGORITHM, PASSWORD_ITERATIONS, user_id),
+        )
 
 
 @app.post("/auth/register", response_model=AuthResponse)
-def register(body: RegisterRequest) -> AuthResponse:
-    pw_hash, salt = hash_password(body.password)
-    with get_db() as db:
+async def register(body: RegisterRequest, request: Request) -> AuthResponse:
+    _throttle(register_ip_limiter, _client_ip(request))
+    pw_hash, salt = await run_hash(hash_password, body.password)
+    async with get_db_async() as db:
         try:
-            cur = db.execute(
-                "INSERT INTO users(email, name, password_hash, salt, created_at) VALUES (?, ?, ?, ?, ?)",
-                (body.email.lower().strip(), body.name.strip(), pw_hash, salt, _utc_now()),
+            cur = await db.execute(
+                """
+                INSERT INTO users(email, name, password_hash, salt, password_algorithm, password_iterations, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (body.email.lower().strip(), body.name.strip(), pw_hash, salt, PASSWORD_ALGORITHM, PASSWORD_ITERATIONS, _utc_now()),
             )
         except Exception:
             raise HTTPException(status_code=400, detail="Email already registered (or invalid).")
@@ -76,182 +267,438 @@ def register(body: RegisterRequest) -> AuthResponse:
 
 
 @app.post("/auth/login", response_model=AuthResponse)
-def login(body: LoginRequest) -> AuthResponse:
-    with get_db() as db:
-        row = db.execute("SELECT id, email, name, password_hash, salt FROM users WHERE email = ?", (body.email.lower().strip(),)).fetchone()
-    if not row or not verify_password(body.password, row["password_hash"], row["salt"]):
+async def login(body: LoginRequest, request: Request, background: BackgroundTasks) -> AuthResponse:
+    email = body.email.lower().strip()
+    _throttle(login_ip_limiter, _client_ip(request))
+    _throttle(login_email_limiter, email)
+    async with get_db_async() as db:
+        row = await db.fetchone(
+            "SELECT id, email, name, password_hash, salt, password_algorithm, password_iterations FROM users WHERE email = ?",
+            (email,),
+        )
+    if not row or not await run_hash(
+        verify_password,
+        body.password,
+        row["password_hash"],
+        row["salt"],
+        iterations=row["password_iterations"],
+        algorithm=row["password_algorithm"],
+    ):
         raise HTTPException(status_code=401, detail="Invalid email or password")
+    if password_needs_rehash(row["password_algorithm"], row["password_iterations"]):
+        background.add_task(_rehash_password, int(row["id"]), body.password)
     token = create_access_token(user_id=int(row["id"]), email=row["email"], name=row["name"])
     return AuthResponse(access_token=token, user={"id": int(row["id"]), "email": row["email"], "name": row["name"]})
 
 
+@app.post("/auth/logout")
+async def logout(token: str = Depends(_bearer_token), user: dict = Depends(get_current_user)) -> dict:
+    async with get_db_async() as db:
+        await db.run(lambda conn: revoke_token(conn, token))
+    return {"ok": True}
+
+
+@app.post("/auth/password", response_model=AuthResponse)
+async def change_password(body: ChangePasswordRequest, user: dict = Depends(get_current_user)) -> AuthResponse:
+    # Signs out every session of the user, then returns a fresh token for this one.
+    _throttle(login_email_limiter, user["email"])
+    async with get_db_async() as db:
+        row = await db.fetchone(
+            "SELECT email, name, password_hash, salt, password_algorithm, password_iterations FROM users WHERE id = ?",
+            (user["id"],),
+        )
+    if not row or not await run_hash(
+        verify_password,
+        body.current_password,
+        row["password_hash"],
+        row["salt"],
+        iterations=row["password_iterations"],
+        algorithm=row["password_algorithm"],
+    ):
+        raise HTTPException(status_code=401, detail="Current password is incorrect")
+    pw_hash, salt = await run_hash(hash_password, body.new_password)
+    async with get_db_async() as db:
+        await db.execute(
+            "UPDATE users SET password_hash=?, salt=?, password_algorithm=?, password_iterations=? WHERE id=?",
+            (pw_hash, salt, PASSWORD_ALGORITHM, PASSWORD_ITERATIONS, user["id"]),
+        )
+        await db.run(lambda conn: revoke_user_tokens(conn, user["id"]))
+    token = create_access_token(user_id=user["id"], email=row["email"], name=row["name"])
+    return AuthResponse(access_token=token, user={"id": user["id"], "email": row["email"], "name": row["name"]})
+
+
 @app.get("/me")
-def me(user: dict = Depends(get_current_user)) -> dict:
+async def me(user: dict = Depends(get_current_user)) -> dict:
     return {"user": user}
 
 
+_LOCATION_FIELDS = ("latitude", "longitude", "location_name")
+_SOIL_FARM_FIELDS = ("soil_type", "ph", "nitrogen", "phosphorus", "potassium", "farm_size_acres", "irrigation_type", "season")
+
+
+@lru_cache(maxsize=None)
+def _upsert_profile_sql(fields: tuple[str, ...]) -> str:
+    # One atomic statement per write; relies on the unique index on farm_profiles(user_id).
+    cols = ("user_id", *fields, "last_updated")
+    updates = ", ".join(f"{c}=excluded.{c}" for c in (*fields, "last_updated"))
+    return (
+        f"INSERT INTO farm_profiles({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))}) "
+        f"ON CONFLICT(user_id) DO UPDATE SET {updates}"
+    )
+
+
+async def _upsert_profile(user_id: int, values: dict) -> None:
+    fields = tuple(values)
+    async with get_db_async() as db:
+        await db.execute(_upsert_profile_sql(fields), (user_id, *values.values(), _utc_now()))
+        await db.run(lambda conn: scoring.enqueue(conn, user_id, "profile"))
+    score_cache.invalidate_user(user_id)
+    scoring.scheduler.notify()
+
+
 @app.post("/profile/location")
-def save_location(body: LocationInput, user: dict = Depends(get_current_user)) -> dict:
-    with get_db() as db:
-        existing = db.execute("SELECT id FROM farm_profiles WHERE user_id = ?", (user["id"],)).fetchone()
-        if existing:
-            db.execute(
-                "UPDATE farm_profiles SET latitude=?, longitude=?, location_name=?, last_updated=? WHERE user_id=?",
-                (body.latitude, body.longitude, body.location_name, _utc_now(), user["id"]),
-            )
-        else:
-            db.execute(
-                """
-                INSERT INTO farm_profiles(user_id, latitude, longitude, location_name, last_updated)
-                VALUES (?, ?, ?, ?, ?)
-                """,
-                (user["id"], body.latitude, body.longitude, body.location_name, _utc_now()),
-            )
+async def save_location(body: LocationInput, user: dict = Depends(get_current_user)) -> dict:
+    await _upsert_profile(user["id"], body.model_dump(include=set(_LOCATION_FIELDS)))
     return {"ok": True}
 
 
 @app.post("/profile/soil-farm")
-def save_soil_farm(body: SoilFarmDetails, user: dict = Depends(get_current_user)) -> dict:
-    with get_db() as db:
-        existing = db.execute("SELECT id FROM farm_profiles WHERE user_id = ?", (user["id"],)).fetchone()
-        if existing:
-            db.execute(
-                """
-                UPDATE farm_profiles
-                SET soil_type=?, ph=?, nitrogen=?, phosphorus=?, potassium=?,
-                    farm_size_acres=?, irrigation_type=?, season=?, last_updated=?
-                WHERE user_id=?
-                """,
-                (
-                    body.soil_type,
-                    body.ph,
-                    body.nitrogen,
-                    body.phosphorus,
-                    body.potassium,
-                    body.farm_size_acres,
-                    body.irrigation_type,
-                    body.season,
-                    _utc_now(),
-                    user["id"],
-                ),
-            )
-        else:
-            db.execute(
-                """
-                INSERT INTO farm_profiles(
-                  user_id, soil_type, ph, nitrogen, phosphorus, potassium,
-                  farm_size_acres, irrigation_type, season, last_updated
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    user["id"],
-                    body.soil_type,
-                    body.ph,
-                    body.nitrogen,
-                    body.phosphorus,
-                    body.potassium,
-                    body.farm_size_acres,
-                    body.irrigation_type,
-                    body.season,
-                    _utc_now(),
-                ),
-            )
+async def save_soil_farm(body: SoilFarmDetails, user: dict = Depends(get_current_user)) -> dict:
+    await _upsert_profile(user["id"], body.model_dump(include=set(_SOIL_FARM_FIELDS)))
     return {"ok": True}
 
 
+@app.post("/profile/bulk")
+async def save_profile_bulk(body: BulkProfileRequest, user: dict = Depends(get_current_user)) -> dict:
+    # Offline clients replay their queued edits here; apply them in order and write the net result once.
+    values: dict = {}
+    for item in body.items:
+        if item.location is not None:
+            values.update(item.location.model_dump(include=set(_LOCATION_FIELDS)))
+        if item.soil_farm is not None:
+            values.update(item.soil_farm.model_dump(include=set(_SOIL_FARM_FIELDS)))
+    if not values:
+        raise HTTPException(status_code=400, detail="Provide location and/or soil/farm details.")
+    await _upsert_profile(user["id"], values)
+    return {"ok": True, "applied": len(body.items)}
+
+
 @app.get("/profile")
-def get_profile(user: dict = Depends(get_current_user)) -> dict:
-    with get_db() as db:
-        row = db.execute("SELECT * FROM farm_profiles WHERE user_id = ?", (user["id"],)).fetchone()
+async def get_profile(user: dict = Depends(get_current_user)) -> dict:
+    async with get_db_async() as db:
+        row = await db.fetchone("SELECT * FROM farm_profiles WHERE user_id = ?", (user["id"],))
     return {"profile": dict(row) if row else None}
 
 
-@app.get("/ai/recommendation", response_model=RecommendationResponse)
-def ai_recommendation(user: dict = Depends(get_current_user)) -> RecommendationResponse:
-    with get_db() as db:
-        row = db.execute("SELECT * FROM farm_profiles WHERE user_id = ?", (user["id"],)).fetchone()
-    if not row:
-        raise HTTPException(status_code=400, detail="Please submit your location and soil/farm details first.")
-
-    ctx = FarmContext(
-        soil_type=row["soil_type"],
-        ph=row["ph"],
-        n=row["nitrogen"],
-        p=row["phosphorus"],
-        k=row["potassium"],
-        season=row["season"],
-        irrigation_type=row["irrigation_type"],
+async def _profile_and_scores(user_id: int) -> tuple:
+    # The farm profile plus its precomputed scores when they are current (see scoring.py), else None.
+    async with get_db_async() as db:
+        row = await db.fetchone("SELECT * FROM farm_profiles WHERE user_id = ?", (user_id,))
+        if not row:
+            raise HTTPException(status_code=400, detail="Please submit your location and soil/farm details first.")
+        stored = await db.run(lambda conn: scoring.fresh_scores(conn, user_id, row["last_updated"]))
+    return row, stored
+
+
+async def _inline_risk(user_id: int, row, forecast: Optional[ForecastFeatures]) -> RiskPredictionResponse:
+    score, level, top, mitigation = await run_cpu(
+        score_cache.risk,
+        FarmContext.from_row(row),
+        latitude=row["latitude"],
+        longitude=row["longitude"],
+        forecast=forecast,
+        user_id=user_id,
     )
-    crops, rationale = recommend_crops(ctx)
-    return RecommendationResponse(recommended_crops=crops, rationale=rationale)
+    return RiskPredictionResponse(risk_score=score, risk_level=level, top_risks=top, mitigation=mitigation, scored_at=_utc_now())
+
+
+@app.get("/ai/recommendation", response_model=RecommendationResponse)
+async def ai_recommendation(user: dict = Depends(get_current_user)) -> RecommendationResponse:
+    row, stored = await _profile_and_scores(user["id"])
+    if stored:
+        return RecommendationResponse(**stored["recommendation"], scored_at=stored["computed_at"])
+    crops, rationale = await run_cpu(score_cache.recommend, FarmContext.from_row(row), user_id=user["id"])
+    return RecommendationResponse(recommended_crops=crops, rationale=rationale, scored_at=_utc_now())
 
 
 @app.get("/ai/risk", response_model=RiskPredictionResponse)
-def ai_risk(user: dict = Depends(get_current_user)) -> RiskPredictionResponse:
-    with get_db() as db:
-        row = db.execute("SELECT * FROM farm_profiles WHERE user_id = ?", (user["id"],)).fetchone()
-    if not row:
-        raise HTTPException(status_code=400, detail="Please submit your location and soil/farm details first.")
-
-    ctx = FarmContext(
-        soil_type=row["soil_type"],
-        ph=row["ph"],
-        n=row["nitrogen"],
-        p=row["phosphorus"],
-        k=row["potassium"],
-        season=row["season"],
-        irrigation_type=row["irrigation_type"],
-    )
-    score, level, top, mitigation = predict_risk(ctx, latitude=row["latitude"], longitude=row["longitude"])
-    return RiskPredictionResponse(risk_score=score, risk_level=level, top_risks=top, mitigation=mitigation)
+async def ai_risk(user: dict = Depends(get_current_user)) -> RiskPredictionResponse:
+    row, stored = await _profile_and_scores(user["id"])
+    forecast = await run_io(weather_cache.features, row["latitude"], row["longitude"])
+    if stored and scoring.risk_is_current(stored, forecast):
+        return RiskPredictionResponse(**stored["risk"], scored_at=stored["computed_at"])
+    return await _inline_risk(user["id"], row, forecast)
+
+
+async def _batch_contexts(
+    body: BatchScoreRequest, user: dict
+) -> tuple[list[dict], list[FarmContext], list[Optional[float]], list[Optional[float]], list[dict]]:
+    total = len(body.farm_ids) + len(body.farms)
+    if total == 0:
+        raise HTTPException(status_code=400, detail="Provide farm_ids and/or farms.")
+    if total > BATCH_MAX_FARMS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_FARMS} farms per request.")
+
+    keys: list[dict] = []
+    ctxs: list[FarmContext] = []
+    lats: list[Optional[float]] = []
+    lons: list[Optional[float]] = []
+    missing: list[dict] = []
+    if body.farm_ids:
+        ids = list(dict.fromkeys(body.farm_ids))
+        # Scoped to the caller: there is no cooperative/field-officer ownership model to authorize other farms yet.
+        async with get_db_async() as db:
+            rows = await db.fetchall(
+                f"SELECT * FROM farm_profiles WHERE user_id = ? AND id IN ({', '.join('?' * len(ids))})",
+                (user["id"], *ids),
+            )
+        found = {row["id"]: row for row in rows}
+        for farm_id in ids:
+            row = found.get(farm_id)
+            if row is None:
+                missing.append({"farm_id": farm_id, "error": "Farm not found."})
+                continue
+            keys.append({"farm_id": farm_id})
+            ctxs.append(FarmContext.from_row(row))
+            lats.append(row["latitude"])
+            lons.append(row["longitude"])
+    for i, farm in enumerate(body.farms):
+        keys.append({"index": i, "ref": farm.ref})
+        ctxs.append(FarmContext.from_row(farm.model_dump()))
+        lats.append(farm.latitude)
+        lons.append(farm.longitude)
+    return keys, ctxs, lats, lons, missing
+
+
+def _ndjson(keys: list[dict], row, missing: list[dict], count: int) -> StreamingResponse:
+    async def lines():
+        chunk: list[str] = [json.dumps(m) + "\n" for m in missing]
+        for i in range(count):
+            chunk.append(json.dumps({**keys[i], **row(i)}) + "\n")
+            if len(chunk) >= 64:
+                yield "".join(chunk)
+                chunk = []
+        if chunk:
+            yield "".join(chunk)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.post("/ai/recommendation/batch")
+async def ai_recommendation_batch(body: BatchScoreRequest, user: dict = Depends(get_current_user)) -> StreamingResponse:
+    keys, ctxs, lats, lons, missing = await _batch_contexts(body, user)
+    result = await run_cpu(lambda: recommend_crops_batch(FarmBatch.from_contexts(ctxs, lats, lons)))
+
+    def row(i: int) -> dict:
+        crops, rationale = result.row(i)
+        return {"recommended_crops": crops, "rationale": rationale}
+
+    return _ndjson(keys, row, missing, len(ctxs))
+
+
+@app.post("/ai/risk/batch")
+async def ai_risk_batch(body: BatchScoreRequest, user: dict = Depends(get_current_user)) -> StreamingResponse:
+    keys, ctxs, lats, lons, missing = await _batch_contexts(body, user)
+    forecasts = await run_io(weather_cache.features_many, lats, lons)
+    result = await run_cpu(lambda: predict_risk_batch(FarmBatch.from_contexts(ctxs, lats, lons, forecasts)))
+
+    def row(i: int) -> dict:
+        score, level, top, mitigation = result.row(i)
+        return {"risk_score": score, "risk_level": level, "top_risks": top, "mitigation": mitigation}
+
+    return _ndjson(keys, row, missing, len(ctxs))
+
+
+def _summary_etag(user_id: int, last_updated: str, market_version: Optional[str], scores_version: object) -> str:
+    # scores_version: the stored scores' computed_at (if any) and the current forecast features.
+    digest = hashlib.sha256(f"{app.version}:{user_id}:{last_updated}:{market_version}:{scores_version}".encode()).hexdigest()[:32]
+    return f'W/"{digest}"'
+
+
+@app.get("/ai/summary", response_model=SummaryResponse)
+async def ai_summary(
+    response: Response,
+    user: dict = Depends(get_current_user),
+    if_none_match: Optional[str] = Header(default=None),
+):
+    row, stored = await _profile_and_scores(user["id"])
+    async with get_db_async() as db:
+        market_version = (await db.fetchone("SELECT MAX(price_date) FROM market_prices"))[0]
+
+    forecast = await run_io(weather_cache.features, row["latitude"], row["longitude"])
+    scores_version = (stored["computed_at"] if stored else None, forecast)
+    etag = _summary_etag(user["id"], row["last_updated"], market_version, scores_version)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if if_none_match and etag in (t.strip() for t in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+
+    if stored:
+        recommendation = RecommendationResponse(**stored["recommendation"], scored_at=stored["computed_at"])
+    else:
+        crops, rationale = await run_cpu(score_cache.recommend, FarmContext.from_row(row), user_id=user["id"])
+        recommendation = RecommendationResponse(recommended_crops=crops, rationale=rationale, scored_at=_utc_now())
+    if stored and scoring.risk_is_current(stored, forecast):
+        risk = RiskPredictionResponse(**stored["risk"], scored_at=stored["computed_at"])
+    else:
+        risk = await _inline_risk(user["id"], row, forecast)
+    market_items, _, _ = await _latest_market_prices(limit=20)
+    response.headers.update(headers)
+    return SummaryResponse(profile=dict(row), recommendation=recommendation, risk=risk, market_prices=market_items)
+
+
+async def _latest_market_prices(**filters) -> tuple[list[dict], Optional[str], str]:
+    # Falls back to the bundled sample rows until a price dump has been loaded (python -m <pkg>.market dump.csv).
+    try:
+        async with get_db_async() as db:
+            if not await db.run(market.has_prices):
+                return data_sources.get_mock_market_prices(), None, "sample"
+            items, next_cursor = await db.run(lambda conn: market.latest_prices(conn, **filters))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return items, next_cursor, "store"
 
 
 @app.get("/insights/market-prices")
-def market_prices(user: dict = Depends(get_current_user)) -> dict:
-    return {"items": data_sources.get_mock_market_prices()}
+async def market_prices(
+    commodity: Optional[str] = None,
+    market_name: Optional[str] = Query(default=None, alias="market"),
+    state: Optional[str] = None,
+    limit: int = Query(default=50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    user: dict = Depends(get_current_user),
+) -> dict:
+    items, next_cursor, source = await _latest_market_prices(
+        commodity=commodity, market=market_name, state=state, limit=limit, cursor=cursor
+    )
+    return {"items": items, "next_cursor": next_cursor, "source": source}
+
+
+@app.get("/insights/market-prices/history")
+async def market_price_history(
+    commodity: Optional[str] = None,
+    market_name: Optional[str] = Query(default=None, alias="market"),
+    state: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    limit: int = Query(default=100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    user: dict = Depends(get_current_user),
+) -> dict:
+    filters = dict(commodity=commodity, market=market_name, state=state, date_from=date_from, date_to=date_to, limit=limit, cursor=cursor)
+    try:
+        async with get_db_async() as db:
+            items, next_cursor = await db.run(lambda conn: market.price_history(conn, **filters))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return {"items": items, "next_cursor": next_cursor}
+
+
+async def _origin(db, user_id: int, latitude: Optional[float], longitude: Optional[float]) -> tuple[float, float]:
+    # Explicit coordinates win; otherwise the caller's saved farm location.
+    if latitude is not None and longitude is not None:
+        return latitude, longitude
+    row = await db.fetchone("SELECT latitude, longitude FROM farm_profiles WHERE user_id = ?", (user_id,))
+    if not row or row["latitude"] is None or row["longitude"] is None:
+        raise HTTPException(status_code=400, detail="Pass latitude/longitude or save your farm location first.")
+    return row["latitude"], row["longitude"]
+
+
+@app.get("/geo/mandis/nearest")
+async def nearest_mandis(
+    latitude: Optional[float] = Query(default=None, ge=-90, le=90),
+    longitude: Optional[float] = Query(default=None, ge=-180, le=180),
+    k: int = Query(default=5, ge=1, le=50),
+    user: dict = Depends(get_current_user),
+) -> dict:
+    async with get_db_async() as db:
+        lat, lon = await _origin(db, user["id"], latitude, longitude)
+        items = await db.run(lambda conn: geo.nearest_mandis(conn, lat, lon, k))
+    return {"latitude": lat, "longitude": lon, "items": items}
+
+
+@app.get("/geo/zone")
+async def agro_climatic_zone(
+    latitude: Optional[float] = Query(default=None, ge=-90, le=90),
+    longitude: Optional[float] = Query(default=None, ge=-180, le=180),
+    user: dict = Depends(get_current_user),
+) -> dict:
+    async with get_db_async() as db:
+        lat, lon = await _origin(db, user["id"], latitude, longitude)
+    cell = climate.lookup(lat, lon)
+    if cell is None:
+        raise HTTPException(status_code=404, detail="No agro-climatic data for this location.")
+    return {"latitude": lat, "longitude": lon, **dataclasses.asdict(cell)}
+
+
+# Last origin each user queried farm proximity from; a different one costs a farm_origin_limiter token.
+_farm_origins = TTLCache(100_000, ttl_seconds=86400)
+
+
+async def _own_farm(db, user_id: int) -> tuple[int, float, float]:
+    row = await db.fetchone("SELECT id, latitude, longitude FROM farm_profiles WHERE user_id = ?", (user_id,))
+    if not row or row["latitude"] is None or row["longitude"] is None:
+        raise HTTPException(status_code=400, detail="Save your farm location first.")
+    origin = (row["latitude"], row["longitude"])
+    if _farm_origins.get(user_id) != origin:
+        _throttle(farm_origin_limiter, user_id)
+        _farm_origins.set(user_id, origin)
+    return row["id"], row["latitude"], row["longitude"]
+
+
+def _farm_distance(distance_km: float) -> float:
+    # Rounded up to a whole bucket so other farms cannot be located from the distances.
+    return round(max(1, math.ceil(distance_km / FARM_DISTANCE_BUCKET_KM)) * FARM_DISTANCE_BUCKET_KM, 3)
+
+
+@app.get("/geo/farms/nearby")
+async def nearby_farms(
+    radius_km: float = Query(default=10.0, gt=0, le=500),
+    limit: int = Query(default=1000, ge=1, le=100_000),
+    user: dict = Depends(get_current_user),
+) -> dict:
+    # E.g. how many farms a pest sighting on the caller's farm affects. Always measured from the caller's own
+    # farm and without farm ids: a free origin and exact distances would let anyone trilaterate other farms.
+    # The radius snaps up to the distance buckets, so count reveals no more than the bucketed distances do.
+    radius_km = _farm_distance(radius_km)
+    async with get_db_async() as db:
+        farm_id, lat, lon = await _own_farm(db, user["id"])
+        hits = await db.run(lambda conn: geo.within_radius(conn, geo.FARMS, lat, lon, radius_km))
+    buckets = [_farm_distance(d) for i, d in hits if i != farm_id]
+    buckets = [b for b in buckets if b <= radius_km]
+    return {"radius_km": radius_km, "count": len(buckets), "items": [{"distance_km": b} for b in buckets[:limit]]}
+
+
+@app.get("/geo/farms/nearest")
+async def nearest_farms(
+    k: int = Query(default=10, ge=1, le=1000),
+    user: dict = Depends(get_current_user),
+) -> dict:
+    async with get_db_async() as db:
+        farm_id, lat, lon = await _own_farm(db, user["id"])
+        hits = await db.run(lambda conn: geo.nearest(conn, geo.FARMS, lat, lon, k + 1))
+    hits = [d for i, d in hits if i != farm_id][:k]
+    return {"items": [{"distance_km": _farm_distance(d)} for d in hits]}
 
 
 @app.get("/insights/schemes")
-def schemes(user: dict = Depends(get_current_user)) -> dict:
+async def schemes(user: dict = Depends(get_current_user)) -> dict:
     return {"items": data_sources.get_mock_schemes()}
 
 
-def _chat_reply(message: str) -> tuple[str, list[str]]:
-    m = message.lower().strip()
-    intents: list[str] = []
-    if any(k in m for k in ["price", "market", "mandi"]):
-        intents.append("market_price")
-        return (
-            "For market prices, check the Market Price Insights tab. Tell me your commodity and nearest market for more targeted guidance.",
-            intents,
-        )
-    if any(k in m for k in ["scheme", "subsidy", "pm-kisan", "pmfby", "insurance"]):
-        intents.append("gov_scheme")
-        return (
-            "You can explore Government Schemes in the Schemes section. If you share your state and landholding category, I can help shortlist eligibility.",
-            intents,
-        )
-    if any(k in m for k in ["soil", "ph", "npk", "fertilizer"]):
-        intents.append("soil_advice")
-        return (
-            "Soil health is key. If you share pH and NPK values, I can suggest a nutrient-balancing plan and suitable crops.",
-            intents,
-        )
-    if any(k in m for k in ["risk", "disease", "pest", "weather"]):
-        intents.append("risk")
-        return (
-            "For risk prediction, complete your soil/farm profile then open Crop Risk Prediction. Meanwhile, scout weekly and follow IPM practices.",
-            intents,
-        )
-    intents.append("general")
-    return (
-        "Hi! I’m the KrishiRakshak AI assistant. I can help with crop selection, soil inputs, market prices, schemes, and risk mitigation. What are you growing and where?",
-        intents,
-    )
+def _passage(hit: retrieval.Hit) -> dict:
+    doc = hit.document
+    text = doc.text
+    if len(text) > CHAT_SNIPPET_CHARS:
+        text = text[:CHAT_SNIPPET_CHARS].rsplit(" ", 1)[0] + "…"
+    return {"title": doc.title, "text": text, "source": doc.source, "url": doc.url, "score": round(hit.score, 3)}
 
 
 @app.post("/chat", response_model=ChatResponse)
-def chat(body: ChatRequest, user: dict = Depends(get_current_user)) -> ChatResponse:
-    reply, intents = _chat_reply(body.message)
-    return ChatResponse(reply=reply, intents=intents)
+async def chat(body: ChatRequest, user: dict = Depends(get_current_user)) -> ChatResponse:
+    reply, intents = chat_intents.reply(body.message)
+    hits = await run_cpu(retrieval.search, body.message, CHAT_PASSAGES) if CHAT_PASSAGES > 0 else []
+    passages = [_passage(hit) for hit in hits]
+    if passages:
+        reply = f"{reply}\n\n{passages[0]['title']}: {passages[0]['text']}"
+    return ChatResponse(reply=reply, intents=intents, passages=passages)
 
@@ -0,0 +1,379 @@
+from __future__ import annotations
+
+import base64
+import csv
+import json
+import sqlite3
+import sys
+from datetime import date, datetime
+from pathlib import Path
+from typing import IO, Any, Iterable, Iterator, Optional, Union
+
+import numpy as np
+
+# Relative modal-price change vs the previous observation that counts as a move.
+TREND_THRESHOLD = 0.01
+
+STAT_WINDOWS = (7, 30, 90)
+STAT_COLUMNS = (
+    *(f"mean_{d}d" for d in STAT_WINDOWS),
+    "volatility_30d",
+    *(f"change_{d}d_pct" for d in STAT_WINDOWS),
+)
+# How stale a carried-forward price may be and still serve as the reference for a percent change.
+STALE_DAYS = 14
+# Day grid per series: the longest window plus the reference day and its staleness allowance.
+_GRID_DAYS = max(STAT_WINDOWS) + STALE_DAYS + 1
+_REFRESH_CHUNK = 1024
+
+# Agmarknet / data.gov.in export headers, normalized (lowercase, "_x0020_" and spaces -> "_").
+_HEADER_ALIASES = {
+    "state": "state",
+    "district": "district",
+    "market": "market",
+    "commodity": "commodity",
+    "variety": "variety",
+    "arrival_date": "price_date",
+    "price_date": "price_date",
+    "date": "price_date",
+    "min_price": "min_price",
+    "max_price": "max_price",
+    "modal_price": "modal_price",
+    "arrivals_tonnes": "arrivals_tonnes",
+    "arrivals": "arrivals_tonnes",
+}
+_DATE_FORMATS = ("%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y", "%d-%b-%Y")
+
+_UPSERT_SQL = """
+INSERT INTO market_prices(commodity, variety, state, district, market, price_date, min_price, max_price, modal_price, arrivals_tonnes)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(commodity, market, state, variety, price_date) DO UPDATE SET
+  district=excluded.district, min_price=excluded.min_price, max_price=excluded.max_price,
+  modal_price=excluded.modal_price, arrivals_tonnes=excluded.arrivals_tonnes
+"""
+
+
+def _series(row: tuple) -> tuple[str, str, str, str]:
+    # (commodity, market, state, variety) of a row in _UPSERT_SQL order: one price series.
+    return row[0], row[4], row[2], row[1]
+
+
+def _norm_header(name: str) -> str:
+    return name.strip().lower().replace("_x0020_", "_").replace(" ", "_")
+
+
+def _parse_date(value: str) -> str:
+    value = value.strip()
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date().isoformat()
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognized date: {value!r}")
+
+
+def _num(value: Optional[str]) -> Optional[float]:
+    if value is None:
+        return None
+    value = value.strip().replace(",", "")
+    if not value or value.upper() in {"NA", "NR", "-"}:
+        return None
+    return float(value)
+
+
+def parse_csv(fh: IO[str]) -> Iterator[tuple]:
+    # Yields rows in _UPSERT_SQL order; rows without a market, commodity, date or modal price are skipped.
+    reader = csv.reader(fh)
+    header = next(reader, None)
+    if header is None:
+        return
+    cols = {_HEADER_ALIASES[h]: i for i, h in enumerate(map(_norm_header, header)) if h in _HEADER_ALIASES}
+    missing = {"market", "commodity", "price_date", "modal_price", "state"} - cols.keys()
+    if missing:
+        raise ValueError(f"CSV is missing columns: {', '.join(sorted(missing))}")
+
+    def get(row: list[str], key: str) -> Optional[str]:
+        i = cols.get(key)
+        return row[i] if i is not None and i < len(row) else None
+
+    for row in reader:
+        try:
+            modal = _num(get(row, "modal_price"))
+            price_date = _parse_date(get(row, "price_date") or "")
+        except ValueError:
+            continue
+        market, commodity = (get(row, "market") or "").strip(), (get(row, "commodity") or "").strip()
+        if modal is None or not market or not commodity:
+            continue
+        yield (
+            commodity,
+            (get(row, "variety") or "").strip(),
+            (get(row, "state") or "").strip(),
+            (get(row, "district") or "").strip() or None,
+            market,
+            price_date,
+            _num(get(row, "min_price")),
+            _num(get(row, "max_price")),
+            modal,
+            _num(get(row, "arrivals_tonnes")),
+        )
+
+
+def ingest_rows(db: sqlite3.Connection, rows: Iterable[tuple], *, batch_size: int = 50_000) -> int:
+    # One transaction for the whole load; market_latest is refreshed for the touched series at the end.
+    count = 0
+    touched: set[tuple[str, str, str, str]] = set()
+    batch: list[tuple] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            db.executemany(_UPSERT_SQL, batch)
+            touched.update(map(_series, batch))
+            count += len(batch)
+            batch = []
+    if batch:
+        db.executemany(_UPSERT_SQL, batch)
+        touched.update(map(_series, batch))
+        count += len(batch)
+    refresh_latest(db, touched)
+    return count
+
+
+def ingest_csv(db: sqlite3.Connection, source: Union[str, Path, IO[str]]) -> int:
+    if isinstance(source, (str, Path)):
+        with open(source, newline="", encoding="utf-8-sig") as fh:
+            return ingest_rows(db, parse_csv(fh))
+    return ingest_rows(db, parse_csv(source))
+
+
+def rolling_stats(grid: np.ndarray) -> dict[str, np.ndarray]:
+    # grid: one row per series, one column per calendar day ending on the series' latest date, NaN where no
+    # price was reported. Means and volatility use reported days only; percent changes compare the latest
+    # price with the one in force N days earlier (carried forward over market holidays, up to STALE_DAYS).
+    rows, width = grid.shape
+    reported = ~np.isnan(grid)
+    days = np.arange(width)
+    last_seen = np.maximum.accumulate(np.where(reported, days, -1), axis=1)
+    filled = grid[np.arange(rows)[:, None], np.maximum(last_seen, 0)]
+    filled[(last_seen < 0) | (days - last_seen > STALE_DAYS)] = np.nan
+
+    out: dict[str, np.ndarray] = {}
+    latest = filled[:, -1]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for window in STAT_WINDOWS:
+            counts = reported[:, -window:].sum(axis=1)
+            out[f"mean_{window}d"] = np.where(reported[:, -window:], grid[:, -window:], 0.0).sum(axis=1) / counts
+            out[f"change_{window}d_pct"] = (latest / filled[:, -window - 1] - 1.0) * 100.0
+
+        # Standard deviation of daily log returns over the last 30 days, on days with a fresh quote.
+        returns = np.diff(np.log(filled[:, -31:]), axis=1)
+        valid = reported[:, -30:] & ~np.isnan(returns)
+        n = valid.sum(axis=1)
+        r = np.where(valid, returns, 0.0)
+        mean = r.sum(axis=1) / n
+        var = (np.where(valid, r - mean[:, None], 0.0) ** 2).sum(axis=1) / (n - 1)
+        out["volatility_30d"] = np.where(n > 1, np.sqrt(var) * 100.0, np.nan)
+    return out
+
+
+def refresh_latest(db: sqlite3.Connection, series: Optional[Iterable[tuple[str, str, str, str]]] = None) -> None:
+    # Rebuilds market_latest (latest price, previous price, rolling stats) for the given (commodity, market,
+    # state, variety) series, or all of them. Each series reads only its last _GRID_DAYS rows, so a daily
+    # ingest costs the same however long the history grows.
+    if series is None:
+        series = db.execute("SELECT DISTINCT commodity, market, state, variety FROM market_prices").fetchall()
+    series = [tuple(s) for s in series]
+    for start in range(0, len(series), _REFRESH_CHUNK):
+        _refresh_chunk(db, series[start : start + _REFRESH_CHUNK])
+
+
+def _refresh_chunk(db: sqlite3.Connection, series: list[tuple[str, str, str, str]]) -> None:
+    grid = np.full((len(series), _GRID_DAYS), np.nan)
+    heads: list[Optional[tuple]] = []
+    for i, key in enumerate(series):
+        rows = db.execute(
+            """
+            SELECT price_date, modal_price FROM market_prices
+            WHERE commodity = ? AND market = ? AND state = ? AND variety = ? ORDER BY price_date DESC LIMIT ?
+            """,
+            (*key, _GRID_DAYS),
+        ).fetchall()
+        if not rows:
+            db.execute("DELETE FROM market_latest WHERE commodity = ? AND market = ? AND state = ? AND variety = ?", key)
+            heads.append(None)
+            continue
+        end = date.fromisoformat(rows[0][0]).toordinal()
+        for price_date, modal in rows:
+            col = _GRID_DAYS - 1 - (end - date.fromisoformat(price_date).toordinal())
+            if col < 0:
+                break
+            grid[i, col] = modal
+        prev = rows[1][1] if len(rows) > 1 else None
+        heads.append((*key, rows[0][0], rows[0][1], prev))
+
+    stats = rolling_stats(grid)
+    columns = [np.round(stats[c], 2) for c in STAT_COLUMNS]
+    values = [
+        (*head, *(None if np.isnan(col[i]) else float(col[i]) for col in columns))
+        for i, head in enumerate(heads)
+        if head is not None
+    ]
+    names = ", ".join(STAT_COLUMNS)
+    db.executemany(
+        f"""
+        INSERT INTO market_latest(commodity, market, state, variety, price_date, modal_price, prev_modal_price, {names})
+        VALUES (?, ?, ?, ?, ?, ?, ?{", ?" * len(STAT_COLUMNS)})
+        ON CONFLICT(commodity, market, state, variety) DO UPDATE SET
+          price_date=excluded.price_date,
+          modal_price=excluded.modal_price, prev_modal_price=excluded.prev_modal_price,
+          {", ".join(f"{c}=excluded.{c}" for c in STAT_COLUMNS)}
+        """,
+        values,
+    )
+
+
+def trend(price: Optional[float], prev: Optional[float]) -> tuple[str, Optional[float]]:
+    if price is None or not prev:
+        return "flat", None
+    change = (price - prev) / prev
+    if change > TREND_THRESHOLD:
+        return "up", round(change * 100, 2)
+    if change < -TREND_THRESHOLD:
+        return "down", round(change * 100, 2)
+    return "flat", round(change * 100, 2)
+
+
+def encode_cursor(*values: Any) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, *types: type) -> list:
+    # Cursors come straight from the client, so anything but a list of the expected scalar types is rejected.
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(types):
+        raise ValueError("Invalid cursor")
+    for value, expected in zip(values, types):
+        if isinstance(value, bool) or not isinstance(value, expected):
+            raise ValueError("Invalid cursor")
+    return values
+
+
+def _filters(
+    commodity: Optional[str], market: Optional[str], state: Optional[str], *, prefix: str = ""
+) -> tuple[list[str], list[Any]]:
+    where: list[str] = []
+    params: list[Any] = []
+    for col, value in (("commodity", commodity), ("market", market), ("state", state)):
+        if value:
+            where.append(f"{prefix}{col} = ?")
+            params.append(value.strip())
+    return where, params
+
+
+def latest_prices(
+    db: sqlite3.Connection,
+    *,
+    commodity: Optional[str] = None,
+    market: Optional[str] = None,
+    state: Optional[str] = None,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+) -> tuple[list[dict], Optional[str]]:
+    # Latest price per series, keyset-paginated in (commodity, market, state, variety) order.
+    where, params = _filters(commodity, market, state)
+    if cursor:
+        where.append("(commodity, market, state, variety) > (?, ?, ?, ?)")
+        params += decode_cursor(cursor, str, str, str, str)
+    sql = f"SELECT commodity, market, state, variety, price_date, modal_price, prev_modal_price, {', '.join(STAT_COLUMNS)} FROM market_latest"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY commodity, market, state, variety LIMIT ?"
+    rows = db.execute(sql, (*params, limit + 1)).fetchall()
+    items = []
+    for r in rows[:limit]:
+        direction, change = trend(r["modal_price"], r["prev_modal_price"])
+        items.append(
+            {
+                "commodity": r["commodity"],
+                "variety": r["variety"],
+                "market": r["market"],
+                "state": r["state"],
+                "price_inr_per_quintal": r["modal_price"],
+                "trend": direction,
+                "change_pct": change,
+                "updated_at": r["price_date"],
+                "stats": {c: r[c] for c in STAT_COLUMNS},
+            }
+        )
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor(last["commodity"], last["market"], last["state"], last["variety"])
+    return items, next_cursor
+
+
+def price_history(
+    db: sqlite3.Connection,
+    *,
+    commodity: Optional[str] = None,
+    market: Optional[str] = None,
+    state: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+) -> tuple[list[dict], Optional[str]]:
+    # Daily rows newest first, keyset-paginated on (price_date, id). The trend of each row compares it with
+    # the previous observation of the same series, which may fall outside the requested range.
+    where, params = _filters(commodity, market, state, prefix="m.")
+    if date_from:
+        where.append("m.price_date >= ?")
+        params.append(date_from.isoformat())
+    if date_to:
+        where.append("m.price_date <= ?")
+        params.append(date_to.isoformat())
+    if cursor:
+        last_date, last_id = decode_cursor(cursor, str, int)
+        where.append("(m.price_date, m.id) < (?, ?)")
+        params += [last_date, last_id]
+    sql = """
+        SELECT m.id, m.commodity, m.variety, m.state, m.district, m.market, m.price_date,
+               m.min_price, m.max_price, m.modal_price,
+               (SELECT p.modal_price FROM market_prices p
+                 WHERE p.commodity = m.commodity AND p.market = m.market AND p.state = m.state
+                   AND p.variety = m.variety AND p.price_date < m.price_date
+                 ORDER BY p.price_date DESC LIMIT 1) AS prev_modal_price
+        FROM market_prices m
+    """
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY m.price_date DESC, m.id DESC LIMIT ?"
+    rows = db.execute(sql, (*params, limit + 1)).fetchall()
+    items = []
+    for r in rows[:limit]:
+        direction, change = trend(r["modal_price"], r["prev_modal_price"])
+        item = {k: r[k] for k in ("commodity", "variety", "state", "district", "market", "price_date", "min_price", "max_price")}
+        items.append({**item, "price_inr_per_quintal": r["modal_price"], "trend": direction, "change_pct": change})
+    next_cursor = encode_cursor(rows[limit - 1]["price_date"], rows[limit - 1]["id"]) if len(rows) > limit else None
+    return items, next_cursor
+
+
+def has_prices(db: sqlite3.Connection) -> bool:
+    return db.execute("SELECT 1 FROM market_latest LIMIT 1").fetchone() is not None
+
+
+def main(argv: list[str]) -> None:
+    # python -m fastapi_app.market dump1.csv [dump2.csv ...]
+    from .db import get_db, init_db
+
+    init_db()
+    for path in argv:
+        with get_db() as db:
+            print(f"{path}: {ingest_csv(db, path)} rows")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,416 @@
+from __future__ import annotations
+
+# Counters and fixed-bucket histograms rendered in the Prometheus text format (GET /metrics on both
+# services), per-request DB accounting, and an opt-in sampling profiler for slow requests. No client
+# library: each metric keeps one dict of label values -> bucket counts per thread, so recording takes no lock
+# (a lock round-trip cost more than the rest of an observation); reads add the threads' dicts up. When a
+# thread exits its counts are folded into one retired dict, so a thread-per-request server (Flask's dev
+# server) doesn't keep a dict per request ever served.
+# Under serve.py every worker writes a snapshot to METRICS_DIR each FLUSH_SECONDS and /metrics adds the
+# other workers' snapshots to its own live values, so a scrape of any worker covers all of them. Files of
+# workers that have exited stay, so totals never go backwards.
+
+import bisect
+import contextvars
+import json
+import os
+import re
+import sys
+import threading
+import time
+import weakref
+from collections import Counter as _Tally
+from collections import deque
+from datetime import datetime
+from functools import wraps
+from pathlib import Path
+from typing import Any, Callable, Optional, Sequence, TypeVar
+
+T = TypeVar("T")
+
+# 0 drops the request middleware, the per-statement DB hook and the ML timers (the few remaining timers sit
+# on PBKDF2 and upstream HTTP calls, where a clock read is noise).
+ENABLED = os.environ.get("KRISHIRAKSHAK_METRICS", "1") != "0"
+METRICS_DIR = os.environ.get("KRISHIRAKSHAK_METRICS_DIR", "")
+FLUSH_SECONDS = float(os.environ.get("KRISHIRAKSHAK_METRICS_FLUSH_SECONDS", "2"))
+# Slow-request profiler: off unless a threshold is set.
+PROFILE_SLOW_MS = float(os.environ.get("KRISHIRAKSHAK_PROFILE_SLOW_MS", "0"))
+PROFILE_INTERVAL_MS = float(os.environ.get("KRISHIRAKSHAK_PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = Path(os.environ.get("KRISHIRAKSHAK_PROFILE_DIR", "profiles"))
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _add(into: dict[tuple[str, ...], list[float]], shard: dict[tuple[str, ...], list[float]]) -> None:
+    for key, values in list(shard.items()):
+        mine = into.get(key)
+        into[key] = list(values) if mine is None else [a + b for a, b in zip(mine, values)]
+
+
+class _ThreadToken:
+    # Lives in the recording thread's local storage; its finalizer runs when the thread exits.
+    __slots__ = ("__weakref__",)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str]) -> None:
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._local = threading.local()
+        self._shards: dict[int, dict[tuple[str, ...], list[float]]] = {}  # id -> shard of each live recording thread
+        self._retired: dict[tuple[str, ...], list[float]] = {}  # counts of threads that have exited
+        self._lock = threading.Lock()
+
+    def _values(self, labels: tuple[str, ...]) -> list[float]:
+        # Slow path of a recording thread: first value for these labels, maybe first use in this thread.
+        shard = getattr(self._local, "series", None)
+        if shard is None:
+            shard = self._local.series = {}
+            self._local.token = token = _ThreadToken()
+            weakref.finalize(token, self._retire, shard)
+            with self._lock:
+                self._shards[id(shard)] = shard
+        values = shard[labels] = self._empty()
+        return values
+
+    def _retire(self, shard: dict[tuple[str, ...], list[float]]) -> None:
+        with self._lock:
+            del self._shards[id(shard)]
+            _add(self._retired, shard)
+
+    def _empty(self) -> list[float]:
+        raise NotImplementedError
+
+    def series(self) -> dict[tuple[str, ...], list[float]]:
+        merged: dict[tuple[str, ...], list[float]] = {}
+        with self._lock:
+            shards = list(self._shards.values())
+            _add(merged, self._retired)
+        for shard in shards:
+            _add(merged, shard)
+        return merged
+
+    def _label_text(self, key: tuple[str, ...], extra: str = "") -> str:
+        parts = [f'{name}="{_escape(value)}"' for name, value in zip(self.labels, key)]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render(self, series: dict[tuple[str, ...], list[float]]) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _empty(self) -> list[float]:
+        return [0.0]
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        try:
+            values = self._local.series[labels]
+        except (AttributeError, KeyError):
+            values = self._values(labels)
+        values[0] += amount
+
+    def render(self, series: dict[tuple[str, ...], list[float]]) -> list[str]:
+        return [f"{self.name}{self._label_text(key)} {_fmt(values[0])}" for key, values in sorted(series.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str], buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def _empty(self) -> list[float]:
+        # One slot per bucket (le=bucket counts value <= bucket), one for +Inf, then the sum.
+        return [0] * (len(self.buckets) + 1) + [0.0]
+
+    def observe(self, value: float, *labels: str) -> None:
+        try:
+            values = self._local.series[labels]
+        except (AttributeError, KeyError):
+            values = self._values(labels)
+        values[bisect.bisect_left(self.buckets, value)] += 1
+        values[-1] += value
+
+    def render(self, series: dict[tuple[str, ...], list[float]]) -> list[str]:
+        lines = []
+        for key, values in sorted(series.items()):
+            total = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values):
+                total += count
+                le = 'le="' + ("+Inf" if bound == float("inf") else _fmt(bound)) + '"'
+                lines.append(f"{self.name}_bucket{self._label_text(key, le)} {_fmt(total)}")
+            lines.append(f"{self.name}_sum{self._label_text(key)} {_fmt(values[-1])}")
+            lines.append(f"{self.name}_count{self._label_text(key)} {_fmt(total)}")
+        return lines
+
+
+_REGISTRY: list[_Metric] = []
+
+
+def counter(name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+    metric = Counter(name, help, labels)
+    _REGISTRY.append(metric)
+    return metric
+
+
+def histogram(name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+    metric = Histogram(name, help, labels, buckets)
+    _REGISTRY.append(metric)
+    return metric
+
+
+HTTP_SECONDS = histogram(
+    "krishirakshak_http_request_duration_seconds", "Request latency by route template.", ("service", "method", "route", "status")
+)
+REQUEST_DB_STATEMENTS = histogram(
+    "krishirakshak_request_db_statements", "SQL statements executed per request.", ("route",), COUNT_BUCKETS
+)
+REQUEST_DB_SECONDS = histogram(
+    "krishirakshak_request_db_seconds", "Time per request spent in database calls on the DB executor.", ("route",)
+)
+PASSWORD_HASH_SECONDS = histogram(
+    "krishirakshak_password_hash_seconds", "PBKDF2 time per hash or verification.", ("algorithm",),
+    (0.01, 0.025, 0.05, 0.1, 0.15, 0.2, 0.3, 0.5, 1.0, 2.5),
+)
+SCORING_SECONDS = histogram("krishirakshak_scoring_seconds", "Time per ML scoring call.", ("function",))
+UPSTREAM_SECONDS = histogram(
+    "krishirakshak_upstream_request_duration_seconds", "Report service calls to the API by path.", ("path", "status")
+)
+SLOW_PROFILES = counter("krishirakshak_slow_request_profiles_total", "Slow requests written out as collapsed stacks.")
+
+
+class RequestStats:
+    __slots__ = ("db_statements", "db_seconds")
+
+    def __init__(self) -> None:
+        self.db_statements = 0
+        self.db_seconds = 0.0
+
+
+_request: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("krishirakshak_request", default=None)
+
+
+def trace_statement(_sql: str) -> None:
+    # sqlite3 trace callback, installed on pooled connections.
+    stats = _request.get()
+    if stats is not None:
+        stats.db_statements += 1
+
+
+def record_db_time(seconds: float) -> None:
+    stats = _request.get()
+    if stats is not None:
+        stats.db_seconds += seconds
+
+
+def timed(metric: Histogram, *labels: str) -> Callable[[Callable[..., T]], Callable[..., T]]:
+    def decorate(fn: Callable[..., T]) -> Callable[..., T]:
+        if not ENABLED:
+            return fn
+
+        @wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> T:
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                metric.observe(time.perf_counter() - started, *labels)
+
+        return wrapper
+
+    return decorate
+
+
+class SlowRequestProfiler:
+    # While any request is in flight, a daemon thread samples every thread's stack each interval. A request
+    # that ends slower than the threshold gets the samples taken during it written to PROFILE_DIR as collapsed
+    # stacks ("thread;outer;...;inner count" per line: flamegraph.pl, inferno and speedscope read it). Under
+    # asyncio other requests' stacks land in the same window; the thread name at the root tells the event
+    # loop from the DB/CPU executors. Idle threads (parked in threading, queue, selectors or an executor's
+    # work queue) are left out.
+    _IDLE_FILES = ("threading.py", "queue.py", "selectors.py", "thread.py")
+
+    def __init__(self, threshold_seconds: float, interval_seconds: float, directory: Path, *, max_samples: int = 50_000) -> None:
+        self.threshold_seconds = threshold_seconds
+        self.interval_seconds = interval_seconds
+        self.directory = Path(directory)
+        self._samples: deque[tuple[float, str]] = deque(maxlen=max_samples)
+        self._active = 0
+        self._busy = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def begin(self) -> float:
+        with self._lock:
+            self._active += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample, name="krishi-profiler", daemon=True)
+                self._thread.start()
+        self._busy.set()
+        return time.perf_counter()
+
+    def end(self, started: float, name: str) -> None:
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._active -= 1
+            if not self._active:
+                self._busy.clear()
+        if elapsed >= self.threshold_seconds:
+            self._dump(started, elapsed, name)
+
+    def _sample(self) -> None:
+        me = threading.get_ident()
+        while True:
+            self._busy.wait()
+            now = time.perf_counter()
+            names = {t.ident: t.name for t in threading.enumerate()}
+            stacks = []
+            for ident, frame in sys._current_frames().items():
+                if ident == me or os.path.basename(frame.f_code.co_filename) in self._IDLE_FILES:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                stacks.append((now, ";".join(reversed(stack))))
+            with self._lock:
+                self._samples.extend(stacks)
+            time.sleep(self.interval_seconds)
+
+    def _dump(self, started: float, elapsed: float, name: str) -> None:
+        with self._lock:
+            tally = _Tally(stack for at, stack in self._samples if at >= started)
+        if not tally:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        slug = re.sub(r"[^\w]+", "_", name).strip("_") or "request"
+        path = self.directory / f"{datetime.now():%Y%m%dT%H%M%S.%f}-{os.getpid()}-{slug}-{elapsed * 1e3:.0f}ms.folded"
+        path.write_text("".join(f"{stack} {count}\n" for stack, count in tally.most_common()), encoding="utf-8")
+        SLOW_PROFILES.inc()
+
+
+profiler = SlowRequestProfiler(PROFILE_SLOW_MS / 1e3, PROFILE_INTERVAL_MS / 1e3, PROFILE_DIR) if PROFILE_SLOW_MS > 0 else None
+
+
+class MetricsMiddleware:
+    # Plain ASGI rather than BaseHTTPMiddleware: no extra task or body buffering per request. Labels use the
+    # matched route's template (scope["route"] is set by the router), so path parameters don't add series.
+    def __init__(self, app: Any, *, service: str = "fastapi") -> None:
+        self.app = app
+        self.service = service
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats()
+        token = _request.set(stats)
+        status = 500
+
+        async def send_status(message: dict) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = profiler.begin() if profiler is not None else time.perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            _request.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            observe_request(self.service, scope["method"], path, status, started, stats)
+
+
+def observe_request(service: str, method: str, route: str, status: int, started: float, stats: Optional[RequestStats]) -> None:
+    HTTP_SECONDS.observe(time.perf_counter() - started, service, method, route, str(status))
+    if stats is not None:
+        REQUEST_DB_STATEMENTS.observe(stats.db_statements, route)
+        REQUEST_DB_SECONDS.observe(stats.db_seconds, route)
+    if profiler is not None:
+        profiler.end(started, f"{method} {route}")
+
+
+def render() -> str:
+    merged = {metric.name: metric.series() for metric in _REGISTRY}
+    if METRICS_DIR:
+        for path in Path(METRICS_DIR).glob("*.json"):
+            if path.stem == str(os.getpid()):
+                continue
+            try:
+                snapshot = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            for name, series in snapshot.items():
+                target = merged.get(name)
+                if target is None:
+                    continue
+                for labels, values in series:
+                    key = tuple(labels)
+                    mine = target.get(key)
+                    target[key] = values if mine is None else [a + b for a, b in zip(mine, values)]
+    lines = []
+    for metric in _REGISTRY:
+        lines += [f"# HELP {metric.name} {metric.help}", f"# TYPE {metric.name} {metric.kind}"]
+        lines += metric.render(merged[metric.name])
+    return "\n".join(lines) + "\n"
+
+
+def flush() -> None:
+    # This process's values, for the other workers' /metrics; written aside and swapped in whole.
+    snapshot = {metric.name: [[list(key), values] for key, values in metric.series().items()] for metric in _REGISTRY}
+    path = Path(METRICS_DIR) / f"{os.getpid()}.json"
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(snapshot), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+_flusher: Optional[threading.Thread] = None
+_stop_flushing = threading.Event()
+
+
+def start_flusher() -> None:
+    global _flusher
+    if not METRICS_DIR or _flusher is not None:
+        return
+    _stop_flushing.clear()
+
+    def run() -> None:
+        while not _stop_flushing.wait(FLUSH_SECONDS):
+            flush()
+
+    _flusher = threading.Thread(target=run, name="krishi-metrics-flush", daemon=True)
+    _flusher.start()
+
+
+def stop_flusher() -> None:
+    global _flusher
+    if _flusher is None:
+        return
+    _stop_flushing.set()
+    _flusher.join()
+    _flusher = None
+    flush()
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
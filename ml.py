@@ -1,7 +1,30 @@
 from __future__ import annotations
 
+import json
+import os
 from dataclasses import dataclass
-from typing import Optional
+from pathlib import Path
+from typing import Optional, Sequence, Union
+
+import numpy as np
+
+from . import climate
+from .metrics import SCORING_SECONDS, timed
+
+# Crop knowledge base: per-crop base confidence, slope and modifiers; see the file's "comment" for the format.
+CROP_CATALOG_PATH = Path(os.environ.get("KRISHIRAKSHAK_CROP_CATALOG", Path(__file__).resolve().parent / "crops.json"))
+# Which model serves recommend_crops/predict_risk and their batch forms: "heuristic" is the rule-based baseline in
+# this module, "trained" the artifact written by model.py's trainer, "auto" the trained one when an artifact exists.
+MODEL_BACKEND = os.environ.get("KRISHIRAKSHAK_MODEL_BACKEND", "auto")
+
+# Climate-grid thresholds (see climate.py); without a grid, frost falls back to the latitude proxy.
+FROST_DAYS_THRESHOLD = 10
+DRY_RAINFALL_MM = 750
+WET_RAINFALL_MM = 2000
+# Forecast thresholds over the next 72 hours (see weather.py).
+FROST_FORECAST_C = 2.0
+HEATWAVE_FORECAST_C = 40.0
+HEAVY_RAIN_FORECAST_MM = 65.0
 
 
 @dataclass(frozen=True)
@@ -14,6 +37,27 @@ class FarmContext:
     season: Optional[str]
     irrigation_type: Optional[str]
 
+    @classmethod
+    def from_row(cls, row) -> "FarmContext":
+        # row: a farm_profiles row or any mapping with the same column names.
+        return cls(
+            soil_type=row["soil_type"],
+            ph=row["ph"],
+            n=row["nitrogen"],
+            p=row["phosphorus"],
+            k=row["potassium"],
+            season=row["season"],
+            irrigation_type=row["irrigation_type"],
+        )
+
+
+@dataclass(frozen=True)
+class ForecastFeatures:
+    # Summary of the next 72 hours for the farm's weather grid cell.
+    max_temp_c: float
+    min_temp_c: float
+    rain_mm: float
+
 
 def _score_soil_balance(n: Optional[float], p: Optional[float], k: Optional[float]) -> float:
     vals = [v for v in (n, p, k) if v is not None]
@@ -26,60 +70,263 @@ def _score_soil_balance(n: Optional[float], p: Optional[float], k: Optional[floa
     return 1.0 - 0.6 * imbalance
 
 
-def recommend_crops(ctx: FarmContext) -> tuple[list[dict], str]:
-    score = _score_soil_balance(ctx.n, ctx.p, ctx.k)
-    ph = ctx.ph
+# ---------------------------------------------------------------------------
+# Crop knowledge base. crops.json is compiled once into per-season arrays, so a recommendation is an array
+# lookup plus a partial top-k selection whatever the size of the catalog.
+# ---------------------------------------------------------------------------
 
-    crops: list[dict] = []
-    rationale_bits: list[str] = []
-
-    season = (ctx.season or "All").lower()
-    if season in {"kharif", "all"}:
-        crops += [
-            {"crop": "Rice", "confidence": 0.55 + 0.25 * score, "why": "Common Kharif staple; performs well with reliable water."},
-            {"crop": "Maize", "confidence": 0.50 + 0.30 * score, "why": "Good Kharif crop; adaptable to many soils."},
-            {"crop": "Cotton", "confidence": 0.45 + 0.25 * score, "why": "Suitable for warm regions; benefits from balanced NPK."},
-        ]
-        rationale_bits.append("Season includes Kharif.")
-    if season in {"rabi", "all"}:
-        crops += [
-            {"crop": "Wheat", "confidence": 0.55 + 0.25 * score, "why": "Common Rabi crop; prefers neutral pH and balanced nutrients."},
-            {"crop": "Mustard", "confidence": 0.50 + 0.25 * score, "why": "Rabi oilseed; tolerates varied soils."},
-            {"crop": "Chickpea", "confidence": 0.48 + 0.22 * score, "why": "Legume improving soil health; good for rotations."},
+SEASON_CODES = {"kharif": 1, "rabi": 2, "zaid": 3, "all": 4}  # 0 = missing, 5 = unrecognized
+IRRIGATION_MISSING, IRRIGATION_EFFICIENT, IRRIGATION_OTHER = 0, 1, 2
+PH_UNKNOWN, PH_ACIDIC, PH_ALKALINE, PH_NEUTRAL = 0, 1, 2, 3
+# Major Indian soil groups and texture classes.
+SOIL_CODES = {
+    "alluvial": 1, "black": 2, "red": 3, "laterite": 4, "arid": 5, "saline": 6,
+    "peaty": 7, "forest": 8, "clay": 9, "loam": 10, "sandy": 11, "silt": 12,
+}  # 0 = missing
+SOIL_UNRECOGNIZED = len(SOIL_CODES) + 1
+_SOIL_ALIASES = {
+    "loamy": "loam", "sandy loam": "loam", "clayey": "clay", "clay loam": "clay", "sand": "sandy", "silty": "silt",
+    "desert": "arid", "regur": "black", "black cotton": "black", "red and yellow": "red", "mountain": "forest",
+    "hill": "forest", "alkaline": "saline", "marshy": "peaty",
+}
+# Modifier groups in the order they are applied: (name, data-file keys -> farm code, number of codes).
+_MODIFIERS = (
+    ("ph", {"acidic": PH_ACIDIC, "alkaline": PH_ALKALINE, "neutral": PH_NEUTRAL}, 4),
+    ("soil", SOIL_CODES, SOIL_UNRECOGNIZED + 1),
+    ("irrigation", {"missing": IRRIGATION_MISSING, "efficient": IRRIGATION_EFFICIENT, "other": IRRIGATION_OTHER}, 3),
+)
+
+
+def _season_code(season: Optional[str]) -> int:
+    if season is None:
+        return 0
+    return SEASON_CODES.get(season.lower(), 5)
+
+
+def _irrigation_code(irrigation_type: Optional[str]) -> int:
+    if irrigation_type is None or irrigation_type.strip() == "":
+        return IRRIGATION_MISSING
+    return IRRIGATION_EFFICIENT if irrigation_type.lower() in {"drip", "sprinkler"} else IRRIGATION_OTHER
+
+
+def _soil_code(soil_type: Optional[str]) -> int:
+    if soil_type is None or soil_type.strip() == "":
+        return 0
+    name = " ".join(soil_type.lower().split())
+    name = name.removesuffix(" soils").removesuffix(" soil")
+    return SOIL_CODES.get(_SOIL_ALIASES.get(name, name), SOIL_UNRECOGNIZED)
+
+
+def _ph_band(ph: Optional[float]) -> int:
+    if ph is None:
+        return PH_UNKNOWN
+    return PH_ACIDIC if ph < 5.5 else PH_ALKALINE if ph > 8.0 else PH_NEUTRAL
+
+
+def ph_band_batch(ph: np.ndarray) -> np.ndarray:
+    return np.select([np.isnan(ph), ph < 5.5, ph > 8.0], [PH_UNKNOWN, PH_ACIDIC, PH_ALKALINE], default=PH_NEUTRAL).astype(np.int8)
+
+
+@dataclass(frozen=True)
+class SeasonTable:
+    # The crops recommended for one season code, as parallel arrays in catalog order.
+    crops: np.ndarray  # int16 indices into CropCatalog.names
+    base: np.ndarray
+    slope: np.ndarray
+    # (group, (codes, crops) additive table indexed by the farm's code), only groups with a non-zero entry.
+    modifiers: tuple[tuple[str, np.ndarray], ...]
+
+
+class CropCatalog:
+    def __init__(self, spec: dict, *, version: Optional[str] = None) -> None:
+        crops = spec["crops"]
+        self.version = version
+        self.max_confidence = float(spec.get("max_confidence", 0.95))
+        self.names = tuple(c["crop"] for c in crops)
+        self.why = tuple(c["why"] for c in crops)
+        self.seasons = tuple(
+            tuple(s.lower() for s in ([c["season"]] if isinstance(c["season"], str) else c["season"])) for c in crops
+        )
+        for name, seasons in zip(self.names, self.seasons):
+            if not seasons or any(s not in SEASON_CODES or s == "all" for s in seasons):
+                raise ValueError(f"Crop {name!r} needs one or more of kharif, rabi, zaid as its season, not {seasons}")
+        base = np.array([float(c["base"]) for c in crops])
+        slope = np.array([float(c["slope"]) for c in crops])
+        mods = {}
+        for group, keys, size in _MODIFIERS:
+            table = np.zeros((size, len(crops)))
+            for j, c in enumerate(crops):
+                for key, delta in c.get(group, {}).items():
+                    if key not in keys:
+                        raise ValueError(f"Unknown {group} modifier {key!r} for crop {c['crop']!r}")
+                    table[keys[key], j] = float(delta)
+            mods[group] = table
+
+        def compile(members: np.ndarray) -> SeasonTable:
+            return SeasonTable(
+                crops=members.astype(np.int16),
+                base=base[members],
+                slope=slope[members],
+                modifiers=tuple((g, mods[g][:, members]) for g, _, _ in _MODIFIERS if mods[g][:, members].any()),
+            )
+
+        everything = compile(np.arange(len(crops)))
+        by_season = {
+            code: compile(np.array([j for j, s in enumerate(self.seasons) if name in s], dtype=np.intp))
+            for name, code in SEASON_CODES.items()
+            if name != "all"
+        }
+        # Indexed by season code: a missing season means all seasons, an unrecognized one matches no crop.
+        self.tables = (everything, by_season[1], by_season[2], by_season[3], everything, compile(np.array([], dtype=np.intp)))
+
+    @classmethod
+    def from_file(cls, path: Union[str, Path]) -> "CropCatalog":
+        spec = json.loads(Path(path).read_text(encoding="utf-8"))
+        return cls(spec, version=str(spec.get("version", "")))
+
+    def confidence(self, table: SeasonTable, score, codes: dict) -> np.ndarray:
+        # base + slope * soil balance plus the farm's modifiers, clipped to [0, max_confidence]. score and the codes
+        # are scalars for one farm (result: one value per crop of the season) or 1-D arrays (farms x crops).
+        conf = table.base + table.slope * np.asarray(score)[..., None]
+        for group, mod in table.modifiers:
+            conf = conf + mod[codes[group]]
+        return np.minimum(np.maximum(conf, 0.0), self.max_confidence)
+
+    def notes(self) -> list[dict]:
+        return [
+            {"crop": name, "season": ", ".join(s.capitalize() for s in seasons), "why": why}
+            for name, seasons, why in zip(self.names, self.seasons, self.why)
         ]
-        rationale_bits.append("Season includes Rabi.")
-    if season in {"zaid", "all"}:
-        crops += [
-            {"crop": "Watermelon", "confidence": 0.50 + 0.20 * score, "why": "Zaid crop; benefits from irrigation and warm weather."},
-            {"crop": "Cucumber", "confidence": 0.48 + 0.20 * score, "why": "Zaid vegetable; responsive to balanced nutrition."},
+
+
+CATALOG = CropCatalog.from_file(CROP_CATALOG_PATH)
+
+# Bump whenever the heuristic rules change: stored scores from another version are re-scored (see scoring.py and
+# model_version). The crop catalog's version is part of it, so editing crops.json re-scores too.
+HEURISTIC_VERSION = f"heuristic-1+crops-{CATALOG.version}"
+
+
+def trained_model(backend: Optional[str] = None):
+    # The model.TrainedModel to serve with, or None for the heuristics.
+    backend = backend or MODEL_BACKEND
+    if backend == "heuristic":
+        return None
+    if backend not in ("auto", "trained"):
+        raise ValueError(f"Unknown model backend {backend!r}; expected auto, heuristic or trained")
+    from . import model  # imported on first use: the heuristics need none of it
+
+    loaded = model.get_model()
+    if loaded is None and backend == "trained":
+        raise FileNotFoundError(f"No trained model in {model.MODEL_DIR}; run python -m fastapi_app.model train")
+    return loaded
+
+
+def model_version(backend: Optional[str] = None) -> str:
+    loaded = trained_model(backend)
+    return HEURISTIC_VERSION if loaded is None else f"{loaded.version}+crops-{CATALOG.version}"
+
+
+def model_stats() -> dict:
+    loaded = trained_model()
+    return {
+        "backend": MODEL_BACKEND,
+        "serving": "heuristic" if loaded is None else "trained",
+        "version": model_version(),
+        **(loaded.stats() if loaded is not None else {}),
+    }
+
+
+def crop_notes() -> list[dict]:
+    # The catalog's "why" texts with their season, e.g. for the chat search index.
+    return CATALOG.notes()
+
+
+# Below these season sizes a full stable sort is cheaper than partitioning first: per call numpy overhead
+# dominates the scalar path, so its cutoff is higher than the batch one.
+_PARTIAL_SORT_MIN = 256
+_PARTIAL_SORT_MIN_COLUMNS = 32
+
+
+def top_k_indices(values: np.ndarray, k: int) -> np.ndarray:
+    # Indices of the k largest values, largest first, with ties in index order exactly like a stable descending
+    # sort; a partition finds the k-th value, so only the values at or above it are sorted.
+    if k >= len(values) or len(values) < _PARTIAL_SORT_MIN:
+        return np.argsort(-values, kind="stable")[:k]
+    kth = np.partition(values, len(values) - k)[len(values) - k]
+    picked = np.flatnonzero(values >= kth)
+    return picked[np.argsort(-values[picked], kind="stable")[:k]]
+
+
+def _sorted_top(values: np.ndarray, width: int, k: int) -> np.ndarray:
+    # Per row: the width largest columns (any of those tied at the width-th value), then the first k of them by
+    # value with ties in column order.
+    picked = np.sort(np.argpartition(-values, width - 1, axis=1)[:, :width], axis=1)
+    order = np.argsort(-np.take_along_axis(values, picked, axis=1), axis=1, kind="stable")[:, :k]
+    return np.take_along_axis(picked, order, axis=1)
+
+
+def top_k_columns(values: np.ndarray, k: int) -> np.ndarray:
+    # top_k_indices for every row of a 2-D array.
+    if k >= values.shape[1] or values.shape[1] < _PARTIAL_SORT_MIN_COLUMNS:
+        return np.argsort(-values, axis=1, kind="stable")[:, :k]
+    order = _sorted_top(values, k, k)
+    # Rows where columns left out tie with the k-th value are redone over every column at or above it.
+    counts = (values >= np.take_along_axis(values, order[:, -1:], axis=1)).sum(axis=1)
+    tied = counts > k
+    if tied.any():
+        order[tied] = _sorted_top(values[tied], int(counts[tied].max()), k)
+    return order
+
+
+def _recommendation_rationale(season: int, ph_band: int, irrigation: int) -> str:
+    season = season or SEASON_CODES["all"]
+    bits = [f"Season includes {name}." for code, name in ((1, "Kharif"), (2, "Rabi"), (3, "Zaid")) if season in (code, 4)]
+    bits += {
+        PH_ACIDIC: ["Soil seems acidic; consider liming and acid-tolerant crops."],
+        PH_ALKALINE: ["Soil seems alkaline; consider gypsum and salt-tolerant varieties."],
+        PH_NEUTRAL: ["Soil pH looks near-neutral."],
+    }.get(ph_band, [])
+    if irrigation == IRRIGATION_EFFICIENT:
+        bits.append("Efficient irrigation can improve yield stability.")
+    return " ".join(bits) if bits else "Recommendations are based on the provided season and soil indicators."
+
+
+@timed(SCORING_SECONDS, "recommend_crops")
+def recommend_crops(
+    ctx: FarmContext, *, top_k: int = 6, catalog: Optional[CropCatalog] = None, backend: Optional[str] = None
+) -> tuple[list[dict], str]:
+    catalog = catalog or CATALOG
+    model = trained_model(backend)
+    season = _season_code(ctx.season)
+    ph_band = _ph_band(ctx.ph)
+    irrigation = _irrigation_code(ctx.irrigation_type)
+    table = catalog.tables[season]
+    crops: list[dict] = []
+    if len(table.crops):
+        codes = {"ph": ph_band, "soil": _soil_code(ctx.soil_type), "irrigation": irrigation}
+        conf = catalog.confidence(table, _score_soil_balance(ctx.n, ctx.p, ctx.k), codes)
+        if model is not None:
+            positions, columns = model.season_columns(catalog, season)
+            if len(positions):
+                conf[positions] = np.minimum(model.crop_probability_one(ctx)[columns], catalog.max_confidence)
+        order = top_k_indices(conf, top_k)
+        crops = [
+            {"crop": catalog.names[j], "confidence": c, "why": catalog.why[j]}
+            for j, c in zip(table.crops[order].tolist(), conf[order].tolist())
         ]
-        rationale_bits.append("Season includes Zaid.")
-
-    if ph is not None:
-        if ph < 5.5:
-            rationale_bits.append("Soil seems acidic; consider liming and acid-tolerant crops.")
-            for c in crops:
-                if c["crop"] in {"Rice"}:
-                    c["confidence"] = min(0.95, c["confidence"] + 0.05)
-        elif ph > 8.0:
-            rationale_bits.append("Soil seems alkaline; consider gypsum and salt-tolerant varieties.")
-            for c in crops:
-                if c["crop"] in {"Cotton", "Mustard"}:
-                    c["confidence"] = min(0.95, c["confidence"] + 0.04)
-        else:
-            rationale_bits.append("Soil pH looks near-neutral.")
-
-    if ctx.irrigation_type:
-        if ctx.irrigation_type.lower() in {"drip", "sprinkler"}:
-            rationale_bits.append("Efficient irrigation can improve yield stability.")
-
-    crops = sorted(crops, key=lambda x: x["confidence"], reverse=True)[:6]
-    rationale = " ".join(rationale_bits) if rationale_bits else "Recommendations are based on the provided season and soil indicators."
-    return crops, rationale
-
-
-def predict_risk(ctx: FarmContext, *, latitude: Optional[float], longitude: Optional[float]) -> tuple[float, str, list[str], list[str]]:
-    # Lightweight baseline “ML” risk score (0..1) using heuristics.
+    return crops, _recommendation_rationale(season, ph_band, irrigation)
+
+
+@timed(SCORING_SECONDS, "predict_risk")
+def predict_risk(
+    ctx: FarmContext,
+    *,
+    latitude: Optional[float],
+    longitude: Optional[float],
+    forecast: Optional[ForecastFeatures] = None,
+    backend: Optional[str] = None,
+) -> tuple[float, str, list[str], list[str]]:
+    # Baseline risk score (0..1) from heuristics; the rule flags below name the factors with either backend.
     score = 0.35
     top: list[str] = []
     mitigation: list[str] = []
@@ -100,14 +347,44 @@ def predict_risk(ctx: FarmContext, *, latitude: Optional[float], longitude: Opti
         top.append("Irrigation uncertainty")
         mitigation.append("Plan irrigation schedule; adopt mulching and water-saving practices.")
 
-    if latitude is not None:
+    season = (ctx.season or "").lower()
+    cell = climate.lookup(latitude, longitude)
+    if cell is not None:
+        frost = season == "rabi" and cell.frost_days >= FROST_DAYS_THRESHOLD
+    else:
         # Very rough climate proxy: higher latitudes -> higher frost risk for some crops in Rabi
-        if latitude > 25 and (ctx.season or "").lower() == "rabi":
-            score += 0.08
-            top.append("Cold spell / frost")
-            mitigation.append("Use frost-tolerant varieties and avoid late sowing; consider windbreaks.")
+        frost = latitude is not None and latitude > 25 and season == "rabi"
+    if forecast is not None and forecast.min_temp_c <= FROST_FORECAST_C:
+        frost = True
+    if frost:
+        score += 0.08
+        top.append("Cold spell / frost")
+        mitigation.append("Use frost-tolerant varieties and avoid late sowing; consider windbreaks.")
+
+    if cell is not None and cell.rainfall_mm < DRY_RAINFALL_MM:
+        score += 0.08
+        top.append("Low rainfall / drought stress")
+        mitigation.append("Choose drought-tolerant varieties; harvest rainwater and plan protective irrigation.")
+
+    if cell is not None and cell.rainfall_mm > WET_RAINFALL_MM and season == "kharif":
+        score += 0.06
+        top.append("Excess rainfall / waterlogging")
+        mitigation.append("Keep field drains open and use raised beds; watch for fungal disease after heavy rain.")
+
+    if forecast is not None and forecast.max_temp_c >= HEATWAVE_FORECAST_C:
+        score += 0.07
+        top.append("Heatwave forecast")
+        mitigation.append("Irrigate in the evening or early morning and mulch to keep soil moisture during the heatwave.")
+
+    if forecast is not None and forecast.rain_mm >= HEAVY_RAIN_FORECAST_MM:
+        score += 0.07
+        top.append("Heavy rain forecast")
+        mitigation.append("Postpone spraying and fertilizer application; clear drainage channels before the rain.")
 
     score = max(0.0, min(1.0, score))
+    model = trained_model(backend)
+    if model is not None:
+        score = model.risk_probability_one(ctx, latitude, cell, forecast)
     if score < 0.45:
         level = "Low"
     elif score < 0.7:
@@ -121,3 +398,215 @@ def predict_risk(ctx: FarmContext, *, latitude: Optional[float], longitude: Opti
 
     return score, level, top[:3], mitigation[:4]
 
+
+
+# ---------------------------------------------------------------------------
+# Batch scoring. Columnar counterparts of recommend_crops/predict_risk for re-scoring many farms at
+# once; every arithmetic step mirrors the scalar code in the same order so results match exactly.
+# ---------------------------------------------------------------------------
+
+RISK_LEVELS = ("Low", "Medium", "High")
+
+# Risk factor bits, in the order predict_risk reports them.
+_RISK_FACTORS = (
+    ("Soil pH stress", "Test pH and apply lime/gypsum as recommended by local soil lab."),
+    ("NPK imbalance", "Use soil-test-based fertilization and split applications to reduce losses."),
+    ("Irrigation uncertainty", "Plan irrigation schedule; adopt mulching and water-saving practices."),
+    ("Cold spell / frost", "Use frost-tolerant varieties and avoid late sowing; consider windbreaks."),
+    ("Low rainfall / drought stress", "Choose drought-tolerant varieties; harvest rainwater and plan protective irrigation."),
+    ("Excess rainfall / waterlogging", "Keep field drains open and use raised beds; watch for fungal disease after heavy rain."),
+    ("Heatwave forecast", "Irrigate in the evening or early morning and mulch to keep soil moisture during the heatwave."),
+    ("Heavy rain forecast", "Postpone spraying and fertilizer application; clear drainage channels before the rain."),
+)
+
+
+def _f(v: Optional[float]) -> float:
+    return np.nan if v is None else float(v)
+
+
+@dataclass(frozen=True)
+class FarmBatch:
+    # Parallel 1-D arrays, one element per farm. Missing numeric values are NaN.
+    ph: np.ndarray
+    n: np.ndarray
+    p: np.ndarray
+    k: np.ndarray
+    soil_type: np.ndarray  # int8 codes, see SOIL_CODES
+    season: np.ndarray  # int8 codes, see SEASON_CODES
+    irrigation: np.ndarray  # int8 codes, IRRIGATION_*
+    latitude: np.ndarray
+    # Climate-grid features; NaN where the farm has no location, it falls outside the grid, or there is no grid.
+    frost_days: np.ndarray
+    rainfall_mm: np.ndarray
+    # ForecastFeatures columns; NaN where no forecast was available.
+    forecast_max_temp_c: np.ndarray
+    forecast_min_temp_c: np.ndarray
+    forecast_rain_mm: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.ph)
+
+    @classmethod
+    def from_contexts(
+        cls,
+        ctxs: Sequence[FarmContext],
+        latitudes: Optional[Sequence[Optional[float]]] = None,
+        longitudes: Optional[Sequence[Optional[float]]] = None,
+        forecasts: Optional[Sequence[Optional[ForecastFeatures]]] = None,
+    ) -> "FarmBatch":
+        lats = latitudes if latitudes is not None else [None] * len(ctxs)
+        lons = longitudes if longitudes is not None else [None] * len(ctxs)
+        lat = np.array([_f(v) for v in lats], dtype=np.float64)
+        frost_days, rainfall_mm = climate_features(lat, np.array([_f(v) for v in lons], dtype=np.float64))
+        fcs = forecasts if forecasts is not None else [None] * len(ctxs)
+        return cls(
+            ph=np.array([_f(c.ph) for c in ctxs], dtype=np.float64),
+            n=np.array([_f(c.n) for c in ctxs], dtype=np.float64),
+            p=np.array([_f(c.p) for c in ctxs], dtype=np.float64),
+            k=np.array([_f(c.k) for c in ctxs], dtype=np.float64),
+            soil_type=np.array([_soil_code(c.soil_type) for c in ctxs], dtype=np.int8),
+            season=np.array([_season_code(c.season) for c in ctxs], dtype=np.int8),
+            irrigation=np.array([_irrigation_code(c.irrigation_type) for c in ctxs], dtype=np.int8),
+            latitude=lat,
+            frost_days=frost_days,
+            rainfall_mm=rainfall_mm,
+            forecast_max_temp_c=np.array([np.nan if f is None else f.max_temp_c for f in fcs], dtype=np.float64),
+            forecast_min_temp_c=np.array([np.nan if f is None else f.min_temp_c for f in fcs], dtype=np.float64),
+            forecast_rain_mm=np.array([np.nan if f is None else f.rain_mm for f in fcs], dtype=np.float64),
+        )
+
+
+def climate_features(latitude: np.ndarray, longitude: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # (frost_days, rainfall_mm) per farm from the climate grid, NaN where climate.lookup would return None.
+    cells = climate.lookup_many(latitude, longitude)
+    if cells is None:
+        missing = np.full(len(latitude), np.nan)
+        return missing, missing.copy()
+    known = cells["zone"] > 0
+    return (
+        np.where(known, cells["frost_days"], np.nan),
+        np.where(known, cells["rainfall_mm"], np.nan),
+    )
+
+
+def score_soil_balance_batch(n: np.ndarray, p: np.ndarray, k: np.ndarray) -> np.ndarray:
+    cols = (n, p, k)
+    present = [~np.isnan(c) for c in cols]
+    count = present[0].astype(np.int8) + present[1] + present[2]
+    total = np.where(present[0], n, 0.0) + np.where(present[1], p, 0.0) + np.where(present[2], k, 0.0)
+    hi = np.fmax(np.fmax(n, p), k)
+    lo = np.fmin(np.fmin(n, p), k)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        avg = total / count
+        spread = np.where(count > 1, hi - lo, 0.0)
+        imbalance = np.minimum(1.0, spread / np.maximum(1.0, avg))
+    return np.where(count == 0, 0.5, 1.0 - 0.6 * imbalance)
+
+
+@dataclass(frozen=True)
+class RecommendationBatch:
+    crop_index: np.ndarray  # (farms, top_k) int16 indices into catalog.names, -1 where fewer crops apply
+    confidence: np.ndarray  # (farms, top_k) float64, NaN where crop_index is -1
+    ph_band: np.ndarray  # int8 PH_* codes
+    season: np.ndarray
+    irrigation: np.ndarray
+    catalog: CropCatalog
+
+    def row(self, i: int) -> tuple[list[dict], str]:
+        crops = [
+            {"crop": self.catalog.names[j], "confidence": float(c), "why": self.catalog.why[j]}
+            for j, c in zip(self.crop_index[i].tolist(), self.confidence[i].tolist())
+            if j >= 0
+        ]
+        return crops, _recommendation_rationale(int(self.season[i]), int(self.ph_band[i]), int(self.irrigation[i]))
+
+
+@timed(SCORING_SECONDS, "recommend_crops_batch")
+def recommend_crops_batch(
+    batch: FarmBatch, *, top_k: int = 6, catalog: Optional[CropCatalog] = None, backend: Optional[str] = None
+) -> RecommendationBatch:
+    catalog = catalog or CATALOG
+    model = trained_model(backend)
+    if model is not None:
+        # Trained success probabilities replace the catalog's confidence for the crops the model has learned.
+        probability = model.crop_probability(batch)
+    score = score_soil_balance_batch(batch.n, batch.p, batch.k)
+    ph_band = ph_band_batch(batch.ph)
+    codes = {"ph": ph_band, "soil": batch.soil_type, "irrigation": batch.irrigation}
+    width = min(top_k, len(catalog.names))
+    crop_index = np.full((len(batch), width), -1, dtype=np.int16)
+    confidence = np.full((len(batch), width), np.nan)
+    # One pass per season code over that season's precompiled table.
+    for code, table in enumerate(catalog.tables):
+        rows = np.flatnonzero(batch.season == code)
+        if not len(rows) or not len(table.crops):
+            continue
+        conf = catalog.confidence(table, score[rows], {g: c[rows] for g, c in codes.items()})
+        if model is not None:
+            positions, columns = model.season_columns(catalog, code)
+            if len(positions):
+                conf[:, positions] = np.minimum(probability[np.ix_(rows, columns)], catalog.max_confidence)
+        order = top_k_columns(conf, top_k)
+        crop_index[rows, : order.shape[1]] = table.crops[order]
+        confidence[rows, : order.shape[1]] = np.take_along_axis(conf, order, axis=1)
+    return RecommendationBatch(
+        crop_index=crop_index,
+        confidence=confidence,
+        ph_band=ph_band,
+        season=batch.season,
+        irrigation=batch.irrigation,
+        catalog=catalog,
+    )
+
+
+@dataclass(frozen=True)
+class RiskBatch:
+    score: np.ndarray  # float64 in [0, 1]
+    level: np.ndarray  # int8 index into RISK_LEVELS
+    factors: np.ndarray  # uint8 bitmask over _RISK_FACTORS
+
+    def row(self, i: int) -> tuple[float, str, list[str], list[str]]:
+        mask = int(self.factors[i])
+        hits = [f for bit, f in enumerate(_RISK_FACTORS) if mask & (1 << bit)]
+        top = [t for t, _ in hits]
+        mitigation = [m for _, m in hits]
+        if not top:
+            top = ["General weather variability", "Pest/disease pressure"]
+            mitigation = ["Monitor IMD weather alerts and use IPM practices; scout fields weekly."]
+        return float(self.score[i]), RISK_LEVELS[int(self.level[i])], top[:3], mitigation[:4]
+
+
+@timed(SCORING_SECONDS, "predict_risk_batch")
+def predict_risk_batch(batch: FarmBatch, *, backend: Optional[str] = None) -> RiskBatch:
+    # The rule flags name the risk factors with either backend; a trained model replaces the additive score.
+    ph_stress = (batch.ph < 5.5) | (batch.ph > 8.0)
+    imbalance = score_soil_balance_batch(batch.n, batch.p, batch.k) < 0.55
+    no_irrigation = batch.irrigation == IRRIGATION_MISSING
+    rabi = batch.season == SEASON_CODES["rabi"]
+    has_cell = ~np.isnan(batch.rainfall_mm)
+    frost = rabi & np.where(has_cell, batch.frost_days >= FROST_DAYS_THRESHOLD, batch.latitude > 25)
+    frost |= batch.forecast_min_temp_c <= FROST_FORECAST_C
+    dry = has_cell & (batch.rainfall_mm < DRY_RAINFALL_MM)
+    wet = has_cell & (batch.rainfall_mm > WET_RAINFALL_MM) & (batch.season == SEASON_CODES["kharif"])
+    heat = batch.forecast_max_temp_c >= HEATWAVE_FORECAST_C
+    heavy_rain = batch.forecast_rain_mm >= HEAVY_RAIN_FORECAST_MM
+
+    score = np.full(len(batch), 0.35)
+    score = score + np.where(ph_stress, 0.18, 0.0)
+    score = score + np.where(imbalance, 0.15, 0.0)
+    score = score + np.where(no_irrigation, 0.10, 0.0)
+    score = score + np.where(frost, 0.08, 0.0)
+    score = score + np.where(dry, 0.08, 0.0)
+    score = score + np.where(wet, 0.06, 0.0)
+    score = score + np.where(heat, 0.07, 0.0)
+    score = score + np.where(heavy_rain, 0.07, 0.0)
+    score = np.clip(score, 0.0, 1.0)
+    model = trained_model(backend)
+    if model is not None:
+        score = model.risk_probability(batch)
+
+    level = np.select([score < 0.45, score < 0.7], [0, 1], default=2).astype(np.int8)
+    factors = np.zeros(len(batch), dtype=np.uint8)
+    for bit, hit in enumerate((ph_stress, imbalance, no_irrigation, frost, dry, wet, heat, heavy_rain)):
+        factors |= hit.astype(np.uint8) << bit
+    return RiskBatch(score=score, level=level, factors=factors)
@@ -0,0 +1,545 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, Sequence, Union
+
+import numpy as np
+
+from . import ml
+
+# Trained backend for ml.py (select it with KRISHIRAKSHAK_MODEL_BACKEND): logistic regressions fitted with NumPy
+# on the labelled farm_outcomes table, one for risk (P(loss)) and one per crop (P(success) when grown).
+# An artifact is a .npy of packed float64 parameters named after its version, memory-mapped so every worker
+# process shares the same pages, plus manifest.json with the layout; saving swaps the manifest atomically.
+MODEL_DIR = Path(os.environ.get("KRISHIRAKSHAK_MODEL_DIR", Path(__file__).resolve().parent / "model"))
+FORMAT = 1
+# L2 penalty on the standardized weights. Crops with fewer training rows keep the catalog's heuristic confidence.
+L2 = float(os.environ.get("KRISHIRAKSHAK_MODEL_L2", "1.0"))
+MIN_CROP_ROWS = int(os.environ.get("KRISHIRAKSHAK_MODEL_MIN_CROP_ROWS", "200"))
+
+logger = logging.getLogger(__name__)
+
+_SOILS = tuple(sorted(ml.SOIL_CODES, key=ml.SOIL_CODES.get))  # soil_<name> features in code order
+# Features of the farm itself feed both models; location, climate and forecast only the risk model, since
+# recommend_crops has no location.
+FARM_FEATURES = (
+    "ph", "ph_missing", "acidic", "alkaline", "soil_balance", "npk_missing",
+    "irrigation_missing", "irrigation_efficient", "kharif", "rabi", "zaid",
+    *(f"soil_{s}" for s in _SOILS),
+)
+SITE_FEATURES = (
+    "latitude", "latitude_missing", "climate_missing", "frost_days", "rainfall", "dry", "wet",
+    "forecast_missing", "forecast_max_temp", "forecast_min_temp", "forecast_rain",
+)
+
+
+def farm_features(batch: ml.FarmBatch) -> np.ndarray:
+    ph_known = ~np.isnan(batch.ph)
+    band = ml.ph_band_batch(batch.ph)
+    cols = [
+        np.where(ph_known, batch.ph - 6.5, 0.0),
+        ~ph_known,
+        band == ml.PH_ACIDIC,
+        band == ml.PH_ALKALINE,
+        ml.score_soil_balance_batch(batch.n, batch.p, batch.k),
+        np.isnan(batch.n) & np.isnan(batch.p) & np.isnan(batch.k),
+        batch.irrigation == ml.IRRIGATION_MISSING,
+        batch.irrigation == ml.IRRIGATION_EFFICIENT,
+        *(batch.season == code for code in (1, 2, 3)),
+        *(batch.soil_type == code for code in range(1, len(_SOILS) + 1)),
+    ]
+    return np.column_stack(cols).astype(np.float64)
+
+
+def site_features(batch: ml.FarmBatch) -> np.ndarray:
+    lat_known = ~np.isnan(batch.latitude)
+    has_cell = ~np.isnan(batch.rainfall_mm)
+    has_forecast = ~np.isnan(batch.forecast_max_temp_c)
+    rainfall = np.where(has_cell, batch.rainfall_mm, 0.0)
+    cols = [
+        np.where(lat_known, batch.latitude - 22.0, 0.0),
+        ~lat_known,
+        ~has_cell,
+        np.where(has_cell, batch.frost_days, 0.0),
+        rainfall / 1000.0,
+        has_cell & (rainfall < ml.DRY_RAINFALL_MM),
+        has_cell & (rainfall > ml.WET_RAINFALL_MM),
+        ~has_forecast,
+        np.where(has_forecast, batch.forecast_max_temp_c - 35.0, 0.0),
+        np.where(has_forecast, batch.forecast_min_temp_c, 0.0),
+        np.where(has_forecast, batch.forecast_rain_mm, 0.0),
+    ]
+    return np.column_stack(cols).astype(np.float64)
+
+
+def farm_feature_row(ctx: ml.FarmContext) -> list[float]:
+    # farm_features for a single farm, value for value.
+    band = ml._ph_band(ctx.ph)
+    irrigation = ml._irrigation_code(ctx.irrigation_type)
+    seasons = [0.0, 0.0, 0.0]
+    season = ml._season_code(ctx.season)
+    if 1 <= season <= 3:
+        seasons[season - 1] = 1.0
+    soils = [0.0] * len(_SOILS)
+    soil = ml._soil_code(ctx.soil_type)
+    if 1 <= soil <= len(_SOILS):
+        soils[soil - 1] = 1.0
+    return [
+        0.0 if ctx.ph is None else float(ctx.ph) - 6.5,
+        float(ctx.ph is None),
+        float(band == ml.PH_ACIDIC),
+        float(band == ml.PH_ALKALINE),
+        ml._score_soil_balance(ctx.n, ctx.p, ctx.k),
+        float(ctx.n is None and ctx.p is None and ctx.k is None),
+        float(irrigation == ml.IRRIGATION_MISSING),
+        float(irrigation == ml.IRRIGATION_EFFICIENT),
+        *seasons,
+        *soils,
+    ]
+
+
+def site_feature_row(latitude: Optional[float], cell, forecast: Optional[ml.ForecastFeatures]) -> list[float]:
+    # site_features for a single farm; cell is climate.lookup's result for its location.
+    rainfall = 0.0 if cell is None else float(cell.rainfall_mm)
+    return [
+        0.0 if latitude is None else float(latitude) - 22.0,
+        float(latitude is None),
+        float(cell is None),
+        0.0 if cell is None else float(cell.frost_days),
+        rainfall / 1000.0,
+        float(cell is not None and rainfall < ml.DRY_RAINFALL_MM),
+        float(cell is not None and rainfall > ml.WET_RAINFALL_MM),
+        float(forecast is None),
+        0.0 if forecast is None else float(forecast.max_temp_c) - 35.0,
+        0.0 if forecast is None else float(forecast.min_temp_c),
+        0.0 if forecast is None else float(forecast.rain_mm),
+    ]
+
+
+def _sigmoid(z: np.ndarray) -> np.ndarray:
+    # The tanh form cannot overflow, so no errstate guard is needed on the per-farm path.
+    return 0.5 + 0.5 * np.tanh(0.5 * z)
+
+
+class TrainedModel:
+    def __init__(self, params: np.ndarray, manifest: dict, *, path: Optional[Path] = None) -> None:
+        if tuple(manifest["farm_features"]) != FARM_FEATURES or tuple(manifest["site_features"]) != SITE_FEATURES:
+            raise ValueError(f"Model {manifest['version']} was trained on other features; retrain it")
+        # Plain ndarray views of the mapping: the same shared pages without np.memmap's per-operation overhead.
+        params = params.view(np.ndarray)
+        self.params = params
+        self.manifest = manifest
+        self.path = path
+        self.version = manifest["version"]
+        self.crops = tuple(manifest["crops"])
+        arrays = {
+            name: params[offset : offset + int(np.prod(shape))].reshape(shape)
+            for name, (offset, shape) in manifest["arrays"].items()
+        }
+        self.farm_mean, self.farm_scale = arrays["farm_mean"], arrays["farm_scale"]
+        self.site_mean, self.site_scale = arrays["site_mean"], arrays["site_scale"]
+        self.risk_weights, self.risk_bias = arrays["risk_weights"], arrays["risk_bias"]
+        self.crop_weights, self.crop_bias = arrays["crop_weights"], arrays["crop_bias"]
+        # Standardization folded into the weights once, so inference is one product per model on raw features.
+        mean = np.concatenate([self.farm_mean, self.site_mean])
+        scale = np.concatenate([self.farm_scale, self.site_scale])
+        self._risk_w = self.risk_weights / scale
+        self._risk_b = float(self.risk_bias[0] - np.dot(mean / scale, self.risk_weights))
+        self._crop_w = self.crop_weights / self.farm_scale[:, None]
+        self._crop_b = self.crop_bias - (self.farm_mean / self.farm_scale) @ self.crop_weights
+        self._columns: dict[tuple[str, ...], np.ndarray] = {}
+        self._season_columns: dict[tuple, tuple[np.ndarray, np.ndarray]] = {}
+
+    @classmethod
+    def open(cls, directory: Union[str, Path]) -> "TrainedModel":
+        directory = Path(directory)
+        manifest = json.loads((directory / "manifest.json").read_text())
+        if manifest.get("format") != FORMAT:
+            raise ValueError(f"{directory}: unsupported model format {manifest.get('format')}")
+        path = directory / manifest["file"]
+        params = np.load(path, mmap_mode="r")
+        if params.dtype != np.float64 or params.ndim != 1:
+            raise ValueError(f"{path}: expected a 1-D float64 array")
+        return cls(params, manifest, path=path)
+
+    # einsum rather than a BLAS product: each row sums in the same order whatever the batch size, so a farm scored
+    # alone and inside a batch gets identical results.
+    def risk_probability(self, batch: ml.FarmBatch) -> np.ndarray:
+        x = np.hstack([farm_features(batch), site_features(batch)])
+        return _sigmoid(np.einsum("ij,j->i", x, self._risk_w) + self._risk_b)
+
+    def crop_probability(self, batch: ml.FarmBatch) -> np.ndarray:
+        # (farms, self.crops): probability that the crop succeeds on the farm.
+        return _sigmoid(np.einsum("ij,jk->ik", farm_features(batch), self._crop_w) + self._crop_b)
+
+    def risk_probability_one(self, ctx: ml.FarmContext, latitude: Optional[float], cell, forecast) -> float:
+        # risk_probability for one farm without building a FarmBatch: the same operations on a one-row array.
+        x = np.array([farm_feature_row(ctx) + site_feature_row(latitude, cell, forecast)])
+        return float(_sigmoid(np.einsum("ij,j->i", x, self._risk_w) + self._risk_b)[0])
+
+    def crop_probability_one(self, ctx: ml.FarmContext) -> np.ndarray:
+        return _sigmoid(np.einsum("ij,jk->ik", np.array([farm_feature_row(ctx)]), self._crop_w) + self._crop_b)[0]
+
+    def crop_columns(self, names: Sequence[str]) -> np.ndarray:
+        # For each catalog crop, its column in crop_probability, or -1 where the model has not learned it.
+        key = tuple(names)
+        columns = self._columns.get(key)
+        if columns is None:
+            index = {name: i for i, name in enumerate(self.crops)}
+            columns = self._columns[key] = np.array([index.get(name, -1) for name in key], dtype=np.intp)
+        return columns
+
+    def season_columns(self, catalog: ml.CropCatalog, season: int) -> tuple[np.ndarray, np.ndarray]:
+        # (positions in the season's table, crop_probability columns) of the learned crops of that season.
+        key = (catalog.names, season)
+        found = self._season_columns.get(key)
+        if found is None:
+            learned = self.crop_columns(catalog.names)[catalog.tables[season].crops]
+            known = np.flatnonzero(learned >= 0)
+            found = self._season_columns[key] = (known, learned[known])
+        return found
+
+    def stats(self) -> dict:
+        return {
+            "path": str(self.path) if self.path else None,
+            "trained_at": self.manifest.get("trained_at"),
+            "rows": self.manifest.get("rows"),
+            "crops": len(self.crops),
+            "holdout": self.manifest.get("holdout"),
+        }
+
+
+@lru_cache(maxsize=1)
+def get_model() -> Optional[TrainedModel]:
+    # Opened once per process, on first use; None without an artifact.
+    if not (MODEL_DIR / "manifest.json").exists():
+        return None
+    started = time.perf_counter()
+    model = TrainedModel.open(MODEL_DIR)
+    logger.info("Loaded model %s in %.1f ms", model.version, (time.perf_counter() - started) * 1e3)
+    return model
+
+
+def reload_model() -> Optional[TrainedModel]:
+    get_model.cache_clear()
+    return get_model()
+
+
+# ---------------------------------------------------------------------------
+# Training.
+# ---------------------------------------------------------------------------
+
+
+def load_outcomes(db: sqlite3.Connection) -> tuple[ml.FarmBatch, np.ndarray, np.ndarray, np.ndarray]:
+    # (farms, grown crop names, crop_success, loss) for every labelled outcome.
+    rows = db.execute("SELECT * FROM farm_outcomes ORDER BY id").fetchall()
+    forecasts = [
+        None
+        if r["forecast_max_temp_c"] is None
+        else ml.ForecastFeatures(r["forecast_max_temp_c"], r["forecast_min_temp_c"], r["forecast_rain_mm"])
+        for r in rows
+    ]
+    batch = ml.FarmBatch.from_contexts(
+        [ml.FarmContext.from_row(r) for r in rows], [r["latitude"] for r in rows], [r["longitude"] for r in rows], forecasts
+    )
+    return (
+        batch,
+        np.array([r["crop"] for r in rows], dtype=object),
+        np.array([r["crop_success"] for r in rows], dtype=np.float64),
+        np.array([r["loss"] for r in rows], dtype=np.float64),
+    )
+
+
+def fit_logistic(x: np.ndarray, y: np.ndarray, *, l2: float = L2, iterations: int = 50) -> tuple[np.ndarray, float]:
+    # Newton's method on the L2-penalized log loss (the intercept is not penalized). Returns (weights, bias).
+    xb = np.hstack([x, np.ones((len(x), 1))])
+    penalty = np.full(xb.shape[1], l2)
+    penalty[-1] = 0.0
+    w = np.zeros(xb.shape[1])
+    for _ in range(iterations):
+        p = _sigmoid(xb @ w)
+        gradient = xb.T @ (p - y) + penalty * w
+        hessian = (xb * (p * (1.0 - p))[:, None]).T @ xb + np.diag(penalty)
+        step = np.linalg.solve(hessian + 1e-9 * np.eye(len(w)), gradient)
+        w -= step
+        if np.max(np.abs(step)) < 1e-8:
+            break
+    return w[:-1], float(w[-1])
+
+
+def log_loss(y: np.ndarray, p: np.ndarray) -> float:
+    p = np.clip(p, 1e-6, 1 - 1e-6)
+    return float(-np.mean(y * np.log(p) + (1 - y) * np.log(1 - p)))
+
+
+def auc(y: np.ndarray, p: np.ndarray) -> float:
+    # Area under the ROC curve from average ranks (Mann-Whitney U), ties counted as half.
+    positives = int(y.sum())
+    negatives = len(y) - positives
+    if positives == 0 or negatives == 0:
+        return float("nan")
+    _, inverse, counts = np.unique(p, return_inverse=True, return_counts=True)
+    ends = np.cumsum(counts)
+    ranks = (ends - (counts - 1) / 2.0)[inverse]
+    return float((ranks[y == 1].sum() - positives * (positives + 1) / 2.0) / (positives * negatives))
+
+
+def _standardize(x: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    scale = x.std(axis=0)
+    return x.mean(axis=0), np.where(scale > 0, scale, 1.0)
+
+
+def _subset(batch: ml.FarmBatch, index: np.ndarray) -> ml.FarmBatch:
+    return ml.FarmBatch(**{f: getattr(batch, f)[index] for f in ml.FarmBatch.__dataclass_fields__})
+
+
+def _heuristic_crop_confidence(batch: ml.FarmBatch, crops: np.ndarray, catalog: ml.CropCatalog) -> np.ndarray:
+    # The catalog's confidence for each farm's grown crop, NaN for crops outside the catalog.
+    table = catalog.tables[ml.SEASON_CODES["all"]]
+    codes = {"ph": ml.ph_band_batch(batch.ph), "soil": batch.soil_type, "irrigation": batch.irrigation}
+    conf = catalog.confidence(table, ml.score_soil_balance_batch(batch.n, batch.p, batch.k), codes)
+    index = {name: j for j, name in enumerate(catalog.names)}
+    column = np.array([index.get(c, -1) for c in crops], dtype=np.intp)
+    out = np.full(len(crops), np.nan)
+    known = column >= 0
+    out[known] = conf[np.flatnonzero(known), column[known]]
+    return out
+
+
+def _compare(y: np.ndarray, trained: np.ndarray, heuristic: np.ndarray) -> dict:
+    known = ~np.isnan(heuristic)
+    return {
+        "rows": int(len(y)),
+        "trained": {"log_loss": round(log_loss(y, trained), 4), "auc": round(auc(y, trained), 4)},
+        "heuristic": {"log_loss": round(log_loss(y[known], heuristic[known]), 4), "auc": round(auc(y[known], heuristic[known]), 4)},
+    }
+
+
+def train(
+    db: sqlite3.Connection, *, holdout: float = 0.2, seed: int = 0, catalog: Optional[ml.CropCatalog] = None
+) -> tuple[np.ndarray, dict]:
+    # (packed parameters, manifest) from farm_outcomes. A random holdout share of the rows is kept out of the
+    # fit and used to compare the trained model with the heuristics.
+    catalog = catalog or ml.CATALOG
+    batch, crops, success, loss = load_outcomes(db)
+    if len(crops) < 100:
+        raise ValueError(f"Need at least 100 labelled outcomes to train, found {len(crops)}")
+    order = np.random.default_rng(seed).permutation(len(crops))
+    cut = int(len(crops) * (1.0 - holdout))
+    fit, test = np.sort(order[:cut]), np.sort(order[cut:])
+
+    farm, site = farm_features(batch), site_features(batch)
+    farm_mean, farm_scale = _standardize(farm[fit])
+    site_mean, site_scale = _standardize(site[fit])
+    x_farm = (farm - farm_mean) / farm_scale
+    x_all = np.hstack([x_farm, (site - site_mean) / site_scale])
+    risk_weights, risk_bias = fit_logistic(x_all[fit], loss[fit])
+
+    # One regression per crop over the outcomes where it was grown; catalog crops first, in catalog order.
+    names = sorted(set(crops[fit]), key=lambda c: (catalog.names.index(c) if c in catalog.names else len(catalog.names), c))
+    learned, weights, biases = [], [], []
+    for name in names:
+        rows = fit[crops[fit] == name]
+        labels = success[rows]
+        if len(rows) < MIN_CROP_ROWS or labels.min() == labels.max():
+            continue
+        w, b = fit_logistic(x_farm[rows], labels)
+        learned.append(name)
+        weights.append(w)
+        biases.append(b)
+    crop_weights = np.column_stack(weights) if weights else np.zeros((len(FARM_FEATURES), 0))
+    crop_bias = np.array(biases, dtype=np.float64)
+
+    arrays = {
+        "farm_mean": farm_mean, "farm_scale": farm_scale, "site_mean": site_mean, "site_scale": site_scale,
+        "risk_weights": risk_weights, "risk_bias": np.array([risk_bias]),
+        "crop_weights": crop_weights, "crop_bias": crop_bias,
+    }
+    layout, offset = {}, 0
+    for name, value in arrays.items():
+        layout[name] = (offset, list(value.shape))
+        offset += value.size
+    params = np.concatenate([np.ravel(v) for v in arrays.values()]).astype(np.float64)
+    trained_at = datetime.now(timezone.utc)
+    manifest = {
+        "format": FORMAT,
+        "version": f"trained-{trained_at:%Y%m%dT%H%M%SZ}-{hashlib.sha256(params.tobytes()).hexdigest()[:8]}",
+        "trained_at": trained_at.isoformat(),
+        "rows": int(len(fit)),
+        "l2": L2,
+        "farm_features": list(FARM_FEATURES),
+        "site_features": list(SITE_FEATURES),
+        "crops": learned,
+        "arrays": layout,
+    }
+
+    model = TrainedModel(params, manifest)
+    if len(test):
+        part = _subset(batch, test)
+        risk = _compare(loss[test], model.risk_probability(part), ml.predict_risk_batch(part, backend="heuristic").score)
+        in_model = np.isin(crops[test], learned)
+        crop_rows = test[in_model]
+        probability = model.crop_probability(_subset(batch, crop_rows))
+        column = model.crop_columns(crops[crop_rows])
+        trained = probability[np.arange(len(crop_rows)), column]
+        heuristic = _heuristic_crop_confidence(_subset(batch, crop_rows), crops[crop_rows], catalog)
+        manifest["holdout"] = {"risk": risk, "crop_success": _compare(success[crop_rows], trained, heuristic)}
+    return params, manifest
+
+
+def save(directory: Union[str, Path], params: np.ndarray, manifest: dict) -> Path:
+    # The parameters go to <version>.npy, then manifest.json is replaced, so readers see either model whole.
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    manifest = {**manifest, "file": f"{manifest['version']}.npy"}
+    tmp = directory / f"{manifest['version']}.{os.getpid()}.tmp.npy"
+    np.save(tmp, np.ascontiguousarray(params, dtype=np.float64))
+    os.replace(tmp, directory / manifest["file"])
+    tmp = directory / f"manifest.json.{os.getpid()}.tmp"
+    tmp.write_text(json.dumps(manifest, indent=2))
+    os.replace(tmp, directory / "manifest.json")
+    for entry in directory.glob("*.npy"):
+        if entry.name != manifest["file"]:
+            # Processes still serving the old model keep their mapping; on Windows the delete fails until then.
+            try:
+                entry.unlink()
+            except OSError:
+                pass
+    return directory / manifest["file"]
+
+
+# ---------------------------------------------------------------------------
+# Synthetic outcomes for development and benchmarks: labels drawn from a made-up ground truth with interactions
+# the rule-based score does not model. Not for agronomic use.
+# ---------------------------------------------------------------------------
+
+
+def generate_synthetic_outcomes(db: sqlite3.Connection, n: int, *, seed: int = 0, catalog: Optional[ml.CropCatalog] = None) -> int:
+    catalog = catalog or ml.CATALOG
+    rng = np.random.default_rng(seed)
+
+    def maybe(values: np.ndarray, share: float = 0.1) -> np.ndarray:
+        values = values.astype(object)
+        values[rng.random(n) < share] = None
+        return values
+
+    ph = maybe(np.round(rng.uniform(4.2, 9.2, n), 2), 0.08)
+    nutrients = [maybe(np.round(rng.uniform(lo, hi, n), 1)) for lo, hi in ((5, 150), (2, 80), (5, 120))]
+    seasons = rng.choice(np.array(["Kharif", "Rabi", "Zaid", "All", None], dtype=object), n, p=[0.42, 0.38, 0.12, 0.04, 0.04])
+    irrigation = rng.choice(np.array(["drip", "sprinkler", "canal", "tubewell", None], dtype=object), n, p=[0.12, 0.08, 0.3, 0.3, 0.2])
+    soils = rng.choice(np.array([s.capitalize() for s in _SOILS] + [None], dtype=object), n)
+    lat = np.round(rng.uniform(8.5, 33.5, n), 4)
+    lon = np.round(rng.uniform(69.5, 95.5, n), 4)
+    has_forecast = rng.random(n) < 0.7
+    max_temp = np.round(rng.uniform(22, 46, n), 1)
+    min_temp = np.round(np.minimum(max_temp - 6, rng.uniform(-2, 26, n)), 1)
+    rain = np.round(rng.exponential(20, n), 1)
+
+    batch = ml.FarmBatch.from_contexts(
+        [
+            ml.FarmContext(soils[i], ph[i], nutrients[0][i], nutrients[1][i], nutrients[2][i], seasons[i], irrigation[i])
+            for i in range(n)
+        ]
+    )
+    ph_value = batch.ph
+    balance = ml.score_soil_balance_batch(batch.n, batch.p, batch.k)
+    no_irrigation = batch.irrigation == ml.IRRIGATION_MISSING
+    efficient = batch.irrigation == ml.IRRIGATION_EFFICIENT
+    light_soil = np.isin(batch.soil_type, [ml.SOIL_CODES["sandy"], ml.SOIL_CODES["arid"]])
+    rabi = batch.season == ml.SEASON_CODES["rabi"]
+    kharif = batch.season == ml.SEASON_CODES["kharif"]
+    heat = has_forecast & (max_temp >= 40)
+    logit = (
+        -2.2
+        + 1.1 * ((ph_value < 5.5) | (ph_value > 8.0))
+        + 1.6 * (1.0 - balance)
+        + 0.5 * no_irrigation
+        + 1.2 * (heat & no_irrigation)
+        + 0.4 * heat
+        + 0.9 * (rabi & (lat > 27) & (has_forecast & (min_temp <= 4)))
+        + 1.0 * (kharif & has_forecast & (rain >= 50))
+        + 0.8 * (light_soil & no_irrigation)
+        - 0.3 * efficient
+    )
+    loss = rng.random(n) < _sigmoid(logit)
+
+    # Each farm grows a crop of its season; every crop has its own pH optimum and two favoured soils.
+    crop_rng = np.random.default_rng(12345)
+    optimum = crop_rng.uniform(5.6, 7.6, len(catalog.names))
+    favoured = np.array([crop_rng.choice(len(_SOILS), 2, replace=False) + 1 for _ in catalog.names])
+    crop = np.empty(n, dtype=np.intp)
+    for code, table in enumerate(catalog.tables):
+        rows = np.flatnonzero(batch.season == code)
+        if len(rows):
+            members = table.crops if len(table.crops) else catalog.tables[ml.SEASON_CODES["all"]].crops
+            crop[rows] = rng.choice(members, len(rows))
+    ph_gap = np.where(np.isnan(ph_value), 0.8, ph_value - optimum[crop])
+    soil_match = (batch.soil_type[:, None] == favoured[crop]).any(axis=1)
+    logit = 1.2 - ph_gap**2 + 2.0 * (balance - 0.7) + 0.6 * efficient - 0.5 * no_irrigation + 0.7 * soil_match - 1.3 * loss
+    success = rng.random(n) < _sigmoid(logit)
+
+    now = datetime.now(timezone.utc).isoformat()
+    rows = [
+        (
+            now, catalog.names[crop[i]], seasons[i], soils[i], ph[i], nutrients[0][i], nutrients[1][i], nutrients[2][i],
+            irrigation[i], float(lat[i]), float(lon[i]),
+            *((float(max_temp[i]), float(min_temp[i]), float(rain[i])) if has_forecast[i] else (None, None, None)),
+            int(success[i]), int(loss[i]),
+        )
+        for i in range(n)
+    ]
+    db.executemany(
+        """
+        INSERT INTO farm_outcomes(recorded_at, crop, season, soil_type, ph, nitrogen, phosphorus, potassium,
+          irrigation_type, latitude, longitude, forecast_max_temp_c, forecast_min_temp_c, forecast_rain_mm,
+          crop_success, loss)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        rows,
+    )
+    return n
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    from .db import get_db, init_db
+
+    ap = argparse.ArgumentParser(prog="python -m fastapi_app.model")
+    sub = ap.add_subparsers(dest="command", required=True)
+    p_train = sub.add_parser("train", help="fit on farm_outcomes and write a new artifact")
+    p_train.add_argument("--out", type=Path, default=MODEL_DIR)
+    p_train.add_argument("--holdout", type=float, default=0.2)
+    p_synth = sub.add_parser("synthetic", help="add synthetic labelled outcomes (development only)")
+    p_synth.add_argument("rows", type=int)
+    p_synth.add_argument("--seed", type=int, default=0)
+    sub.add_parser("show", help="print the current artifact's manifest")
+    args = ap.parse_args(argv)
+
+    if args.command == "show":
+        model = get_model()
+        print(json.dumps(model.manifest if model else None, indent=2))
+        return 0
+    init_db()
+    with get_db() as db:
+        if args.command == "synthetic":
+            print(f"added {generate_synthetic_outcomes(db, args.rows, seed=args.seed)} outcomes")
+            return 0
+        started = time.perf_counter()
+        params, manifest = train(db, holdout=args.holdout)
+    path = save(args.out, params, manifest)
+    print(f"trained {manifest['version']} on {manifest['rows']} rows in {time.perf_counter() - started:.1f}s -> {path}")
+    print(json.dumps(manifest.get("holdout"), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
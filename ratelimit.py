@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable
+
+
+class RateLimiter:
+    # Token bucket per key: `rate` requests per `per_seconds`, bursting up to `rate`. Keys are kept in a
+    # bounded LRU; a dropped key simply starts again with a full bucket.
+    def __init__(self, rate: float, per_seconds: float, *, max_keys: int = 100_000) -> None:
+        self.capacity = float(rate)
+        self.refill_per_second = rate / per_seconds
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[Hashable, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def hit(self, key: Hashable) -> float:
+        # Returns 0 if allowed, otherwise the seconds until the next request for this key would be.
+        if self.capacity <= 0:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - last) * self.refill_per_second)
+            if tokens < 1.0:
+                self._buckets[key] = (tokens, now)
+                self._buckets.move_to_end(key)
+                self.rejected += 1
+                return (1.0 - tokens) / self.refill_per_second
+            self._buckets[key] = (tokens - 1.0, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return 0.0
+
+
+# 0 disables a limit.
+login_email_limiter = RateLimiter(float(os.environ.get("KRISHIRAKSHAK_LOGIN_PER_EMAIL_PER_MINUTE", "10")), 60)
+login_ip_limiter = RateLimiter(float(os.environ.get("KRISHIRAKSHAK_LOGIN_PER_IP_PER_MINUTE", "60")), 60)
+register_ip_limiter = RateLimiter(float(os.environ.get("KRISHIRAKSHAK_REGISTER_PER_IP_PER_MINUTE", "10")), 60)
+# New origins per user for the farm proximity endpoints: moving one's own farm and querying again would
+# otherwise narrow other farms' distance buckets down to a point.
+farm_origin_limiter = RateLimiter(float(os.environ.get("KRISHIRAKSHAK_FARM_ORIGINS_PER_DAY", "3")), 86400)
+
+
+def limiter_stats() -> dict:
+    return {
+        "login_email_rejected": login_email_limiter.rejected,
+        "login_ip_rejected": login_ip_limiter.rejected,
+        "register_ip_rejected": register_ip_limiter.rejected,
+        "farm_origin_rejected": farm_origin_limiter.rejected,
+    }
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import re
+from html import escape
+from typing import Any, Callable, Iterator, Optional
+
+# The static shell is split into byte chunks once at import; rendering only fills the slots.
+_SHELL = """<!doctype html>
+<html>
+  <head>
+    <meta charset="utf-8" />
+    <title>KrishiRakshak AI Report</title>
+    <style>
+      body { font-family: Arial, sans-serif; margin: 24px; color: #0b1220; }
+      .brand { display:flex; align-items:center; gap:10px; margin-bottom: 18px; }
+      .logo { width: 40px; height: 40px; border-radius: 10px; background:#0ea371; display:flex; align-items:center; justify-content:center; color:white; font-weight:700; }
+      h2 { margin-top: 20px; }
+      .card { border:1px solid #e6e8ee; border-radius: 12px; padding: 14px; margin-top: 10px; }
+      table { border-collapse: collapse; width: 100%; }
+      td, th { border: 1px solid #e6e8ee; padding: 8px; text-align:left; }
+      .muted { color:#5b6477; }
+    </style>
+  </head>
+  <body>
+    <div class="brand">
+      <div class="logo">KA</div>
+      <div>
+        <div style="font-size:18px;font-weight:800;">KrishiRakshak AI</div>
+        <div class="muted">Smart Agriculture &amp; AgriTech Report • Generated <!--slot:generated_at--></div>
+      </div>
+    </div>
+
+    <h2>Farm Profile</h2>
+    <div class="card"><!--slot:profile--></div>
+
+    <h2>AI Crop Recommendations</h2>
+    <div class="card"><!--slot:recommendations--></div>
+
+    <h2>Crop Risk Prediction</h2>
+    <div class="card"><!--slot:risk--></div>
+
+    <h2>Market Price Insights (sample)</h2>
+    <div class="card"><!--slot:market--></div>
+  </body>
+</html>"""
+
+_PARTS = re.split(r"<!--slot:(\w+)-->", _SHELL)
+_STATIC = tuple(p.encode("utf-8") for p in _PARTS[0::2])
+SLOTS = tuple(_PARTS[1::2])
+
+_PROFILE_LABELS = (
+    ("location_name", "Location"),
+    ("latitude", "Latitude"),
+    ("longitude", "Longitude"),
+    ("soil_type", "Soil type"),
+    ("ph", "pH"),
+    ("nitrogen", "Nitrogen (N)"),
+    ("phosphorus", "Phosphorus (P)"),
+    ("potassium", "Potassium (K)"),
+    ("farm_size_acres", "Farm size (acres)"),
+    ("irrigation_type", "Irrigation"),
+    ("season", "Season"),
+    ("last_updated", "Last updated"),
+)
+
+
+def _e(value: Any) -> str:
+    return escape("" if value is None else str(value))
+
+
+def render_profile(profile: Optional[dict]) -> str:
+    if not profile:
+        return '<div class="muted">No farm profile saved yet.</div>'
+    rows = "".join(f"<tr><th>{label}</th><td>{_e(profile.get(key))}</td></tr>" for key, label in _PROFILE_LABELS)
+    return f"<table><tbody>{rows}</tbody></table>"
+
+
+def render_recommendations(rec: dict) -> str:
+    rows = "".join(
+        f"<tr><td>{_e(c.get('crop'))}</td><td>{float(c.get('confidence') or 0):.2f}</td><td>{_e(c.get('why'))}</td></tr>"
+        for c in rec.get("recommended_crops", [])
+    )
+    return (
+        f'<div class="muted">{_e(rec.get("rationale", ""))}</div>'
+        '<table style="margin-top:10px;"><thead><tr><th>Crop</th><th>Confidence</th><th>Why</th></tr></thead>'
+        f"<tbody>{rows}</tbody></table>"
+    )
+
+
+def render_risk(risk: dict) -> str:
+    score = risk.get("risk_score")
+    score_text = f" ({float(score):.2f})" if score is not None else ""
+    top = ", ".join(_e(t) for t in risk.get("top_risks", []))
+    mitigation = "".join(f"<li>{_e(m)}</li>" for m in risk.get("mitigation", []))
+    return (
+        f"<div><b>Risk level:</b> {_e(risk.get('risk_level'))}{score_text}</div>"
+        f'<div style="margin-top:8px;"><b>Top risks:</b> {top}</div>'
+        f'<div style="margin-top:8px;"><b>Mitigation:</b><ul>{mitigation}</ul></div>'
+    )
+
+
+def _pct(value: Any) -> str:
+    return "—" if value is None else f"{float(value):+.1f}%"
+
+
+def render_market(items: Optional[list[dict]]) -> str:
+    if items is None:
+        return '<div class="muted">Market prices are unavailable right now.</div>'
+    rows = []
+    for i in items:
+        stats = i.get("stats") or {}
+        avg = stats.get("mean_7d")
+        volatility = stats.get("volatility_30d")
+        rows.append(
+            f"<tr><td>{_e(i.get('commodity'))}</td><td>{_e(i.get('market'))}</td>"
+            f"<td>{_e(i.get('price_inr_per_quintal'))}</td><td>{_e(i.get('trend'))}</td>"
+            f"<td>{'—' if avg is None else f'{float(avg):.0f}'}</td><td>{_pct(stats.get('change_30d_pct'))}</td>"
+            f"<td>{'—' if volatility is None else f'{float(volatility):.2f}%'}</td></tr>"
+        )
+    return (
+        "<table><thead><tr><th>Commodity</th><th>Market</th><th>Price (₹/quintal)</th><th>Trend</th>"
+        "<th>7-day avg</th><th>30-day change</th><th>Volatility (30d)</th></tr></thead>"
+        f"<tbody>{''.join(rows)}</tbody></table>"
+    )
+
+
+def render_report(sections: dict[str, Callable[[], str]]) -> Iterator[bytes]:
+    # Each slot's callable runs only when the stream reaches it, so later sections can still be loading.
+    for i, static in enumerate(_STATIC):
+        yield static
+        if i < len(SLOTS):
+            yield sections[SLOTS[i]]().encode("utf-8")
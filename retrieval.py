@@ -0,0 +1,502 @@
+from __future__ import annotations
+
+import json
+import math
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Sequence, Union
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, so run one serving process there
+    fcntl = None
+
+from . import data_sources, ml
+from .chat import normalize
+
+# Local BM25 search over scheme records, crop notes and advisory texts, used by /chat. The index is a directory
+# of immutable segments of .npy arrays, memory-mapped on open; additions write a new segment and a new
+# manifest.json, and serving processes pick the manifest up without a restart. Writers hold an exclusive flock
+# on the directory and readers a shared one while opening, so worker processes never see half a change.
+INDEX_PATH = Path(os.environ.get("KRISHIRAKSHAK_SEARCH_INDEX", Path(__file__).resolve().parent / "search_index"))
+ADVISORY_DIR = Path(os.environ.get("KRISHIRAKSHAK_ADVISORY_DIR", Path(__file__).resolve().parent / "advisories"))
+RELOAD_SECONDS = float(os.environ.get("KRISHIRAKSHAK_SEARCH_RELOAD_SECONDS", "5"))
+# Segments are merged into one once there are more than this many.
+MAX_SEGMENTS = int(os.environ.get("KRISHIRAKSHAK_SEARCH_MAX_SEGMENTS", "8"))
+K1 = 1.2
+B = 0.75
+MAX_TERM_CHARS = 32
+TERM_DTYPE = np.dtype(f"<U{MAX_TERM_CHARS}")
+FORMAT = 1
+
+_TOKEN = re.compile("[\\w\u0900-\u0dff]+")
+_STOPWORDS = frozenset(
+    """
+    a an and any are as at be been but by can do does for from had has have how i if in into is it its me my
+    no not of on or our should so than that the their them then there these they this to under up was we what
+    when where which who why will with you your
+    का की के को में से पर है हैं और या भी तो कि कर क्या कैसे
+    ka ki ke ko me mein se par hai hain aur ya bhi kya kaise
+    """.split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    # Case-folded word tokens without stopwords; a trailing plural "s" is dropped from Latin-script words.
+    out = []
+    for token in _TOKEN.findall(normalize(text)):
+        if token in _STOPWORDS or len(token) > MAX_TERM_CHARS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss") and token.isascii():
+            token = token[:-1]
+        out.append(token)
+    return out
+
+
+@dataclass(frozen=True)
+class Document:
+    key: str  # unique across the index, e.g. "scheme:pmfby"
+    source: str
+    title: str
+    text: str
+    url: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class Hit:
+    document: Document
+    score: float
+
+
+_SEGMENT_FILES = ("terms", "term_offsets", "post_docs", "post_tf", "doc_len", "doc_offsets", "keys")
+
+
+class Segment:
+    # One immutable batch of documents: a sorted term array (binary-searched in place, so opening reads no
+    # vocabulary), postings in CSR layout, document lengths and keys, and a byte store of JSON records.
+    def __init__(self, path: Path, arrays: dict[str, np.ndarray], store: np.ndarray) -> None:
+        self.path = path
+        self.terms = arrays["terms"]
+        self.term_offsets = arrays["term_offsets"]
+        self.post_docs = arrays["post_docs"]
+        self.post_tf = arrays["post_tf"]
+        self.doc_len = arrays["doc_len"]
+        self.doc_offsets = arrays["doc_offsets"]
+        self.keys = arrays["keys"]
+        self._store = store
+
+    def __len__(self) -> int:
+        return len(self.doc_len)
+
+    @classmethod
+    def open(cls, path: Path) -> "Segment":
+        arrays = {name: np.load(path / f"{name}.npy", mmap_mode="r") for name in _SEGMENT_FILES}
+        return cls(path, arrays, np.memmap(path / "docs.bin", dtype=np.uint8, mode="r"))
+
+    @classmethod
+    def write(cls, path: Path, docs: Sequence[Document]) -> "Segment":
+        if not docs:
+            raise ValueError("A segment needs at least one document")
+        term_ids: dict[str, int] = {}
+        post_term: list[int] = []
+        post_doc: list[int] = []
+        post_tf: list[int] = []
+        doc_len = np.zeros(len(docs), dtype=np.uint32)
+        for i, doc in enumerate(docs):
+            counts = Counter(tokenize(f"{doc.title}\n{doc.text}"))
+            doc_len[i] = sum(counts.values())
+            for term, tf in counts.items():
+                post_term.append(term_ids.setdefault(term, len(term_ids)))
+                post_doc.append(i)
+                post_tf.append(min(tf, 65535))
+        records = [json.dumps(asdict(doc), ensure_ascii=False).encode() for doc in docs]
+        doc_offsets = np.zeros(len(docs) + 1, dtype=np.int64)
+        np.cumsum([len(r) for r in records], out=doc_offsets[1:])
+        tmp = _segment_tmp(path)
+        with open(tmp / "docs.bin", "wb") as f:
+            for r in records:
+                f.write(r)
+        cls._save(
+            tmp,
+            term_ids=np.array(post_term, dtype=np.int64),
+            vocab=np.array(list(term_ids), dtype=TERM_DTYPE),
+            docs=np.array(post_doc, dtype=np.uint32),
+            tf=np.array(post_tf, dtype=np.uint16),
+            doc_len=doc_len,
+            doc_offsets=doc_offsets,
+            keys=np.array([doc.key for doc in docs]),
+        )
+        _publish_segment(tmp, path)
+        return cls.open(path)
+
+    @classmethod
+    def merge(cls, path: Path, segments: Sequence["Segment"]) -> "Segment":
+        # Concatenates existing postings and records with shifted document numbers; nothing is re-tokenized.
+        bases = np.cumsum([0] + [len(s) for s in segments])
+        store_bases = np.cumsum([0] + [int(s.doc_offsets[-1]) for s in segments])
+        # Union of the (already sorted) vocabularies; each segment's term numbers map into it by binary search.
+        vocab = np.unique(np.concatenate([np.asarray(s.terms) for s in segments]))
+        term_ids = np.concatenate(
+            [np.repeat(np.searchsorted(vocab, s.terms), np.diff(s.term_offsets)) for s in segments]
+        )
+        tmp = _segment_tmp(path)
+        with open(tmp / "docs.bin", "wb") as f:
+            for s in segments:
+                f.write(memoryview(s._store))
+        cls._save(
+            tmp,
+            term_ids=term_ids.astype(np.int64),
+            vocab=vocab,
+            docs=np.concatenate([s.post_docs + np.uint32(base) for s, base in zip(segments, bases)]),
+            tf=np.concatenate([s.post_tf for s in segments]),
+            doc_len=np.concatenate([s.doc_len for s in segments]),
+            doc_offsets=np.concatenate(
+                [s.doc_offsets[:-1] + base for s, base in zip(segments, store_bases)] + [store_bases[-1:]]
+            ).astype(np.int64),
+            keys=np.concatenate([s.keys for s in segments]),
+        )
+        _publish_segment(tmp, path)
+        return cls.open(path)
+
+    @staticmethod
+    def _save(path: Path, *, term_ids, vocab, docs, tf, doc_len, doc_offsets, keys) -> None:
+        # term_ids index into vocab; postings are written grouped by term in sorted order, then by document.
+        order = np.argsort(vocab)
+        rank = np.empty(len(vocab), dtype=np.int64)
+        rank[order] = np.arange(len(vocab))
+        t = rank[term_ids]
+        by_term = np.lexsort((docs, t))
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(t, minlength=len(vocab)), out=offsets[1:])
+        np.save(path / "terms.npy", vocab[order].astype(TERM_DTYPE))
+        np.save(path / "term_offsets.npy", offsets)
+        np.save(path / "post_docs.npy", docs[by_term])
+        np.save(path / "post_tf.npy", tf[by_term])
+        np.save(path / "doc_len.npy", doc_len)
+        np.save(path / "doc_offsets.npy", doc_offsets)
+        np.save(path / "keys.npy", keys)
+
+    def postings(self, term: str) -> Optional[tuple[np.ndarray, np.ndarray]]:
+        i = int(np.searchsorted(self.terms, term))
+        if i >= len(self.terms) or self.terms[i] != term:
+            return None
+        lo, hi = self.term_offsets[i], self.term_offsets[i + 1]
+        return self.post_docs[lo:hi], self.post_tf[lo:hi]
+
+    def document(self, i: int) -> Document:
+        raw = bytes(self._store[self.doc_offsets[i] : self.doc_offsets[i + 1]])
+        return Document(**json.loads(raw))
+
+
+class SearchIndex:
+    # A snapshot of the segments listed in manifest.json. Scores use collection-wide statistics (document
+    # count, average length, document frequency summed over segments), so splitting documents across
+    # segments never changes a ranking.
+    def __init__(self, path: Path, segments: list[Segment], generation: int) -> None:
+        self.path = path
+        self.segments = segments
+        self.generation = generation
+        self.doc_count = sum(len(s) for s in segments)
+        total_len = sum(int(s.doc_len.sum(dtype=np.int64)) for s in segments)
+        self.avg_len = total_len / self.doc_count if self.doc_count else 0.0
+        # BM25 length normalization per document, fixed for the life of this snapshot.
+        self._norms = [
+            (K1 * (1 - B + B * np.asarray(s.doc_len, dtype=np.float32) / max(self.avg_len, 1e-9))).astype(np.float32)
+            for s in segments
+        ]
+        self._write_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.doc_count
+
+    @classmethod
+    def open(cls, path: Union[str, Path] = INDEX_PATH) -> "SearchIndex":
+        path = Path(path)
+        # Shared lock: a writer cannot remove segments between reading the manifest and mapping them.
+        with _index_lock(path, shared=True):
+            return cls._open_unlocked(path)
+
+    @classmethod
+    def _open_unlocked(cls, path: Path) -> "SearchIndex":
+        manifest = json.loads((path / "manifest.json").read_text())
+        if manifest.get("format") != FORMAT:
+            raise ValueError(f"{path}: unsupported search index format {manifest.get('format')}")
+        return cls(path, [Segment.open(path / name) for name in manifest["segments"]], manifest["generation"])
+
+    @classmethod
+    def build(cls, path: Union[str, Path], docs: Sequence[Document], *, replace: bool = True) -> "SearchIndex":
+        # A fresh index of one segment; replaces whatever the directory held. With replace=False an index
+        # that is already there, e.g. one another worker built meanwhile, is kept.
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        with _index_lock(path):
+            if replace or not (path / "manifest.json").exists():
+                generation = _read_generation(path) + 1
+                name = f"seg-{generation:06d}"
+                Segment.write(path / name, _unique(docs))
+                _write_manifest(path, [name], generation)
+                _remove_unlisted(path, [name])
+        return cls.open(path)
+
+    def contains(self, keys: Sequence[str]) -> np.ndarray:
+        found = np.zeros(len(keys), dtype=bool)
+        for s in self.segments:
+            found |= np.isin(np.array(keys), s.keys)
+        return found
+
+    def add(self, docs: Sequence[Document]) -> "SearchIndex":
+        # Writes documents with new keys as one more segment and returns the new snapshot (this one stays
+        # usable for searches already running). Existing keys are skipped; rebuild to change a document.
+        with self._write_lock, _index_lock(self.path):
+            # Another process may have changed the index since this snapshot; build on the current one.
+            current = self._latest()
+            docs = _unique(docs)
+            known = current.contains([d.key for d in docs]) if docs else []
+            fresh = [d for d, seen in zip(docs, known) if not seen]
+            if not fresh:
+                return current
+            generation = current.generation + 1
+            name = f"seg-{generation:06d}"
+            Segment.write(self.path / name, fresh)
+            names = [s.path.name for s in current.segments] + [name]
+            _write_manifest(self.path, names, generation)
+        index = SearchIndex.open(self.path)
+        return index.compact() if len(index.segments) > MAX_SEGMENTS else index
+
+    def compact(self) -> "SearchIndex":
+        with self._write_lock, _index_lock(self.path):
+            current = self._latest()
+            if len(current.segments) <= 1:
+                return current
+            generation = current.generation + 1
+            name = f"seg-{generation:06d}"
+            Segment.merge(self.path / name, current.segments)
+            _write_manifest(self.path, [name], generation)
+            _remove_unlisted(self.path, [name])
+        return SearchIndex.open(self.path)
+
+    def _latest(self) -> "SearchIndex":
+        # Called under the exclusive lock, hence _open_unlocked rather than open.
+        if _read_generation(self.path) == self.generation:
+            return self
+        return SearchIndex._open_unlocked(self.path)
+
+    def search(self, query: str, k: int = 5) -> list[Hit]:
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not self.doc_count:
+            return []
+        per_segment = [[seg.postings(t) for t in terms] for seg in self.segments]
+        df = [sum(len(p[j][0]) for p in per_segment if p[j] is not None) for j in range(len(terms))]
+        idf = [math.log(1 + (self.doc_count - n + 0.5) / (n + 0.5)) for n in df]
+        candidates: list[tuple[float, int, int]] = []
+        for s, (seg, postings) in enumerate(zip(self.segments, per_segment)):
+            if all(p is None for p in postings):
+                continue
+            scores = np.zeros(len(seg), dtype=np.float32)
+            norm = self._norms[s]
+            for j, p in enumerate(postings):
+                if p is None:
+                    continue
+                docs, tf = p
+                docs = np.asarray(docs, dtype=np.intp)
+                tf = np.asarray(tf, dtype=np.float32)
+                scores[docs] += idf[j] * tf * (K1 + 1) / (tf + norm[docs])
+            # Everything tied with the k-th best stays in, so ties resolve by document order below.
+            kth = np.partition(scores, len(seg) - k)[len(seg) - k] if len(seg) > k else 0.0
+            hit = np.flatnonzero(scores >= kth) if kth > 0 else np.flatnonzero(scores)
+            candidates.extend((float(scores[i]), s, int(i)) for i in hit)
+        candidates.sort(key=lambda c: (-c[0], c[1], c[2]))
+        return [Hit(self.segments[s].document(i), score) for score, s, i in candidates[:k]]
+
+    def size_bytes(self) -> int:
+        return sum(f.stat().st_size for s in self.segments for f in s.path.iterdir())
+
+    def stats(self) -> dict:
+        return {
+            "path": str(self.path),
+            "generation": self.generation,
+            "documents": self.doc_count,
+            "segments": len(self.segments),
+            "terms": sum(len(s.terms) for s in self.segments),
+            "postings": sum(len(s.post_docs) for s in self.segments),
+        }
+
+
+def _unique(docs: Iterable[Document]) -> list[Document]:
+    # Last one wins for repeated keys.
+    return list({doc.key: doc for doc in docs}.values())
+
+
+def _read_generation(path: Path) -> int:
+    try:
+        return int(json.loads((path / "manifest.json").read_text())["generation"])
+    except FileNotFoundError:
+        return 0
+
+
+def _write_manifest(path: Path, segments: list[str], generation: int) -> None:
+    # Written aside and renamed into place, so readers see either the old or the new segment list.
+    tmp = path / f"manifest.json.{os.getpid()}.tmp"
+    tmp.write_text(json.dumps({"format": FORMAT, "generation": generation, "segments": segments}, indent=2))
+    os.replace(tmp, path / "manifest.json")
+
+
+@contextmanager
+def _index_lock(path: Path, *, shared: bool = False) -> Iterator[None]:
+    # flock on the index directory itself. Each call opens its own descriptor, so the lock also excludes other
+    # threads of this process, and it is not re-entrant: code under the exclusive lock uses _open_unlocked.
+    if fcntl is None:
+        yield
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+def _segment_tmp(path: Path) -> Path:
+    # Segments are written under a dot-name that readers never list, then renamed into place.
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True, exist_ok=True)
+    return tmp
+
+
+def _publish_segment(tmp: Path, path: Path) -> None:
+    # A directory of the same name can only be left over from a writer that died before its manifest; nothing
+    # lists it, so it is replaced.
+    if path.exists():
+        shutil.rmtree(path)
+    os.replace(tmp, path)
+
+
+def _remove_unlisted(path: Path, keep: list[str]) -> None:
+    # Called under the exclusive lock, so any temporary segment left here belongs to a writer that died.
+    for entry in path.glob(".seg-*.tmp"):
+        shutil.rmtree(entry, ignore_errors=True)
+    for entry in path.glob("seg-*"):
+        if entry.name not in keep:
+            # Processes may still have the old files mapped; on Windows the delete then fails, and the next
+            # rebuild tries again.
+            shutil.rmtree(entry, ignore_errors=True)
+
+
+def load_advisories(directory: Union[str, Path] = ADVISORY_DIR) -> list[Document]:
+    # One document per paragraph of each .md/.txt file; a leading "# " line is the title of all of them.
+    docs = []
+    for file in sorted(Path(directory).glob("*")):
+        if file.suffix not in (".md", ".txt"):
+            continue
+        text = file.read_text(encoding="utf-8")
+        title = file.stem.replace("_", " ").capitalize()
+        if text.startswith("# "):
+            first, _, text = text.partition("\n")
+            title = first[2:].strip()
+        paragraphs = [" ".join(p.split()) for p in re.split(r"\n\s*\n", text) if p.strip()]
+        docs += [Document(f"advisory:{file.stem}:{i}", "advisory", title, p) for i, p in enumerate(paragraphs)]
+    return docs
+
+
+def default_documents() -> list[Document]:
+    docs = []
+    for s in data_sources.get_mock_schemes():
+        slug = re.sub(r"[^a-z0-9]+", "-", s["title"].lower()).strip("-")
+        text = f"Eligibility: {s['eligibility']} Benefits: {s['benefits']} How to apply: {s['how_to_apply']}"
+        docs.append(Document(f"scheme:{slug}", "scheme", s["title"], text, s.get("official_link")))
+    for c in ml.crop_notes():
+        docs.append(Document(f"crop:{c['crop'].lower()}", "crop", f"{c['crop']} ({c['season']})", c["why"]))
+    if ADVISORY_DIR.is_dir():
+        docs += load_advisories(ADVISORY_DIR)
+    return docs
+
+
+class _ReloadingIndex:
+    # Current snapshot of the index at INDEX_PATH, re-opened when manifest.json changes. Built from the
+    # default documents on first use if the directory has no index yet.
+    def __init__(self, path: Path, interval: float) -> None:
+        self.path = path
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._index: Optional[SearchIndex] = None
+        self._stamp: Optional[int] = None
+        self._checked = 0.0
+        self.reloads = 0
+
+    def get(self) -> SearchIndex:
+        now = time.monotonic()
+        if self._index is None or now - self._checked >= self.interval:
+            with self._lock:
+                if self._index is None or now - self._checked >= self.interval:
+                    self._checked = now
+                    self._refresh()
+        return self._index
+
+    def _refresh(self) -> None:
+        manifest = self.path / "manifest.json"
+        if not manifest.exists():
+            # Every worker may get here at once on a fresh directory; the first build wins, the rest open it.
+            SearchIndex.build(self.path, default_documents(), replace=False)
+        stamp = manifest.stat().st_mtime_ns
+        if stamp == self._stamp and self._index is not None:
+            return
+        if self._index is not None:
+            self.reloads += 1
+        self._index, self._stamp = SearchIndex.open(self.path), stamp
+
+    def stats(self) -> dict:
+        return {**(self._index.stats() if self._index else {}), "reloads": self.reloads}
+
+
+_current = _ReloadingIndex(INDEX_PATH, RELOAD_SECONDS)
+
+
+def get_index() -> SearchIndex:
+    return _current.get()
+
+
+def search(query: str, k: int = 5) -> list[Hit]:
+    return get_index().search(query, k)
+
+
+def stats() -> dict:
+    return _current.stats()
+
+
+if __name__ == "__main__":
+    # python -m fastapi_app.retrieval build              -> rebuild from schemes, crop notes and advisories
+    # python -m fastapi_app.retrieval add FILE...        -> add .md/.txt advisories or .jsonl Document records
+    # python -m fastapi_app.retrieval search QUERY...
+    command, args = (sys.argv[1], sys.argv[2:]) if len(sys.argv) > 1 else ("build", [])
+    if command == "build":
+        started = time.perf_counter()
+        index = SearchIndex.build(INDEX_PATH, default_documents())
+        print(f"{INDEX_PATH}: {len(index):,} documents in {time.perf_counter() - started:.2f}s")
+    elif command == "add":
+        docs = []
+        for name in args:
+            file = Path(name)
+            if file.suffix == ".jsonl":
+                docs += [Document(**json.loads(line)) for line in file.read_text(encoding="utf-8").splitlines() if line.strip()]
+            else:
+                docs += [d for d in load_advisories(file.parent) if d.key.startswith(f"advisory:{file.stem}:")]
+        index = get_index()
+        before = len(index)
+        index = index.add(docs)
+        print(f"{INDEX_PATH}: added {len(index) - before:,} documents, {len(index):,} in {len(index.segments)} segments")
+    elif command == "search":
+        for hit in search(" ".join(args)):
+            print(f"{hit.score:6.2f}  [{hit.document.source}] {hit.document.title}: {hit.document.text[:100]}")
+    else:
+        sys.exit(f"unknown command {command!r}")
@@ -1,9 +1,14 @@
 from __future__ import annotations
 
+import os
 from typing import Literal, Optional
 
 from pydantic import BaseModel, Field
 
+# Farms per batch scoring request. Each list is capped here so an oversized body fails validation before it is
+# materialized; main.py also caps farm_ids and farms combined.
+BATCH_MAX_FARMS = int(os.environ.get("KRISHIRAKSHAK_BATCH_MAX_FARMS", "500"))
+
 
 class RegisterRequest(BaseModel):
     email: str = Field(min_length=5, max_length=254)
@@ -16,6 +21,11 @@ class LoginRequest(BaseModel):
     password: str
 
 
+class ChangePasswordRequest(BaseModel):
+    current_password: str
+    new_password: str = Field(min_length=6, max_length=200)
+
+
 class AuthResponse(BaseModel):
     access_token: str
     token_type: Literal["bearer"] = "bearer"
@@ -39,9 +49,30 @@ class SoilFarmDetails(BaseModel):
     season: Optional[Literal["Kharif", "Rabi", "Zaid", "All"]] = None
 
 
+class FarmProfileInput(BaseModel):
+    location: Optional[LocationInput] = None
+    soil_farm: Optional[SoilFarmDetails] = None
+
+
+class BulkProfileRequest(BaseModel):
+    items: list[FarmProfileInput] = Field(min_length=1, max_length=100)
+
+
+class BatchFarmInput(SoilFarmDetails):
+    ref: Optional[str] = Field(default=None, max_length=100)
+    latitude: Optional[float] = Field(default=None, ge=-90, le=90)
+    longitude: Optional[float] = Field(default=None, ge=-180, le=180)
+
+
+class BatchScoreRequest(BaseModel):
+    farm_ids: list[int] = Field(default_factory=list, max_length=BATCH_MAX_FARMS)
+    farms: list[BatchFarmInput] = Field(default_factory=list, max_length=BATCH_MAX_FARMS)
+
+
 class RecommendationResponse(BaseModel):
     recommended_crops: list[dict]
     rationale: str
+    scored_at: Optional[str] = None  # when these results were computed (UTC, ISO 8601)
 
 
 class RiskPredictionResponse(BaseModel):
@@ -49,6 +80,14 @@ class RiskPredictionResponse(BaseModel):
     risk_level: Literal["Low", "Medium", "High"]
     top_risks: list[str]
     mitigation: list[str]
+    scored_at: Optional[str] = None
+
+
+class SummaryResponse(BaseModel):
+    profile: dict
+    recommendation: RecommendationResponse
+    risk: RiskPredictionResponse
+    market_prices: list[dict]
 
 
 class MarketPriceInsight(BaseModel):
@@ -74,4 +113,5 @@ class ChatRequest(BaseModel):
 class ChatResponse(BaseModel):
     reply: str
     intents: list[str] = []
+    passages: list[dict] = []  # supporting passages from the local search index, best first
 
@@ -0,0 +1,325 @@
+from __future__ import annotations
+
+import dataclasses
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, ContextManager, Optional, Sequence
+
+from .db import get_db
+from .ml import FarmBatch, FarmContext, ForecastFeatures, model_version, predict_risk_batch, recommend_crops_batch
+from .weather import WeatherCache, weather_cache
+
+# In-process scoring off the request path. The queue lives in score_jobs (one row per user, so enqueues
+# coalesce), results in farm_scores; reads fall back to inline scoring while a user's row is missing or stale.
+SCORER_WORKERS = int(os.environ.get("KRISHIRAKSHAK_SCORER_WORKERS", "2"))  # 0 disables the background workers
+SCORER_BATCH = int(os.environ.get("KRISHIRAKSHAK_SCORER_BATCH", "256"))
+SCORER_POLL_SECONDS = float(os.environ.get("KRISHIRAKSHAK_SCORER_POLL_SECONDS", "5"))
+# A claimed job whose worker died is picked up again after this long.
+SCORER_LEASE_SECONDS = float(os.environ.get("KRISHIRAKSHAK_SCORER_LEASE_SECONDS", "300"))
+SCORER_MAX_ATTEMPTS = int(os.environ.get("KRISHIRAKSHAK_SCORER_MAX_ATTEMPTS", "5"))
+# Daily full re-score (new forecasts, model changes), "HH:MM" in UTC; empty disables. 20:30 UTC is 02:00 IST.
+SWEEP_AT = os.environ.get("KRISHIRAKSHAK_SCORER_SWEEP_AT", "20:30")
+# Stored scores older than this are not served; a little over a day so a late sweep doesn't cause misses. Stored
+# risk is only served while the forecast it was computed from is still the current one (risk_is_current).
+SCORE_MAX_AGE_SECONDS = float(os.environ.get("KRISHIRAKSHAK_SCORE_MAX_AGE_SECONDS", str(26 * 3600)))
+
+logger = logging.getLogger(__name__)
+
+_ENQUEUE_CONFLICT = "ON CONFLICT(user_id) DO UPDATE SET generation = generation + 1, reason = excluded.reason"
+
+
+def _utc_now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def enqueue(db: sqlite3.Connection, user_id: int, reason: str) -> None:
+    # A pending job keeps its place in the queue; a claimed one is re-run once its current pass completes.
+    db.execute(
+        f"INSERT INTO score_jobs(user_id, reason, enqueued_at) VALUES (?, ?, ?) {_ENQUEUE_CONFLICT}",
+        (user_id, reason, _utc_now()),
+    )
+
+
+def enqueue_all(db: sqlite3.Connection, reason: str, *, outdated_only: bool = False) -> int:
+    # Every user with a farm profile, or only those without a score from the current model_version().
+    where = "WHERE s.user_id IS NULL OR s.model_version != ?" if outdated_only else "WHERE 1"
+    cur = db.execute(
+        f"""
+        INSERT INTO score_jobs(user_id, reason, enqueued_at)
+        SELECT p.user_id, ?, ? FROM farm_profiles p LEFT JOIN farm_scores s ON s.user_id = p.user_id {where}
+        {_ENQUEUE_CONFLICT}
+        """,
+        (reason, _utc_now(), *((model_version(),) if outdated_only else ())),
+    )
+    return cur.rowcount
+
+
+def claim(db: sqlite3.Connection, limit: int, lease_seconds: float = SCORER_LEASE_SECONDS) -> list[tuple[int, int]]:
+    # (user_id, generation) pairs, oldest first. Runs as one write, so concurrent workers never share a job.
+    now = time.time()
+    rows = db.execute(
+        """
+        UPDATE score_jobs SET claimed_at = ?, attempts = attempts + 1
+        WHERE user_id IN (
+          SELECT user_id FROM score_jobs WHERE claimed_at IS NULL OR claimed_at < ? ORDER BY enqueued_at LIMIT ?
+        )
+        RETURNING user_id, generation
+        """,
+        (now, now - lease_seconds, limit),
+    ).fetchall()
+    return [(row[0], row[1]) for row in rows]
+
+
+def complete(db: sqlite3.Connection, jobs: Sequence[tuple[int, int]]) -> None:
+    # Jobs re-enqueued while they were being scored have a newer generation: release them instead.
+    db.executemany("DELETE FROM score_jobs WHERE user_id = ? AND generation = ?", jobs)
+    db.executemany("UPDATE score_jobs SET claimed_at = NULL, attempts = 0 WHERE user_id = ?", [(u,) for u, _ in jobs])
+
+
+def fail(db: sqlite3.Connection, jobs: Sequence[tuple[int, int]], error: str) -> None:
+    db.executemany("UPDATE score_jobs SET claimed_at = NULL, last_error = ? WHERE user_id = ?", [(error, u) for u, _ in jobs])
+    db.executemany("DELETE FROM score_jobs WHERE user_id = ? AND attempts >= ?", [(u, SCORER_MAX_ATTEMPTS) for u, _ in jobs])
+
+
+def score_profiles(rows: Sequence[sqlite3.Row], weather: WeatherCache) -> list[tuple]:
+    # farm_scores rows for a batch of farm_profiles rows: one forecast lookup and one vectorized pass.
+    ctxs = [FarmContext.from_row(row) for row in rows]
+    lats = [row["latitude"] for row in rows]
+    lons = [row["longitude"] for row in rows]
+    forecasts = weather.features_many(lats, lons)
+    batch = FarmBatch.from_contexts(ctxs, lats, lons, forecasts)
+    version = model_version()
+    recs = recommend_crops_batch(batch)
+    risks = predict_risk_batch(batch)
+    now = _utc_now()
+    out = []
+    for i, row in enumerate(rows):
+        crops, rationale = recs.row(i)
+        score, level, top, mitigation = risks.row(i)
+        out.append(
+            (
+                row["user_id"],
+                version,
+                row["last_updated"],
+                json.dumps({"recommended_crops": crops, "rationale": rationale}),
+                json.dumps({"risk_score": score, "risk_level": level, "top_risks": top, "mitigation": mitigation}),
+                json.dumps(dataclasses.asdict(forecasts[i])) if forecasts[i] is not None else None,
+                now,
+            )
+        )
+    return out
+
+
+def save_scores(db: sqlite3.Connection, rows: Sequence[tuple]) -> None:
+    # A pass that read an older profile (e.g. after a lease expired) never overwrites a newer result.
+    db.executemany(
+        """
+        INSERT INTO farm_scores(user_id, model_version, profile_updated, recommendation, risk, forecast, computed_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(user_id) DO UPDATE SET
+          model_version = excluded.model_version, profile_updated = excluded.profile_updated,
+          recommendation = excluded.recommendation, risk = excluded.risk, forecast = excluded.forecast,
+          computed_at = excluded.computed_at
+        WHERE excluded.profile_updated >= farm_scores.profile_updated
+        """,
+        rows,
+    )
+
+
+def fresh_scores(
+    db: sqlite3.Connection, user_id: int, profile_updated: str, *, max_age_seconds: float = SCORE_MAX_AGE_SECONDS
+) -> Optional[dict]:
+    # Stored results if they match the current profile and model and are recent enough, else None.
+    cutoff = (datetime.now(timezone.utc) - timedelta(seconds=max_age_seconds)).isoformat()
+    row = db.execute(
+        """
+        SELECT recommendation, risk, computed_at, forecast FROM farm_scores
+        WHERE user_id = ? AND model_version = ? AND profile_updated = ? AND computed_at >= ?
+        """,
+        (user_id, model_version(), profile_updated, cutoff),
+    ).fetchone()
+    if row is None:
+        return None
+    return {
+        "recommendation": json.loads(row[0]),
+        "risk": json.loads(row[1]),
+        "computed_at": row[2],
+        "forecast": json.loads(row[3]) if row[3] else None,
+    }
+
+
+def risk_is_current(stored: dict, forecast: Optional[ForecastFeatures]) -> bool:
+    # Forecasts are re-issued hourly while recommendations do not depend on them, so a stored risk goes stale
+    # on its own schedule: it stands only while the forecast features it used are the current ones.
+    return stored["forecast"] == (dataclasses.asdict(forecast) if forecast is not None else None)
+
+
+def queue_stats(db: sqlite3.Connection) -> dict:
+    row = db.execute("SELECT COUNT(*), COUNT(claimed_at), MIN(enqueued_at) FROM score_jobs").fetchone()
+    return {"depth": row[0], "claimed": row[1], "oldest_enqueued_at": row[2]}
+
+
+def seconds_until(at: str, now: Optional[datetime] = None) -> float:
+    # Seconds from now to the next "HH:MM" UTC.
+    now = now or datetime.now(timezone.utc)
+    hour, minute = (int(x) for x in at.split(":"))
+    target = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if target <= now:
+        target += timedelta(days=1)
+    return (target - now).total_seconds()
+
+
+class ScoreScheduler:
+    # Worker threads drain score_jobs in batches; notify() wakes them right after an enqueue, otherwise they
+    # poll. A sweeper thread enqueues everyone once a day. Nothing is lost on restart: the queue is the table.
+    def __init__(
+        self,
+        *,
+        workers: int = SCORER_WORKERS,
+        batch_size: int = SCORER_BATCH,
+        poll_seconds: float = SCORER_POLL_SECONDS,
+        lease_seconds: float = SCORER_LEASE_SECONDS,
+        sweep_at: str = SWEEP_AT,
+        weather: WeatherCache = weather_cache,
+        connect: Callable[[], ContextManager[sqlite3.Connection]] = get_db,
+    ) -> None:
+        self.workers = max(0, workers)
+        self.batch_size = max(1, batch_size)
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self.sweep_at = sweep_at
+        self.weather = weather
+        self._connect = connect
+        self._threads: list[threading.Thread] = []
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.scored = 0
+        self.failed = 0
+        self.last_batch_seconds = 0.0
+        self.last_sweep_at: Optional[str] = None
+        self.last_sweep_jobs = 0
+
+    def start(self) -> None:
+        if self._threads or not self.workers:
+            return
+        # Pick up users never scored, or scored by a previous model version.
+        with self._connect() as db:
+            if enqueue_all(db, "model", outdated_only=True):
+                self._wake.set()
+        self._stop.clear()
+        for i in range(self.workers):
+            self._threads.append(threading.Thread(target=self._work, name=f"krishi-scorer-{i}", daemon=True))
+        if self.sweep_at:
+            self._threads.append(threading.Thread(target=self._sweep, name="krishi-scorer-sweep", daemon=True))
+        for t in self._threads:
+            t.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def notify(self) -> None:
+        self._wake.set()
+
+    def run_once(self) -> int:
+        # Claims and scores one batch in the calling thread; returns the number of jobs claimed.
+        with self._connect() as db:
+            jobs = claim(db, self.batch_size, self.lease_seconds)
+        if not jobs:
+            return 0
+        started = time.perf_counter()
+        try:
+            # Read, score and write in separate short transactions: the forecast fetch can be slow and must
+            # not hold SQLite's write lock.
+            ids = [u for u, _ in jobs]
+            with self._connect() as db:
+                profiles = db.execute(
+                    f"SELECT * FROM farm_profiles WHERE user_id IN ({', '.join('?' * len(ids))})", ids
+                ).fetchall()
+            rows = score_profiles(profiles, self.weather) if profiles else []
+            with self._connect() as db:
+                save_scores(db, rows)
+                complete(db, jobs)
+        except Exception as exc:
+            with self._connect() as db:
+                fail(db, jobs, repr(exc)[:500])
+            with self._lock:
+                self.failed += len(jobs)
+            raise
+        with self._lock:
+            self.batches += 1
+            self.scored += len(rows)
+            self.last_batch_seconds = time.perf_counter() - started
+        return len(jobs)
+
+    def run_pending(self) -> int:
+        total = 0
+        while n := self.run_once():
+            total += n
+        return total
+
+    def sweep(self, reason: str = "sweep") -> int:
+        with self._connect() as db:
+            n = enqueue_all(db, reason)
+        with self._lock:
+            self.last_sweep_at = _utc_now()
+            self.last_sweep_jobs = n
+        self.notify()
+        return n
+
+    def _work(self) -> None:
+        while not self._stop.is_set():
+            try:
+                claimed = self.run_once()
+            except Exception:
+                logger.exception("Scoring batch failed")
+                claimed = 0
+            if not claimed:
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+
+    def _sweep(self) -> None:
+        while not self._stop.wait(seconds_until(self.sweep_at)):
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception("Nightly score sweep failed")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "running": sum(t.is_alive() for t in self._threads),
+                "model_version": model_version(),
+                "batches": self.batches,
+                "scored": self.scored,
+                "failed": self.failed,
+                "last_batch_seconds": round(self.last_batch_seconds, 6),
+                "sweep_at": self.sweep_at or None,
+                "last_sweep_at": self.last_sweep_at,
+                "last_sweep_jobs": self.last_sweep_jobs,
+            }
+
+
+scheduler = ScoreScheduler()
+
+
+if __name__ == "__main__":
+    # python -m fastapi_app.scoring [--all]   -> drain the queue once (after enqueuing everyone with --all)
+    from .db import init_db
+
+    init_db()
+    if "--all" in sys.argv[1:]:
+        print(f"enqueued {scheduler.sweep('manual')} users")
+    print(f"scored {scheduler.run_pending()} jobs")
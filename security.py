@@ -4,11 +4,18 @@ import base64
 import hashlib
 import hmac
 import os
+import sqlite3
+import threading
 import time
 from dataclasses import dataclass
+from functools import cached_property, lru_cache
 from typing import Any, Optional
 
 import jwt
+from jwt.algorithms import HMACAlgorithm
+
+from .cache import TTLCache
+from .metrics import PASSWORD_HASH_SECONDS
 
 
 def _b64(b: bytes) -> str:
@@ -20,50 +27,198 @@ def _unb64(s: str) -> bytes:
     return base64.urlsafe_b64decode((s + pad).encode("utf-8"))
 
 
-def hash_password(password: str, *, salt: Optional[bytes] = None, iterations: int = 210_000) -> tuple[str, str]:
+# Stored per user, so raising the cost or switching digest takes effect on each user's next login.
+_PBKDF2_DIGESTS = {"pbkdf2_sha256": "sha256", "pbkdf2_sha512": "sha512"}
+PASSWORD_ALGORITHM = os.environ.get("KRISHIRAKSHAK_PASSWORD_ALGORITHM", "pbkdf2_sha256")
+PASSWORD_ITERATIONS = int(os.environ.get("KRISHIRAKSHAK_PBKDF2_ITERATIONS", "210000"))
+
+
+def _pbkdf2(password: str, salt: bytes, iterations: int, algorithm: str) -> bytes:
+    try:
+        digest = _PBKDF2_DIGESTS[algorithm]
+    except KeyError:
+        raise ValueError(f"Unsupported password algorithm: {algorithm}")
+    started = time.perf_counter()
+    dk = hashlib.pbkdf2_hmac(digest, password.encode("utf-8"), salt, iterations, dklen=32)
+    PASSWORD_HASH_SECONDS.observe(time.perf_counter() - started, algorithm)
+    return dk
+
+
+def hash_password(
+    password: str, *, salt: Optional[bytes] = None, iterations: Optional[int] = None, algorithm: Optional[str] = None
+) -> tuple[str, str]:
     if salt is None:
         salt = os.urandom(16)
-    dk = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations, dklen=32)
+    dk = _pbkdf2(password, salt, iterations or PASSWORD_ITERATIONS, algorithm or PASSWORD_ALGORITHM)
     return _b64(dk), _b64(salt)
 
 
-def verify_password(password: str, password_hash_b64: str, salt_b64: str, *, iterations: int = 210_000) -> bool:
+def verify_password(
+    password: str, password_hash_b64: str, salt_b64: str, *, iterations: int = 210_000, algorithm: str = "pbkdf2_sha256"
+) -> bool:
     expected = _unb64(password_hash_b64)
     salt = _unb64(salt_b64)
-    dk = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations, dklen=32)
+    dk = _pbkdf2(password, salt, iterations, algorithm)
     return hmac.compare_digest(dk, expected)
 
 
+def password_needs_rehash(algorithm: str, iterations: int) -> bool:
+    return algorithm != PASSWORD_ALGORITHM or iterations != PASSWORD_ITERATIONS
+
+
 @dataclass(frozen=True)
 class JwtConfig:
     secret: str
     issuer: str = "krishirakshak-ai"
     access_ttl_seconds: int = 60 * 60 * 8  # 8 hours
 
+    @cached_property
+    def key(self) -> bytes:
+        # Prepared once so encode/decode don't re-derive the HMAC key from the secret string per call.
+        return HMACAlgorithm(HMACAlgorithm.SHA256).prepare_key(self.secret)
+
 
+@lru_cache(maxsize=1)
 def jwt_config() -> JwtConfig:
+    # Resolved once per process; call reload_jwt_config() after changing the environment (e.g. key rotation).
     secret = os.environ.get("KRISHIRAKSHAK_JWT_SECRET", "")
     if not secret:
         secret = "dev-only-change-me"
     return JwtConfig(secret=secret)
 
 
+def reload_jwt_config() -> JwtConfig:
+    jwt_config.cache_clear()
+    clear_token_cache()
+    return jwt_config()
+
+
 def create_access_token(*, user_id: int, email: str, name: str) -> str:
     cfg = jwt_config()
-    now = int(time.time())
+    # iat keeps sub-second precision so a token issued right after revoke_user_tokens, e.g. the fresh login
+    # that follows a password change, is not caught by a cutoff in the same second.
+    now = time.time()
     payload: dict[str, Any] = {
         "iss": cfg.issuer,
         "sub": str(user_id),
         "email": email,
         "name": name,
         "iat": now,
-        "exp": now + cfg.access_ttl_seconds,
+        "exp": int(now) + cfg.access_ttl_seconds,
         "type": "access",
     }
-    return jwt.encode(payload, cfg.secret, algorithm="HS256")
+    return jwt.encode(payload, cfg.key, algorithm="HS256")
 
 
 def decode_token(token: str) -> dict[str, Any]:
     cfg = jwt_config()
-    return jwt.decode(token, cfg.secret, algorithms=["HS256"], issuer=cfg.issuer)
-
+    return jwt.decode(token, cfg.key, algorithms=["HS256"], issuer=cfg.issuer)
+
+
+class TokenRevoked(jwt.InvalidTokenError):
+    pass
+
+
+TOKEN_CACHE_SIZE = int(os.environ.get("KRISHIRAKSHAK_TOKEN_CACHE_SIZE", "10000"))
+# How often each process replays revocations written by the others (main.py); the revoking process applies
+# its own at once.
+REVOCATION_SYNC_SECONDS = float(os.environ.get("KRISHIRAKSHAK_REVOCATION_SYNC_SECONDS", "2"))
+
+_token_cache = TTLCache(TOKEN_CACHE_SIZE, ttl_seconds=0)
+# In-memory view of the token_revocations table, checked on every verify_token.
+_revoked_tokens: dict[bytes, float] = {}  # digest -> token exp, so entries can be dropped once moot
+_revoked_users: dict[int, float] = {}  # user id -> tokens issued before this instant are revoked
+_revocations_seen = 0  # highest token_revocations.id applied
+_revocation_lock = threading.Lock()
+
+
+def _digest(token: str) -> bytes:
+    return hashlib.blake2b(token.encode("utf-8"), digest_size=16).digest()
+
+
+def _is_revoked(digest: bytes, payload: dict[str, Any]) -> bool:
+    if digest in _revoked_tokens:
+        return True
+    cutoff = _revoked_users.get(int(payload.get("sub", 0)))
+    return cutoff is not None and float(payload.get("iat", 0)) < cutoff
+
+
+def verify_token(token: str) -> dict[str, Any]:
+    # decode_token with a bounded cache of verified payloads keyed by token digest. Entries live until the
+    # token's exp at most, and revocation is checked on every call, cached or not.
+    digest = _digest(token)
+    payload = _token_cache.get(digest)
+    if payload is None:
+        payload = decode_token(token)
+        ttl = float(payload["exp"]) - time.time() if "exp" in payload else 0.0
+        if ttl > 0:
+            _token_cache.set(digest, payload, ttl_seconds=ttl)
+    elif payload["exp"] <= time.time():
+        _token_cache.pop(digest)
+        raise jwt.ExpiredSignatureError("Signature has expired")
+    if _is_revoked(digest, payload):
+        raise TokenRevoked("Token has been revoked")
+    return dict(payload)
+
+
+def _apply_revocation(token_digest: Optional[bytes], user_id: Optional[int], revoked_at: float, expires_at: float) -> None:
+    now = time.time()
+    horizon = now - jwt_config().access_ttl_seconds
+    with _revocation_lock:
+        for d in [d for d, e in _revoked_tokens.items() if e <= now]:
+            del _revoked_tokens[d]
+        for uid in [u for u, cutoff in _revoked_users.items() if cutoff < horizon]:
+            del _revoked_users[uid]
+        if token_digest is not None:
+            _revoked_tokens[token_digest] = expires_at
+        else:
+            _revoked_users[user_id] = max(revoked_at, _revoked_users.get(user_id, 0.0))
+    if token_digest is not None:
+        _token_cache.pop(token_digest)
+
+
+def _record_revocation(db: sqlite3.Connection, token_digest: Optional[bytes], user_id: Optional[int], expires_at: float) -> None:
+    now = time.time()
+    db.execute("DELETE FROM token_revocations WHERE expires_at <= ?", (now,))
+    db.execute(
+        "INSERT INTO token_revocations(token_digest, user_id, revoked_at, expires_at) VALUES (?, ?, ?, ?)",
+        (token_digest, user_id, now, expires_at),
+    )
+    _apply_revocation(token_digest, user_id, now, expires_at)
+
+
+def revoke_token(db: sqlite3.Connection, token: str) -> None:
+    # E.g. on logout: this one token stops verifying.
+    try:
+        exp = float(jwt.decode(token, options={"verify_signature": False}).get("exp", 0))
+    except jwt.PyJWTError:
+        exp = time.time() + jwt_config().access_ttl_seconds
+    _record_revocation(db, _digest(token), None, exp)
+
+
+def revoke_user_tokens(db: sqlite3.Connection, user_id: int) -> None:
+    # E.g. after a password change: every token already issued to the user stops verifying.
+    _record_revocation(db, None, user_id, time.time() + jwt_config().access_ttl_seconds)
+
+
+def sync_revocations(db: sqlite3.Connection) -> int:
+    # Applies the revocations recorded since the last call, by this process or any other; returns how many.
+    global _revocations_seen
+    rows = db.execute(
+        "SELECT id, token_digest, user_id, revoked_at, expires_at FROM token_revocations WHERE id > ? AND expires_at > ? ORDER BY id",
+        (_revocations_seen, time.time()),
+    ).fetchall()
+    for row in rows:
+        _apply_revocation(row[1], row[2], row[3], row[4])
+    if rows:
+        with _revocation_lock:
+            _revocations_seen = max(_revocations_seen, rows[-1][0])
+    return len(rows)
+
+
+def clear_token_cache() -> None:
+    _token_cache.clear()
+
+
+def token_cache_stats() -> dict:
+    return {**_token_cache.stats(), "revoked_tokens": len(_revoked_tokens), "revoked_users": len(_revoked_users)}
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+# Multi-worker server: python -m fastapi_app.serve [--workers N] [--host 127.0.0.1] [--port 8000]
+# The parent imports the app, runs the migrations and opens the read-mostly data (climate grid, chat intents,
+# search index, model artifact) once, binds the socket and then forks the workers. They start serving without
+# importing or opening anything and share those pages copy-on-write; the memory-mapped files (and SQLite's
+# own pages, via mmap_size) are shared through the page cache as well. Only worker 0 runs the score
+# scheduler: the job claims are leased, so this is about not running N sets of scorer threads and N nightly
+# sweeps, not about correctness. Profile edits served by other workers are picked up on worker 0's next poll.
+# Still per process: the weather, score and token caches and the auth rate limiters (N workers allow N times
+# the configured login rate). Needs os.fork; on Windows run uvicorn directly (run_fastapi.ps1).
+
+import argparse
+import logging
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import uvicorn
+
+from . import main as api
+from . import metrics
+from .db import close_pool, init_db
+
+WORKERS = int(os.environ.get("KRISHIRAKSHAK_WORKERS", str(os.cpu_count() or 1)))
+# A worker that exits sooner than this after being forked counts as a startup failure: the server shuts
+# down instead of respawning it in a loop.
+MIN_UPTIME_SECONDS = 5.0
+
+logger = logging.getLogger("uvicorn.error")
+
+
+def prepare() -> None:
+    # Runs once in the parent. Leaves no threads and no open SQLite connections behind: neither survives a fork.
+    init_db()
+    api.warm_up()
+    close_pool()
+
+
+class Supervisor:
+    def __init__(self, config: uvicorn.Config, sock: socket.socket, workers: int) -> None:
+        self.config = config
+        self.sock = sock
+        self.workers = max(1, workers)
+        self._children: dict[int, tuple[int, float]] = {}  # pid -> (worker index, forked at)
+        self._stopping = False
+        self.exit_code = 0
+
+    def _fork(self, index: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                # uvicorn installs its own handlers and re-raises the signal on exit; ours must not run here.
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                api.MIGRATE_ON_STARTUP = False
+                api.RUN_SCORER = index == 0
+                server = uvicorn.Server(self.config)
+                server.run(sockets=[self.sock])
+                code = 0 if server.started else 3
+            except BaseException:
+                logger.exception("Worker %d failed", index)
+                code = 1
+            finally:
+                os._exit(code)
+        self._children[pid] = (index, time.monotonic())
+
+    def stop(self, *_: object) -> None:
+        self._stopping = True
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self) -> int:
+        if threading.active_count() > 1:
+            raise RuntimeError("Threads are running in the parent; forking now would copy their locks mid-use")
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for i in range(self.workers):
+            self._fork(i)
+        logger.info("Started %d workers (parent pid %d)", self.workers, os.getpid())
+        while self._children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            index, forked_at = self._children.pop(pid, (None, 0.0))
+            if index is None or self._stopping:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            if time.monotonic() - forked_at < MIN_UPTIME_SECONDS:
+                logger.error("Worker %d (pid %d) exited with %d during startup; shutting down", index, pid, code)
+                self.exit_code = 1
+                self.stop()
+                continue
+            logger.warning("Worker %d (pid %d) exited with %d; starting a replacement", index, pid, code)
+            self._fork(index)
+        return self.exit_code
+
+
+def main(argv: list[str]) -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, default=WORKERS)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8000)
+    ap.add_argument("--backlog", type=int, default=2048)
+    ap.add_argument("--log-level", default="info")
+    args = ap.parse_args(argv)
+    if not hasattr(os, "fork"):
+        sys.exit("serve needs os.fork; on this platform run a single uvicorn process instead (see run_fastapi.ps1)")
+
+    config = uvicorn.Config(api.app, host=args.host, port=args.port, backlog=args.backlog, log_level=args.log_level)
+    started = time.perf_counter()
+    prepare()
+    logger.info("Prepared in %.0f ms", (time.perf_counter() - started) * 1e3)
+    # Workers share their metrics through snapshot files; a directory from an earlier run starts empty.
+    own_dir = not metrics.METRICS_DIR
+    metrics.METRICS_DIR = metrics.METRICS_DIR or tempfile.mkdtemp(prefix="krishirakshak-metrics-")
+    for stale in Path(metrics.METRICS_DIR).glob("*.json"):
+        stale.unlink()
+    sock = config.bind_socket()
+    try:
+        return Supervisor(config, sock, args.workers).run()
+    finally:
+        sock.close()
+        if own_dir:
+            shutil.rmtree(metrics.METRICS_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
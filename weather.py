@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+import json
+import math
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from functools import cached_property
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterable, Optional, Protocol, Sequence, Union
+
+from .cache import TTLCache
+from .ml import ForecastFeatures
+
+# Forecasts are cached per grid cell and issue hour: every farm in a cell shares one fetch per hour.
+GRID_STEP_DEG = float(os.environ.get("KRISHIRAKSHAK_WEATHER_GRID_STEP", "0.25"))
+HORIZON_HOURS = int(os.environ.get("KRISHIRAKSHAK_WEATHER_HORIZON_HOURS", "72"))
+CACHE_SIZE = int(os.environ.get("KRISHIRAKSHAK_WEATHER_CACHE_SIZE", "20000"))
+CACHE_TTL_SECONDS = float(os.environ.get("KRISHIRAKSHAK_WEATHER_CACHE_TTL", "3600"))
+FETCH_BATCH = int(os.environ.get("KRISHIRAKSHAK_WEATHER_FETCH_BATCH", "200"))
+FETCH_WAIT_SECONDS = float(os.environ.get("KRISHIRAKSHAK_WEATHER_FETCH_WAIT", "10"))
+PROVIDER = os.environ.get("KRISHIRAKSHAK_WEATHER_PROVIDER", "local")
+FIXTURE_PATH = os.environ.get("KRISHIRAKSHAK_WEATHER_FIXTURE", "")
+
+Cell = tuple[float, float]
+
+
+def cell_for(lat: Optional[float], lon: Optional[float], step: float = GRID_STEP_DEG) -> Optional[Cell]:
+    # Centre of the grid cell holding the point. Offsets keep the index non-negative, so SQL can compute
+    # the same cells with CAST(... AS INTEGER) (see cell_from_index).
+    if lat is None or lon is None:
+        return None
+    return cell_from_index(math.floor((lat + 90.0) / step), math.floor((lon + 180.0) / step), step)
+
+
+def cell_from_index(i: int, j: int, step: float = GRID_STEP_DEG) -> Cell:
+    return round(-90.0 + (i + 0.5) * step, 6), round(-180.0 + (j + 0.5) * step, 6)
+
+
+def active_cells(db, step: float = GRID_STEP_DEG) -> list[Cell]:
+    # Distinct cells of every farm with a saved location; db is a sqlite3 connection.
+    rows = db.execute(
+        """
+        SELECT DISTINCT CAST((latitude + 90.0) / ? AS INTEGER), CAST((longitude + 180.0) / ? AS INTEGER)
+        FROM farm_profiles WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+        """,
+        (step, step),
+    ).fetchall()
+    return [cell_from_index(i, j, step) for i, j in rows]
+
+
+def current_hour() -> int:
+    return int(time.time() // 3600)
+
+
+@dataclass(frozen=True)
+class Forecast:
+    cell: Cell
+    issued_hour: int  # hours since the epoch, UTC
+    temp_c: tuple[float, ...]  # hourly, HORIZON_HOURS values from issued_hour
+    rain_mm: tuple[float, ...]
+
+    @cached_property
+    def features(self) -> ForecastFeatures:
+        # Computed once per cached forecast; rounded so nearby forecasts share score-cache entries.
+        return ForecastFeatures(
+            max_temp_c=round(max(self.temp_c), 1),
+            min_temp_c=round(min(self.temp_c), 1),
+            rain_mm=round(sum(self.rain_mm), 1),
+        )
+
+
+class WeatherProvider(Protocol):
+    name: str
+
+    def fetch(self, cells: Sequence[Cell], issued_hour: int) -> dict[Cell, Forecast]:
+        # Forecasts for as many of the cells as the provider has; missing cells are simply absent.
+        ...
+
+
+class LocalWeatherProvider:
+    # Offline stand-in: forecasts from a JSON fixture where it covers a cell, otherwise a deterministic
+    # synthetic series (diurnal temperature around a latitude/season baseline, occasional rain spells).
+    # Fixture format: {"cells": [{"lat": .., "lon": .., "temp_c": [...], "rain_mm": [...]}]}, hourly values.
+    name = "local"
+
+    def __init__(self, fixture: Union[str, Path, None] = None, *, latency_seconds: float = 0.0) -> None:
+        self.latency_seconds = latency_seconds
+        self._fixture: dict[Cell, tuple[tuple[float, ...], tuple[float, ...]]] = {}
+        if fixture:
+            for entry in json.loads(Path(fixture).read_text())["cells"]:
+                cell = cell_for(entry["lat"], entry["lon"])
+                self._fixture[cell] = (tuple(entry["temp_c"]), tuple(entry.get("rain_mm") or [0.0] * len(entry["temp_c"])))
+
+    def fetch(self, cells: Sequence[Cell], issued_hour: int) -> dict[Cell, Forecast]:
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        return {cell: self._forecast(cell, issued_hour) for cell in cells}
+
+    def _forecast(self, cell: Cell, issued_hour: int) -> Forecast:
+        fixed = self._fixture.get(cell)
+        if fixed is not None:
+            temp, rain = fixed
+            return Forecast(cell, issued_hour, _fit(temp), _fit(rain))
+        lat, lon = cell
+        rng = random.Random(f"{cell}:{issued_hour // 6}")
+        day_of_year = datetime.fromtimestamp(issued_hour * 3600, timezone.utc).timetuple().tm_yday
+        # Warmer south, wider seasonal swing further north; rain spells mostly in the monsoon months.
+        swing = 3.0 + 0.4 * max(0.0, lat - 15.0)
+        base = 27.0 - 0.35 * (lat - 20.0) + swing * math.cos(2 * math.pi * (day_of_year - 140) / 365) + rng.uniform(-2, 2)
+        rainy = rng.random() < (0.5 if 160 <= day_of_year <= 270 else 0.08)
+        temp, rain = [], []
+        for h in range(HORIZON_HOURS):
+            local_hour = (issued_hour + h + lon / 15.0) % 24
+            temp.append(round(base + 7.0 * math.sin(2 * math.pi * (local_hour - 9) / 24), 1))
+            rain.append(round(rng.expovariate(1 / 3.0), 1) if rainy and rng.random() < 0.3 else 0.0)
+        return Forecast(cell, issued_hour, tuple(temp), tuple(rain))
+
+
+def _fit(values: tuple[float, ...]) -> tuple[float, ...]:
+    values = values[:HORIZON_HOURS]
+    return values + (values[-1],) * (HORIZON_HOURS - len(values)) if values else (0.0,) * HORIZON_HOURS
+
+
+def make_provider() -> WeatherProvider:
+    if PROVIDER == "local":
+        return LocalWeatherProvider(FIXTURE_PATH or None)
+    raise ValueError(f"Unknown weather provider: {PROVIDER}")
+
+
+class WeatherCache:
+    # TTL cache of forecasts keyed by (cell, issue hour) with request coalescing: concurrent misses for the
+    # same key wait on one provider fetch instead of each issuing their own. Failed fetches are not cached,
+    # and callers get None so scoring carries on without forecast features.
+    def __init__(
+        self,
+        provider: WeatherProvider,
+        *,
+        maxsize: int = CACHE_SIZE,
+        ttl_seconds: float = CACHE_TTL_SECONDS,
+        batch_size: int = FETCH_BATCH,
+        wait_seconds: float = FETCH_WAIT_SECONDS,
+    ) -> None:
+        self.provider = provider
+        self.batch_size = max(1, batch_size)
+        self.wait_seconds = wait_seconds
+        self._cache = TTLCache(maxsize, ttl_seconds)
+        self._in_flight: dict[tuple[Cell, int], Future] = {}
+        self._lock = threading.Lock()
+        self.fetch_calls = 0
+        self.cells_fetched = 0
+        self.fetch_errors = 0
+        self.coalesced = 0
+        self.prefetch_runs = 0
+        self.last_prefetch_cells = 0
+
+    def get_many(self, cells: Iterable[Cell], *, hour: Optional[int] = None) -> dict[Cell, Optional[Forecast]]:
+        hour = current_hour() if hour is None else hour
+        found: dict[Cell, Optional[Forecast]] = {}
+        waiting: dict[Cell, Future] = {}
+        mine: dict[Cell, Future] = {}
+        with self._lock:
+            # Under one lock with the in-flight table, so a fetch finishing in between can't be missed.
+            for cell in set(cells):
+                key = (cell, hour)
+                hit = self._cache.get(key)
+                if hit is not None:
+                    found[cell] = hit
+                elif key in self._in_flight:
+                    self.coalesced += 1
+                    waiting[cell] = self._in_flight[key]
+                else:
+                    mine[cell] = self._in_flight[key] = Future()
+        if mine:
+            self._fetch(mine, hour)
+        for cell, fut in {**mine, **waiting}.items():
+            try:
+                found[cell] = fut.result(timeout=self.wait_seconds)
+            except Exception:
+                found[cell] = None
+        return found
+
+    def get(self, lat: Optional[float], lon: Optional[float]) -> Optional[Forecast]:
+        cell = cell_for(lat, lon)
+        return None if cell is None else self.get_many([cell])[cell]
+
+    def features(self, lat: Optional[float], lon: Optional[float]) -> Optional[ForecastFeatures]:
+        forecast = self.get(lat, lon)
+        return None if forecast is None else forecast.features
+
+    def features_many(
+        self, lats: Sequence[Optional[float]], lons: Sequence[Optional[float]]
+    ) -> list[Optional[ForecastFeatures]]:
+        cells = [cell_for(lat, lon) for lat, lon in zip(lats, lons)]
+        forecasts = self.get_many(c for c in cells if c is not None)
+        features = {cell: f.features for cell, f in forecasts.items() if f is not None}
+        return [None if c is None else features.get(c) for c in cells]
+
+    def prefetch(self, cells: Iterable[Cell], *, hour: Optional[int] = None) -> int:
+        # Batched warm-up, e.g. every active farm cell on a schedule. Returns the number of cells covered.
+        cells = list(set(cells))
+        self.get_many(cells, hour=hour)
+        with self._lock:
+            self.prefetch_runs += 1
+            self.last_prefetch_cells = len(cells)
+        return len(cells)
+
+    def _fetch(self, futures: dict[Cell, Future], hour: int) -> None:
+        cells = list(futures)
+        try:
+            for start in range(0, len(cells), self.batch_size):
+                chunk = cells[start : start + self.batch_size]
+                try:
+                    got = self.provider.fetch(chunk, hour)
+                except Exception:
+                    got = {}
+                    with self._lock:
+                        self.fetch_errors += 1
+                with self._lock:
+                    self.fetch_calls += 1
+                    self.cells_fetched += len(chunk)
+                for cell in chunk:
+                    forecast = got.get(cell)
+                    if forecast is not None:
+                        self._cache.set((cell, hour), forecast)
+                    self._resolve(futures[cell], (cell, hour), forecast)
+        finally:
+            # Never leave waiters hanging, whatever went wrong above.
+            for cell, fut in futures.items():
+                if not fut.done():
+                    self._resolve(fut, (cell, hour), None)
+
+    def _resolve(self, fut: Future, key: tuple[Cell, int], forecast: Optional[Forecast]) -> None:
+        with self._lock:
+            self._in_flight.pop(key, None)
+        fut.set_result(forecast)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        cache = self._cache.stats()
+        lookups = cache["hits"] + cache["misses"]
+        with self._lock:
+            return {
+                "provider": self.provider.name,
+                **cache,
+                "hit_rate": round(cache["hits"] / lookups, 4) if lookups else None,
+                "fetch_calls": self.fetch_calls,
+                "cells_fetched": self.cells_fetched,
+                "fetch_errors": self.fetch_errors,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._in_flight),
+                "prefetch_runs": self.prefetch_runs,
+                "last_prefetch_cells": self.last_prefetch_cells,
+            }
+
+
+weather_cache = WeatherCache(make_provider())
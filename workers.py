@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional, TypeVar
+
+from starlette.concurrency import run_in_threadpool
+
+T = TypeVar("T")
+
+# "executor": DB and CPU work run on dedicated bounded executors, so they never queue behind each other.
+# "threadpool": both share Starlette's default threadpool (the behaviour of the old sync routes); kept for comparison.
+EXECUTOR_MODE = os.environ.get("KRISHIRAKSHAK_EXECUTOR_MODE", "executor").lower()
+DB_WORKERS = int(os.environ.get("KRISHIRAKSHAK_DB_WORKERS", os.environ.get("KRISHIRAKSHAK_DB_POOL_SIZE", "8")))
+CPU_WORKERS = int(os.environ.get("KRISHIRAKSHAK_CPU_WORKERS", str(os.cpu_count() or 2)))
+# Password hashing gets its own pool so a login burst can't occupy the CPU executor used for scoring.
+HASH_WORKERS = int(os.environ.get("KRISHIRAKSHAK_HASH_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+HASH_QUEUE_LIMIT = int(os.environ.get("KRISHIRAKSHAK_HASH_QUEUE_LIMIT", str(HASH_WORKERS * 4)))
+# Blocking network calls (e.g. weather providers): mostly waiting, so sized independently of the CPU count.
+IO_WORKERS = int(os.environ.get("KRISHIRAKSHAK_IO_WORKERS", "16"))
+
+
+class Overloaded(RuntimeError):
+    pass
+
+
+_db_executor: Optional[ThreadPoolExecutor] = None
+_cpu_executor: Optional[ThreadPoolExecutor] = None
+_hash_executor: Optional[ThreadPoolExecutor] = None
+_io_executor: Optional[ThreadPoolExecutor] = None
+_hash_in_flight = 0
+_hash_rejected = 0
+_hash_lock = threading.Lock()
+
+
+def _executor(kind: str) -> ThreadPoolExecutor:
+    global _db_executor, _cpu_executor, _hash_executor, _io_executor
+    if kind == "io":
+        if _io_executor is None:
+            _io_executor = ThreadPoolExecutor(max_workers=max(1, IO_WORKERS), thread_name_prefix="krishi-io")
+        return _io_executor
+    if kind == "hash":
+        if _hash_executor is None:
+            # hashlib.pbkdf2_hmac releases the GIL, so hash threads run in parallel.
+            _hash_executor = ThreadPoolExecutor(max_workers=max(1, HASH_WORKERS), thread_name_prefix="krishi-hash")
+        return _hash_executor
+    if kind == "db":
+        if _db_executor is None:
+            _db_executor = ThreadPoolExecutor(max_workers=max(1, DB_WORKERS), thread_name_prefix="krishi-db")
+        return _db_executor
+    if _cpu_executor is None:
+        # Scoring and search: keeps them off the event loop. Only the NumPy batch kernels release the GIL, so
+        # the pure-Python single-farm paths still run one at a time.
+        _cpu_executor = ThreadPoolExecutor(max_workers=max(1, CPU_WORKERS), thread_name_prefix="krishi-cpu")
+    return _cpu_executor
+
+
+async def _run(kind: str, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    if EXECUTOR_MODE == "threadpool":
+        return await run_in_threadpool(fn, *args, **kwargs)
+    loop = asyncio.get_running_loop()
+    # Carry the caller's contextvars into the executor thread, as run_in_threadpool does (metrics.RequestStats
+    # relies on it).
+    return await loop.run_in_executor(_executor(kind), partial(contextvars.copy_context().run, fn, *args, **kwargs))
+
+
+async def run_db(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    return await _run("db", fn, *args, **kwargs)
+
+
+async def run_cpu(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    return await _run("cpu", fn, *args, **kwargs)
+
+
+async def run_io(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    return await _run("io", fn, *args, **kwargs)
+
+
+def _release_hash(_fut: Future) -> None:
+    global _hash_in_flight
+    with _hash_lock:
+        _hash_in_flight -= 1
+
+
+async def run_hash(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    # Admission-controlled: at most HASH_WORKERS running plus HASH_QUEUE_LIMIT waiting; beyond that the
+    # caller gets Overloaded immediately instead of joining an unbounded queue. Slots are released when the
+    # hash actually finishes, even if the awaiting request was cancelled. Used in both executor modes.
+    global _hash_in_flight, _hash_rejected
+    with _hash_lock:
+        if _hash_in_flight >= HASH_WORKERS + HASH_QUEUE_LIMIT:
+            _hash_rejected += 1
+            raise Overloaded("Password hashing queue is full")
+        _hash_in_flight += 1
+    try:
+        fut = _executor("hash").submit(partial(fn, *args, **kwargs))
+    except BaseException:
+        _release_hash(None)
+        raise
+    fut.add_done_callback(_release_hash)
+    return await asyncio.wrap_future(fut)
+
+
+def hash_queue_stats() -> dict:
+    with _hash_lock:
+        return {
+            "workers": HASH_WORKERS,
+            "queue_limit": HASH_QUEUE_LIMIT,
+            "in_flight": _hash_in_flight,
+            "rejected": _hash_rejected,
+        }
+
+
+def shutdown_executors() -> None:
+    global _db_executor, _cpu_executor, _hash_executor, _io_executor
+    for ex in (_db_executor, _cpu_executor, _hash_executor, _io_executor):
+        if ex is not None:
+            ex.shutdown(wait=False, cancel_futures=True)
+    _db_executor = _cpu_executor = _hash_executor = _io_executor = None